@@ -0,0 +1,151 @@
+r"""
+Answer cache: don't ask the LLM the same question about the same data twice.
+
+The cache key is the normalized question text (see query_planner.py), a
+namespace (which agent answered) and the data version:
+- SQLite database (concert_store.py): its revision counter
+- CSV file: its mtime and size
+Every ingest changes the data version, so answers about older data are never
+returned. When the version changes, the stale answers of the namespace are
+deleted.
+
+The version is taken once per question, before the agent runs: the caller
+passes it to get() and then to put(). An answer is stored under the version
+of the data it was computed on, never under a newer one (data that arrived
+while the agent was answering), and it is not stored at all if a newer
+version was seen in the meantime.
+
+Two tiers:
+- memory: the last `memory_entries` answers, least recently used dropped first
+- disk: a small SQLite file, so answers survive a restart; at most
+  `max_entries`, least recently used dropped first
+
+Used by: lesson13.py, lesson13_mcp_has_task.py, lesson13_auto.py
+"""
+
+import hashlib
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from concert_store import ConcertStore
+from query_planner import normalize_question
+
+
+def read_data_version(db_file: Path, csv_file: Path, store: ConcertStore | None = None) -> str:
+    """A string that changes every time concert data is added"""
+    if db_file.exists():
+        return f"db:{(store or ConcertStore(db_file)).revision()}"
+    if csv_file.exists():
+        stat = csv_file.stat()
+        return f"csv:{stat.st_mtime_ns}:{stat.st_size}"
+    return "empty"
+
+
+class AnswerCache:
+    """Two-tier LRU cache of agent answers, keyed by question and data version"""
+
+    def __init__(
+        self,
+        db_file: Path,
+        csv_file: Path,
+        namespace: str,
+        path: Path = Path("answer_cache.db"),
+        memory_entries: int = 128,
+        max_entries: int = 5000,
+    ):
+        self.db_file = db_file
+        self.csv_file = csv_file
+        self.namespace = namespace
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._store: ConcertStore | None = None
+        self._version: str | None = None
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                version TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def data_version(self) -> str:
+        """A string that changes every time concert data is added"""
+        if self._store is None and self.db_file.exists():
+            self._store = ConcertStore(self.db_file)
+        return read_data_version(self.db_file, self.csv_file, self._store)
+
+    def _key(self, question: str, version: str) -> str:
+        text = f"{self.namespace}:{version}:{normalize_question(question)}"
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _invalidate(self, version: str):
+        """The data changed: forget the answers about the older data"""
+        self._version = version
+        self._memory.clear()
+        self._conn.execute(
+            "DELETE FROM answers WHERE namespace = ? AND version != ?", (self.namespace, version)
+        )
+        self._conn.commit()
+
+    def get(self, question: str, version: str | None = None) -> str | None:
+        """The cached answer for `question` about the data at `version`
+        (by default the current data), or None"""
+        version = version or self.data_version()
+        if version != self._version:
+            self._invalidate(version)
+        key = self._key(question, version)
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return self._memory[key]
+        row = self._conn.execute("SELECT answer FROM answers WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self._conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (time.time(), key))
+        self._conn.commit()
+        self._remember(key, row[0])
+        self.disk_hits += 1
+        return row[0]
+
+    def put(self, question: str, answer: str, version: str):
+        """Store the agent's answer to `question`, computed on the data at `version`
+        (the version passed to get(), taken before the agent ran)"""
+        if version != self._version:
+            # Newer data was seen since: the answer is already out of date
+            return
+        key = self._key(question, version)
+        self._remember(key, answer)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO answers (key, namespace, version, answer, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, self.namespace, version, answer, time.time()),
+        )
+        self._conn.execute(
+            "DELETE FROM answers WHERE key NOT IN (SELECT key FROM answers ORDER BY last_used DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+        self._conn.commit()
+
+    def _remember(self, key: str, answer: str):
+        self._memory[key] = answer
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> str:
+        """Human readable hit/miss counters"""
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        rate = hits / total * 100 if total else 0.0
+        return (f"Answer cache: {hits} hit(s) ({self.memory_hits} memory, {self.disk_hits} disk), "
+                f"{self.misses} miss(es) ({rate:.0f}% hit rate)")
@@ -0,0 +1,167 @@
+r"""
+Backfill: load a whole archive of posters (e.g. images_bank/) into the
+concert database, without copying it into the watch folder.
+
+- The archive is split into one shard per worker process, so preprocessing,
+  hashing and JSON parsing use all cores
+- Every worker process runs the extraction and enrichment of lesson12-async.py
+  (extract_and_enrich, with all its caches) on up to --concurrency posters at
+  a time. The provider quota is split evenly between the processes
+- Only this (main) process writes: the workers send their results back over a
+  queue and save_extraction() writes them one by one, so the database has a
+  single writer and the ingest manifest keeps every poster exactly-once
+- Posters that are already written are skipped, posters that were enriched
+  before an interruption are only written, so a backfill can simply be re-run
+- While it runs, a progress line shows throughput, ETA and error count
+
+The output of the agents in the worker processes is hidden unless --verbose.
+
+Run: python backfill.py images_bank --processes 4 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import importlib
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from ingest_manifest import IngestManifest
+from rate_limiter import AdaptiveLimiter
+
+# lesson12-async.py has a dash in its name, so it can't be imported with a plain import
+lesson = importlib.import_module("lesson12-async")
+
+
+async def run_shard(image_paths: list[Path], concurrency: int, results: multiprocessing.Queue):
+    """Extract and enrich the posters of one shard, `concurrency` at a time"""
+    paths: asyncio.Queue[Path] = asyncio.Queue()
+    for image_path in image_paths:
+        paths.put_nowait(image_path)
+
+    async def worker():
+        while not paths.empty():
+            image_path = paths.get_nowait()
+            start = time.perf_counter()
+            try:
+                image_data = image_path.read_bytes()
+                content_hash = IngestManifest.content_hash(image_data)
+                state = lesson.manifest.state(content_hash)
+                if state == 'written':
+                    results.put(('skipped', image_path.name, content_hash, None, 0.0))
+                    continue
+                if state == 'enriched':
+                    extraction = lesson.manifest.payload(content_hash, lesson.EnrichedConcertExtraction)
+                else:
+                    extraction = await lesson.extract_and_enrich(
+                        image_path.name, image_data, lesson.get_media_type(image_path), lesson.STREAM_EXTRACTION
+                    )
+                results.put(('done', image_path.name, content_hash, extraction.model_dump_json(),
+                             time.perf_counter() - start))
+            except Exception as e:
+                results.put(('error', image_path.name, None, f"{type(e).__name__}: {e}", 0.0))
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+
+def shard_process(image_paths: list[Path], processes: int, concurrency: int,
+                  results: multiprocessing.Queue, verbose: bool):
+    """Entry point of a worker process"""
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+    # The processes share one API key, so each gets its part of the quota
+    lesson.limiter = AdaptiveLimiter(
+        requests_per_minute=lesson.REQUESTS_PER_MINUTE // processes,
+        tokens_per_minute=lesson.TOKENS_PER_MINUTE // processes,
+    )
+    # The cores are already used by the worker processes, a thread pool is enough for the images
+    lesson.preprocess_pool.shutdown()
+    lesson.preprocess_pool = ThreadPoolExecutor(max_workers=concurrency)
+    asyncio.run(run_shard(image_paths, concurrency, results))
+    lesson.preprocess_pool.shutdown()
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02}:{seconds:02}" if hours else f"{minutes}:{seconds:02}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load an archive of posters into the concert database")
+    parser.add_argument("folder", type=Path, nargs="?", default=Path("images_bank"))
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--concurrency", type=int, default=lesson.NUM_WORKERS,
+                        help="Posters in flight per worker process")
+    parser.add_argument("--verbose", action="store_true", help="Show the output of the agents")
+    args = parser.parse_args()
+
+    if not args.folder.exists():
+        raise FileNotFoundError(f"Folder '{args.folder}' not found")
+    image_paths = sorted(f for f in args.folder.iterdir() if f.suffix.lower() in lesson.IMAGE_EXTENSIONS)
+    processes = max(1, min(args.processes, len(image_paths)))
+    print(f"Backfilling {len(image_paths)} image(s) from {args.folder} "
+          f"with {processes} process(es) x {args.concurrency} concurrent poster(s)")
+
+    lesson.initialize_store()
+
+    # Spawned (not forked) workers, so no SQLite connection of this process is shared
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = [
+        context.Process(target=shard_process,
+                        args=(image_paths[i::processes], processes, args.concurrency, results, args.verbose))
+        for i in range(processes)
+    ]
+    for process in workers:
+        process.start()
+
+    finished = written = skipped = errors = 0
+    start = time.perf_counter()
+    while finished < len(image_paths):
+        try:
+            status, image_name, content_hash, payload, seconds = results.get(timeout=1)
+        except queue.Empty:
+            if not any(process.is_alive() for process in workers):
+                print(f"Worker processes stopped with {len(image_paths) - finished} image(s) left")
+                break
+            continue
+
+        finished += 1
+        if status == 'skipped':
+            skipped += 1
+            detail = "already written"
+        elif status == 'error':
+            errors += 1
+            detail = f"error: {payload}"
+        else:
+            try:
+                extraction = lesson.EnrichedConcertExtraction.model_validate_json(payload)
+                lesson.manifest.mark(content_hash, image_name, 'enriched', extraction)
+                lesson.save_extraction(image_name, extraction, content_hash)
+                written += 1
+                detail = f"{len(extraction.bands)} band(s) in {seconds:.1f}s"
+            except Exception as e:
+                errors += 1
+                detail = f"error while writing: {e}"
+
+        elapsed = time.perf_counter() - start
+        rate = (finished - skipped) / elapsed if elapsed else 0.0
+        eta = (len(image_paths) - finished) / rate if rate else 0.0
+        print(f"[{finished}/{len(image_paths)}] {image_name}: {detail} | "
+              f"{rate:.2f} images/s, ETA {format_duration(eta)}, {errors} error(s)")
+
+    for process in workers:
+        process.join()
+    elapsed = time.perf_counter() - start
+    print(f"\nDone in {format_duration(elapsed)}: {written} written, {skipped} skipped, {errors} error(s)")
+    print(lesson.manifest.stats())
+    lesson.preprocess_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
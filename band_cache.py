@@ -0,0 +1,95 @@
+r"""
+Band knowledge store: remember what the enrichment agent found about a band.
+
+The same bands show up on poster after poster (the monthly maanalainen_*
+series in images_bank is a good example), and every lookup is a web-search
+agent run. Results are stored in a small SQLite file keyed by the normalized
+band name, so a band is only looked up again when its entry has expired.
+
+- Normal results live for `ttl_days`
+- Results with an "Unknown" genre or country live for `unknown_ttl_days`,
+  a shorter time, so we retry them later without searching on every poster
+- The tokens spent on the original lookup are stored, so every hit can
+  report how many tokens it saved
+
+Used by: lesson12.py, lesson12-async.py
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar('T', bound=BaseModel)
+
+UNKNOWN = "unknown"
+
+
+def normalize_band_name(band_name: str) -> str:
+    """Case- and whitespace-insensitive key for a band name"""
+    return " ".join(band_name.split()).lower()
+
+
+class BandKnowledgeStore:
+    """Persistent band name -> enrichment result cache with TTLs"""
+
+    def __init__(
+        self,
+        path: Path = Path("band_knowledge.db"),
+        ttl_days: float = 90,
+        unknown_ttl_days: float = 7,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_days * 24 * 3600
+        self.unknown_ttl_seconds = unknown_ttl_days * 24 * 3600
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+        # Used from several threads (file readiness, asyncio.to_thread): the lock serializes the queries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS bands (
+                name TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                tokens INTEGER NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, band_name: str, output_type: type[T]) -> T | None:
+        """Return the stored enrichment for the band, or None if missing or expired"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, tokens, expires_at FROM bands WHERE name = ?",
+                (normalize_band_name(band_name),),
+            ).fetchone()
+            if row is None or row[2] < time.time():
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.saved_tokens += row[1]
+        return output_type.model_validate_json(row[0])
+
+    def put(self, band_name: str, enrichment: BaseModel, tokens_used: int = 0):
+        """Store an enrichment result; "Unknown" results get the shorter TTL"""
+        values = enrichment.model_dump().values()
+        is_unknown = any(str(value).strip().lower() == UNKNOWN for value in values)
+        ttl = self.unknown_ttl_seconds if is_unknown else self.ttl_seconds
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO bands (name, payload, tokens, expires_at) VALUES (?, ?, ?, ?)",
+                (normalize_band_name(band_name), enrichment.model_dump_json(), tokens_used, time.time() + ttl),
+            )
+            self._conn.commit()
+
+    def stats(self) -> str:
+        """Human readable hit rate and saved tokens"""
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return (f"Band cache: {self.hits} hit(s), {self.misses} miss(es) ({rate:.0f}% hit rate), "
+                f"~{self.saved_tokens} tokens saved")
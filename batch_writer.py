@@ -0,0 +1,117 @@
+r"""
+Batched writer: one task writes the concert rows of all workers.
+
+Saving a poster used to be a blocking database commit plus a CSV append,
+called straight from every worker coroutine: the event loop stood still
+during the disk I/O, and parallel posters each opened the CSV file and
+committed on their own. With the writer:
+- workers put their rows into an asyncio queue and await the result
+- a single writer task collects rows of several posters (until `batch_size`
+  posters are queued or `flush_interval` seconds have passed) and writes
+  them with ConcertStore.add_batch(): one transaction, one CSV append
+- the write itself runs in a thread (asyncio.to_thread), so the event loop
+  keeps running while the disk is busy
+- with `fsync`, every flush is synced to disk before the workers are told it
+  is saved; without, that is left to the operating system
+- close() writes everything that is still queued before the task stops
+
+Usage:
+    writer = BatchedWriter(store, batch_size=20, flush_interval=0.25)
+    writer.start()
+    count = await writer.write(rows, ingest_key=content_hash)
+    await writer.close()
+
+Used by: lesson12-async.py
+"""
+
+import asyncio
+
+from concert_store import ConcertStore
+
+_CLOSE = None  # Queued by close() after the last rows
+
+
+class BatchedWriter:
+    """Single writer task that groups the rows of many posters into one flush"""
+
+    def __init__(self, store: ConcertStore, batch_size: int = 20, flush_interval: float = 0.25,
+                 fsync: bool = True):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.flushes = 0
+        self.images_written = 0
+        self.rows_written = 0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._batch_full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        """Start the writer task (inside the running event loop)"""
+        self._task = asyncio.create_task(self._run())
+
+    async def write(self, rows: list[dict], ingest_key: str | None = None) -> int:
+        """Queue the rows of one poster; returns the number of rows written once they are saved"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((rows, ingest_key, future))
+        if self._queue.qsize() >= self.batch_size:
+            self._batch_full.set()
+        # Shield, so a cancelled worker does not take its rows out of the batch
+        return await asyncio.shield(future)
+
+    async def close(self):
+        """Write all queued rows, then stop the writer task"""
+        self._queue.put_nowait(_CLOSE)
+        self._batch_full.set()
+        await self._task
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+            # A full batch (e.g. queued during the previous flush) is written right away
+            if first is not _CLOSE and self._queue.qsize() < self.batch_size - 1:
+                # Give other posters up to flush_interval to join this flush
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.flush_interval)
+                except TimeoutError:
+                    pass
+            self._batch_full.clear()
+
+            batch = []
+            closing = first is _CLOSE
+            if not closing:
+                batch.append(first)
+            while len(batch) < self.batch_size and not closing and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is _CLOSE:
+                    closing = True
+                else:
+                    batch.append(item)
+            if batch:
+                await self._flush(batch)
+            if closing:
+                return
+
+    async def _flush(self, batch: list[tuple]):
+        try:
+            counts = await asyncio.to_thread(
+                self.store.add_batch, [(rows, ingest_key) for rows, ingest_key, _ in batch], self.fsync
+            )
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.flushes += 1
+        for (_, _, future), count in zip(batch, counts):
+            self.images_written += 1
+            self.rows_written += count
+            if not future.done():
+                future.set_result(count)
+
+    def stats(self) -> str:
+        """Human readable counters"""
+        per_flush = self.images_written / self.flushes if self.flushes else 0.0
+        return (f"Writer: {self.images_written} image(s), {self.rows_written} row(s) in "
+                f"{self.flushes} flush(es), {per_flush:.1f} image(s) per flush")
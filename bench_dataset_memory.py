@@ -0,0 +1,92 @@
+r"""
+Benchmark: list-of-dicts rows vs. the columnar ConcertDataset
+
+Writes a synthetic concerts CSV, then loads it two ways and compares the
+memory they hold (measured with tracemalloc) and the latency of the
+aggregations the MCP server answers most often:
+- list of dicts: csv.DictReader rows, Counter over the rows (the old server)
+- columnar: ConcertDataset, dictionary-encoded columns and per-code counts
+
+No API key needed, everything runs locally in a temporary folder.
+
+Run: python bench_dataset_memory.py --rows 100000
+"""
+
+import argparse
+import csv
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+from bench_search import synthetic_rows, timed
+from concert_dataset import ConcertDataset
+from concert_store import CSV_COLUMNS
+
+
+def load_dicts(csv_file: Path) -> list[dict]:
+    with open(csv_file, 'r', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def load_columnar(csv_file: Path) -> ConcertDataset:
+    dataset = ConcertDataset(csv_file.with_suffix('.db'), csv_file)
+    dataset.refresh()
+    return dataset
+
+
+def measure_memory(load) -> tuple[object, float, float]:
+    """Load the data; returns (data, MB held afterwards, seconds)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    data = load()
+    seconds = time.perf_counter() - start
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return data, held / 1024 / 1024, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory and latency of the dataset layouts")
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        csv_file = Path(folder) / "concerts.csv"
+        with open(csv_file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+            writer.writeheader()
+            writer.writerows(synthetic_rows(args.rows))
+
+        rows, dicts_mb, dicts_s = measure_memory(lambda: load_dicts(csv_file))
+        dataset, columnar_mb, columnar_s = measure_memory(lambda: load_columnar(csv_file))
+
+        queries = {
+            "list_all_genres": (
+                lambda: Counter(row['genre'] for row in rows if row['genre']).most_common(),
+                lambda: dataset.value_counts('genre').most_common(),
+            ),
+            "list_all_countries": (
+                lambda: Counter(row['country'] for row in rows if row['country']).most_common(),
+                lambda: dataset.value_counts('country').most_common(),
+            ),
+            "get_bands_by_genre('metal')": (
+                lambda: sorted({row['band_name'] for row in rows if 'metal' in row['genre'].lower()}),
+                lambda: sorted(dataset.bands_matching('genre', 'metal')),
+            ),
+        }
+
+        print(f"{args.rows} rows\n")
+        print(f"{'':28}  {'list of dicts':>14}  {'columnar':>10}")
+        print(f"{'memory':28}  {dicts_mb:>11.1f} MB  {columnar_mb:>7.1f} MB")
+        print(f"{'load time':28}  {dicts_s:>12.2f} s  {columnar_s:>8.2f} s")
+        for name, (old, new) in queries.items():
+            old_ms, expected = timed(old)
+            new_ms, result = timed(new)
+            assert result == expected, name
+            print(f"{name:28}  {old_ms:>11.2f} ms  {new_ms:>7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
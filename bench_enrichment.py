@@ -0,0 +1,78 @@
+r"""
+Benchmark: per-band enrichment fan-out vs. batched enrichment
+
+Runs the enrichment agents of lesson12-async.py directly (the band cache is
+not used, so every band is really searched) and compares the tokens and the
+wall-clock time of:
+- one enrichment_agent call per band, all in parallel (the default mode)
+- batch_enrichment_agent calls with N bands each, all batches in parallel
+
+Each run costs real API calls, so keep the band list small.
+
+Run: python bench_enrichment.py --batch-size 10 Amorphis Nightwish Apocalyptica
+"""
+
+import argparse
+import asyncio
+import importlib
+import time
+
+# lesson12-async.py has a dash in its name, so it can't be imported with a plain import
+lesson = importlib.import_module("lesson12-async")
+
+DEFAULT_BANDS = [
+    "Amorphis", "Nightwish", "Apocalyptica", "Children of Bodom", "Insomnium",
+    "Stam1na", "Turmion Kätilöt", "Beast in Black", "Swallow the Sun", "Korpiklaani",
+]
+
+
+async def per_band(band_names: list[str]) -> tuple[int, int]:
+    """One call per band; returns (total tokens, bands answered)"""
+    results = await asyncio.gather(*[
+        lesson.enrichment_agent.run(f"Find the genre and country of origin for the band: {band_name}")
+        for band_name in band_names
+    ])
+    return sum(result.usage().total_tokens for result in results), len(results)
+
+
+async def batched(band_names: list[str], batch_size: int) -> tuple[int, int]:
+    """Batches of `batch_size` bands per call; returns (total tokens, bands answered)"""
+    batches = [band_names[i:i + batch_size] for i in range(0, len(band_names), batch_size)]
+    results = await asyncio.gather(*[
+        lesson.batch_enrichment_agent.run(lesson.batch_enrichment_prompt(batch))
+        for batch in batches
+    ])
+    wanted = {lesson.normalize_band_name(band_name) for band_name in band_names}
+    answered = {
+        lesson.normalize_band_name(band.band_name)
+        for result in results for band in result.output.bands
+    } & wanted
+    return sum(result.usage().total_tokens for result in results), len(answered)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare per-band and batched band enrichment")
+    parser.add_argument("bands", nargs="*", default=DEFAULT_BANDS, help="Band names to enrich")
+    parser.add_argument("--batch-size", type=int, default=10, help="Bands per batched call")
+    args = parser.parse_args()
+
+    print(f"Enriching {len(args.bands)} bands\n")
+
+    start = time.perf_counter()
+    tokens, answered = await per_band(args.bands)
+    per_band_time = time.perf_counter() - start
+    print(f"Per band:      {per_band_time:6.1f}s  {tokens:7d} tokens  {answered}/{len(args.bands)} bands")
+
+    start = time.perf_counter()
+    batch_tokens, answered = await batched(args.bands, args.batch_size)
+    batch_time = time.perf_counter() - start
+    print(f"Batch of {args.batch_size:<3d}:  {batch_time:6.1f}s  {batch_tokens:7d} tokens  "
+          f"{answered}/{len(args.bands)} bands")
+
+    if tokens and per_band_time:
+        print(f"\nBatching used {batch_tokens / tokens:.2f}x the tokens "
+              f"and {batch_time / per_band_time:.2f}x the time of per-band calls")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+r"""
+Benchmark: image preprocessing savings against extraction accuracy
+
+For every poster in images/ and images_bank/ (or the files given), compares
+the original image with the preprocessed one (image_preprocess.py) for each
+--max-edge value:
+- bytes sent and pixel size
+- vision tokens, estimated with OpenAI's tile formula (no API key needed)
+With --extract, both versions also go through the extraction agent of
+lesson12-async.py, and the report adds the real input tokens and the band
+recall: the share of the bands found in the original that are still found
+in the preprocessed image. That costs real API calls.
+
+Run: python bench_preprocess.py --max-edge 1536 1024 768 --crop-borders --extract
+"""
+
+import argparse
+import asyncio
+import importlib
+import time
+from pathlib import Path
+
+from band_cache import normalize_band_name
+from image_preprocess import estimate_vision_tokens, image_size, preprocess_image
+
+SAMPLE_FOLDERS = [Path("images"), Path("images_bank")]
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
+
+
+async def extract(lesson, image_data: bytes, media_type: str) -> tuple[set[str], int]:
+    """Band names found by the extraction agent, and the input tokens used"""
+    result = await lesson.extraction_agent.run(lesson.extraction_prompt(image_data, media_type))
+    bands = {normalize_band_name(band.band_name) for band in result.output.bands}
+    return bands, result.usage().input_tokens
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Report preprocessing savings and extraction accuracy")
+    parser.add_argument("images", nargs="*", type=Path, help="Poster images (default: the sample folders)")
+    parser.add_argument("--max-edge", type=int, nargs="+", default=[1536, 1024, 768])
+    parser.add_argument("--crop-borders", action="store_true")
+    parser.add_argument("--extract", action="store_true", help="Also run the extraction agent (costs API calls)")
+    args = parser.parse_args()
+
+    images = args.images or sorted(path for folder in SAMPLE_FOLDERS if folder.exists()
+                                   for path in folder.iterdir() if path.suffix.lower() in IMAGE_EXTENSIONS)
+    # Only needs an API key when --extract is given
+    lesson = importlib.import_module("lesson12-async") if args.extract else None
+
+    print(f"{'image':36} {'version':10} {'size':>11} {'KB':>6} {'est. tok':>8} {'ms':>5}"
+          + (f" {'in tok':>7} {'recall':>6}" if lesson else ""))
+    totals: dict[str, list[int]] = {}
+    for image_path in images:
+        data = image_path.read_bytes()
+        if image_size(data) is None:
+            print(f"{image_path.name[:36]:36} skipped, not a readable image")
+            continue
+        media_type = 'image/png' if image_path.suffix.lower() == '.png' else 'image/jpeg'
+        versions = [('original', data, media_type, 0.0)]
+        for max_edge in args.max_edge:
+            start = time.perf_counter()
+            prepared, prepared_type = preprocess_image(data, media_type, max_edge, args.crop_borders)
+            versions.append((f"edge {max_edge}", prepared, prepared_type, time.perf_counter() - start))
+
+        reference: set[str] = set()
+        for name, version_data, version_type, seconds in versions:
+            width, height = image_size(version_data)
+            tokens = estimate_vision_tokens(width, height)
+            total = totals.setdefault(name, [0, 0])
+            total[0] += len(version_data)
+            total[1] += tokens
+            line = (f"{image_path.name[:36]:36} {name:10} {f'{width}x{height}':>11} "
+                    f"{len(version_data) // 1024:>6} {tokens:>8} {seconds * 1000:>5.0f}")
+            if lesson:
+                bands, input_tokens = await extract(lesson, version_data, version_type)
+                if name == 'original':
+                    reference = bands
+                recall = len(bands & reference) / len(reference) if reference else 1.0
+                line += f" {input_tokens:>7} {recall:>6.0%}"
+            print(line)
+
+    print()
+    original_bytes, original_tokens = totals['original']
+    for name, (total_bytes, total_tokens) in totals.items():
+        if name != 'original':
+            print(f"{name}: {total_bytes / original_bytes:.0%} of the bytes, "
+                  f"{total_tokens / original_tokens:.0%} of the estimated vision tokens")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
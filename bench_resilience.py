@@ -0,0 +1,115 @@
+r"""
+Benchmark: how many posters survive a flaky provider, with and without retries
+
+Runs extract_and_enrich() of lesson12-async.py on synthetic posters, with both
+agents replaced by a FaultInjector (resilience.py): a stand-in model that
+answers instantly (plus --latency), but fails --failure-rate of the calls
+with an HTTP 503 and hangs on --hang-rate of them. Every poster is run twice,
+with fresh, empty caches (in a temporary folder):
+- no retries: every failed or hanging call fails its stage
+- retries: the StageRunner with MAX_RETRIES and a short backoff
+A poster is "complete" when all its bands were enriched, "partial" when some
+bands are pending and "lost" when the extraction failed.
+
+Needs no API key and makes no real API calls.
+
+Run: python bench_resilience.py --posters 50 --failure-rate 0.2 --hang-rate 0.05
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from pydantic_ai.messages import ModelResponse, ToolCallPart
+
+from band_cache import BandKnowledgeStore
+from concert_store import PENDING_ENRICHMENT
+from extraction_cache import ExtractionCache
+from poster_index import PosterIndex
+from resilience import FaultInjector, RetryPolicy, StageRunner
+from single_flight import SingleFlight
+
+# lesson12-async.py has a dash in its name, so it can't be imported with a plain import
+lesson = importlib.import_module("lesson12-async")
+
+BANDS_PER_POSTER = 5
+
+
+def extraction_response(messages, info) -> ModelResponse:
+    """A poster with BANDS_PER_POSTER bands; the poster number is the image content"""
+    poster = messages[0].parts[0].content[1].data.decode()
+    bands = [{"band_name": f"{poster} band {i}",
+              "concerts": [{"venue": "Tavastia", "location": "Helsinki", "date": "1.1.2026", "event_name": None}]}
+             for i in range(BANDS_PER_POSTER)]
+    return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, json.dumps({"bands": bands}))])
+
+
+def enrichment_response(messages, info) -> ModelResponse:
+    return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name,
+                                             json.dumps({"genre": "Heavy Metal", "country": "Finland"}))])
+
+
+async def run(posters: int, retries: int, args: argparse.Namespace, folder: Path) -> tuple[int, int, int, float, str]:
+    """(complete, partial, lost, seconds, stage stats) of one run"""
+    name = f"retries-{retries}"
+    lesson.extraction_cache = ExtractionCache(path=folder / f"{name}-extractions.db")
+    lesson.poster_index = PosterIndex(path=folder / f"{name}-posters.db")
+    lesson.band_cache = BandKnowledgeStore(path=folder / f"{name}-bands.db")
+    lesson.band_flights = SingleFlight()
+    lesson.stages = StageRunner(RetryPolicy(retries=retries, base_delay=args.base_delay), retry_rate_limits=False)
+    extraction_faults = FaultInjector(extraction_response, args.failure_rate, args.hang_rate,
+                                      args.timeout * 10, args.latency, seed=1)
+    enrichment_faults = FaultInjector(enrichment_response, args.failure_rate, args.hang_rate,
+                                      args.timeout * 10, args.latency, seed=2)
+
+    async def one(index: int):
+        try:
+            return await lesson.extract_and_enrich(f"poster-{index}.png", f"poster {index}".encode(), 'image/png', False)
+        except Exception:
+            return None
+
+    start = time.perf_counter()
+    with lesson.extraction_agent.override(model=extraction_faults.model()), \
+            lesson.enrichment_agent.override(model=enrichment_faults.model()):
+        results = await asyncio.gather(*[one(i) for i in range(posters)])
+    elapsed = time.perf_counter() - start
+
+    lost = sum(result is None for result in results)
+    partial = sum(result is not None and any(band.genre == PENDING_ENRICHMENT for band in result.bands)
+                  for result in results)
+    return posters - lost - partial, partial, lost, elapsed, lesson.stages.stats()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Poster success rate under injected faults")
+    parser.add_argument("--posters", type=int, default=50)
+    parser.add_argument("--failure-rate", type=float, default=0.2, help="Share of calls failing with HTTP 503")
+    parser.add_argument("--hang-rate", type=float, default=0.05, help="Share of calls that hang")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds every call takes")
+    parser.add_argument("--timeout", type=float, default=0.5, help="Seconds per attempt (hangs last 10x as long)")
+    parser.add_argument("--base-delay", type=float, default=0.05, help="Backoff base delay in seconds")
+    args = parser.parse_args()
+
+    lesson.EXTRACTION_TIMEOUT = lesson.ENRICHMENT_TIMEOUT = args.timeout
+    # The stand-in model reports the image bytes as tokens, which would trip the tokens-per-minute cap
+    lesson.limiter.tokens_per_minute = None
+
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for retries in (0, lesson.MAX_RETRIES):
+            results.append((retries, *await run(args.posters, retries, args, Path(folder))))
+
+    print(f"\n{'retries':>7}  {'complete':>8}  {'partial':>7}  {'lost':>4}  {'time':>6}  posters/s")
+    for retries, complete, partial, lost, elapsed, _ in results:
+        print(f"{retries:>7}  {complete:>8}  {partial:>7}  {lost:>4}  {elapsed:>5.1f}s  {args.posters / elapsed:9.1f}")
+    for retries, *_, stage_stats in results:
+        print(f"\nWith {retries} retries:\n{stage_stats}")
+    lesson.preprocess_pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+r"""
+Benchmark: search_records latency against row count
+
+Builds synthetic concert datasets of growing size and times partial-match
+searches two ways:
+- linear: the old approach, a lowercase substring test of every value of every row
+- trigram: ConcertDataset.search(), which narrows the candidates with the
+  trigram index before the substring test
+
+No API key needed, everything runs locally.
+
+Run: python bench_search.py --sizes 1000 10000 100000
+"""
+
+import argparse
+import random
+import time
+from pathlib import Path
+
+from concert_dataset import ConcertDataset
+from concert_store import CSV_COLUMNS
+
+GENRES = ['Heavy Metal', 'Death Metal', 'Folk Metal', 'Punk', 'Indie Rock', 'Pop', 'Unknown']
+COUNTRIES = ['Finland', 'Sweden', 'Norway', 'USA', 'UK', 'Germany', 'Unknown']
+VENUES = [('Tavastia', 'Helsinki'), ('Pakkahuone', 'Tampere'), ('Klubi', 'Turku'), ('Lutakko', 'Jyväskylä')]
+EVENTS = ['', '', 'Tuska', 'Ruisrock', 'Saarihelvetti']
+TERMS = ['metal', 'tampere', 'band 123', 'saarihelvetti', 'xyz']
+
+
+def synthetic_rows(count: int, seed: int = 0) -> list[dict]:
+    """Concert rows that look like what lesson12-async.py writes"""
+    rng = random.Random(seed)
+    bands = [f"Band {i} {rng.choice(['of Doom', 'Collective', 'Orchestra', ''])}".strip()
+             for i in range(max(1, count // 5))]
+    rows = []
+    for i in range(count):
+        band = rng.choice(bands)
+        venue, location = rng.choice(VENUES)
+        rows.append(dict(zip(CSV_COLUMNS, [
+            f"2026-01-{i % 28 + 1:02d}T12:00:00", f"poster_{i // 40}.png", band,
+            GENRES[hash(band) % len(GENRES)], COUNTRIES[hash(band) % len(COUNTRIES)],
+            venue, location, f"{i % 28 + 1}.{i % 12 + 1}.2026", rng.choice(EVENTS),
+        ])))
+    return rows
+
+
+def linear_search(rows: list[dict], term: str) -> list[dict]:
+    """The original search_records loop"""
+    term_lower = term.lower()
+    return [row for row in rows if any(term_lower in str(value).lower() for value in row.values())]
+
+
+def timed(func, repeat: int = 3) -> tuple[float, object]:
+    """Best time of `repeat` calls in milliseconds, and the last result"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare linear and trigram search latency")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>9}  {'build':>8}  {'linear':>9}  {'trigram':>9}  speedup")
+    for size in args.sizes:
+        rows = synthetic_rows(size)
+        # refresh() is never called, so the files are not read: rows are added directly
+        dataset = ConcertDataset(Path("concerts-async.db"), Path("concerts-async.csv"))
+        start = time.perf_counter()
+        dataset.add_rows(rows)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        linear_ms = trigram_ms = 0.0
+        for term in TERMS:
+            elapsed, expected = timed(lambda: linear_search(rows, term))
+            linear_ms += elapsed
+            elapsed, found = timed(lambda: dataset.search(term))
+            trigram_ms += elapsed
+            assert [dataset.row(i) for i in found] == expected, term
+
+        linear_ms /= len(TERMS)
+        trigram_ms /= len(TERMS)
+        print(f"{size:>9}  {build_ms:>6.0f}ms  {linear_ms:>7.2f}ms  {trigram_ms:>7.2f}ms  "
+              f"{linear_ms / trigram_ms:6.0f}x")
+
+
+if __name__ == "__main__":
+    main()
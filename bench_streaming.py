@@ -0,0 +1,65 @@
+r"""
+Benchmark: end-to-end poster latency with and without streaming extraction
+
+Runs extract_and_enrich() of lesson12-async.py on each poster twice:
+- sequential: Agent 2 starts after Agent 1 returned the whole extraction
+- streaming: Agent 2 starts on each band as soon as Agent 1 finished writing it
+Every run gets fresh, empty caches (in a temporary folder), so both modes
+really call both agents. Nothing is written to the concert database.
+
+Each run costs real API calls, so keep the poster list small.
+
+Run: python bench_streaming.py images_watchfolder/poster1.jpg images_watchfolder/poster2.png
+"""
+
+import argparse
+import asyncio
+import importlib
+import tempfile
+import time
+from pathlib import Path
+
+from band_cache import BandKnowledgeStore
+from extraction_cache import ExtractionCache
+from poster_index import PosterIndex
+from single_flight import SingleFlight
+
+# lesson12-async.py has a dash in its name, so it can't be imported with a plain import
+lesson = importlib.import_module("lesson12-async")
+
+
+async def timed_run(image_path: Path, streaming: bool, folder: Path) -> tuple[float, int]:
+    """Seconds to extract and enrich one poster with empty caches, and the number of bands"""
+    name = f"{image_path.stem}-{'streaming' if streaming else 'sequential'}"
+    lesson.extraction_cache = ExtractionCache(path=folder / f"{name}-extractions.db")
+    lesson.poster_index = PosterIndex(path=folder / f"{name}-posters.db")
+    lesson.band_cache = BandKnowledgeStore(path=folder / f"{name}-bands.db")
+    lesson.band_flights = SingleFlight()
+
+    start = time.perf_counter()
+    extraction = await lesson.extract_and_enrich(
+        image_path.name, image_path.read_bytes(), lesson.get_media_type(image_path), streaming
+    )
+    return time.perf_counter() - start, len(extraction.bands)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare sequential and streaming extraction latency")
+    parser.add_argument("images", nargs="+", type=Path, help="Poster images")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for image_path in args.images:
+            sequential, bands = await timed_run(image_path, False, Path(folder))
+            streaming, _ = await timed_run(image_path, True, Path(folder))
+            results.append((image_path.name, bands, sequential, streaming))
+
+    print(f"\n{'poster':30}  {'bands':>5}  {'sequential':>10}  {'streaming':>9}  saved")
+    for name, bands, sequential, streaming in results:
+        print(f"{name:30}  {bands:>5}  {sequential:>9.1f}s  {streaming:>8.1f}s  "
+              f"{(1 - streaming / sequential) * 100:4.0f}%")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+r"""
+Benchmark: single-shot vs. tiled extraction of big posters
+
+Extracts each poster twice with the extraction agent of lesson12-async.py:
+- single shot: the whole (preprocessed) image in one call
+- tiled: tiled_extraction(), TILE_GRID overlapping tiles extracted concurrently,
+  then merged (the per-tile latency is printed while it runs)
+and compares the wall-clock time and the bands found. There is no ground truth,
+so recall is measured against the union of the bands both modes found.
+
+Each run costs real API calls.
+
+Run: python bench_tiles.py images/saarihelvetti_2026.png --grid 2 2
+"""
+
+import argparse
+import asyncio
+import importlib
+import time
+from pathlib import Path
+
+from band_cache import normalize_band_name
+
+# lesson12-async.py has a dash in its name, so it can't be imported with a plain import
+lesson = importlib.import_module("lesson12-async")
+
+
+async def single_shot(image_data: bytes, media_type: str) -> set[str]:
+    image_data, media_type = await lesson.prepare_image(image_data, media_type)
+    result = await lesson.limiter.run(
+        lambda: lesson.extraction_agent.run(lesson.extraction_prompt(image_data, media_type))
+    )
+    return {normalize_band_name(band.band_name) for band in result.output.bands}
+
+
+async def tiled(image_data: bytes, media_type: str) -> set[str]:
+    extraction = await lesson.tiled_extraction(image_data, media_type, lambda band_info: None)
+    if extraction is None:
+        raise SystemExit("Tiling needs pillow (pip3 install pillow)")
+    return {normalize_band_name(band.band_name) for band in extraction.bands}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare single-shot and tiled extraction")
+    parser.add_argument("images", nargs="+", type=Path, help="Poster images")
+    parser.add_argument("--grid", type=int, nargs=2, default=list(lesson.TILE_GRID), metavar=("ROWS", "COLS"))
+    parser.add_argument("--overlap", type=float, default=lesson.TILE_OVERLAP)
+    args = parser.parse_args()
+    lesson.TILE_GRID = tuple(args.grid)
+    lesson.TILE_OVERLAP = args.overlap
+
+    results = []
+    for image_path in args.images:
+        image_data = image_path.read_bytes()
+        media_type = lesson.get_media_type(image_path)
+        print(f"\n{image_path.name}")
+
+        start = time.perf_counter()
+        single_bands = await single_shot(image_data, media_type)
+        single_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        tiled_bands = await tiled(image_data, media_type)
+        tiled_time = time.perf_counter() - start
+
+        union = single_bands | tiled_bands
+        results.append((image_path.name, single_time, len(single_bands), tiled_time, len(tiled_bands), len(union)))
+        if tiled_bands - single_bands:
+            print(f"   Only found tiled: {', '.join(sorted(tiled_bands - single_bands))}")
+        if single_bands - tiled_bands:
+            print(f"   Only found single shot: {', '.join(sorted(single_bands - tiled_bands))}")
+
+    print(f"\n{'poster':30}  {'single':>7} {'bands':>5} {'recall':>6}  {'tiled':>7} {'bands':>5} {'recall':>6}")
+    for name, single_time, single_count, tiled_time, tiled_count, union in results:
+        print(f"{name:30}  {single_time:>6.1f}s {single_count:>5} {single_count / max(1, union):>6.0%}  "
+              f"{tiled_time:>6.1f}s {tiled_count:>5} {tiled_count / max(1, union):>6.0%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
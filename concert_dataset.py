@@ -0,0 +1,263 @@
+r"""
+Concert dataset: the concert rows kept in memory, indexed, for the MCP server.
+
+Reading and parsing the whole CSV on every tool call gets slow as the data
+grows. The dataset loads the rows once and then only checks, on every call,
+whether the source has changed:
+- CSV file: its mtime and size. When the file only grew (the normal case,
+  lesson12-async.py appends), only the new bytes are parsed. The header and
+  the last bytes read so far are kept as a fingerprint: if they changed, the
+  file was rewritten (e.g. by ConcertStore.export_csv() after pending genres
+  were filled in, which can make it larger), and it is read again from the start
+- SQLite database (concert_store.py): its revision counter. Only the rows
+  added since the last load are fetched, unless the genre or country of a
+  stored band changed (its updates counter): then everything is loaded again
+
+The table is stored column by column. Genres, countries, venues and image
+names repeat all the time, so every column is dictionary-encoded: each
+distinct value is stored once, and the column itself is a compact array of
+integer codes. Each column also keeps, per code, how many rows have it and
+which rows those are (an inverted index), so counting genres or finding the
+rows of a band never has to look at every row.
+
+Partial-match lookups ("metal" in "Heavy Metal") use a trigram index over the
+distinct lowercase values of each column: only values that contain every
+3-letter piece of the search term are checked with the real substring test.
+All indexes are updated row by row as rows are appended.
+
+Used by: lesson13_mcp_server.py
+"""
+
+import csv
+import io
+from array import array
+from collections import Counter
+from pathlib import Path
+
+from concert_store import CSV_COLUMNS, ConcertStore
+
+# Bytes before the read offset that must be unchanged for the CSV to count as only appended to
+CSV_FINGERPRINT_BYTES = 256
+
+
+def trigrams(text: str) -> set[str]:
+    """All 3-character substrings of `text`"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Trigram index over a growing set of distinct strings"""
+
+    def __init__(self):
+        self.values: list[str] = []
+        self._ids: dict[str, int] = {}
+        # trigram -> ids of the values that contain it, in insertion order
+        self._postings: dict[str, list[int]] = {}
+
+    def add(self, value: str):
+        """Index `value` (ignored if it is already indexed)"""
+        if value in self._ids:
+            return
+        value_id = len(self.values)
+        self._ids[value] = value_id
+        self.values.append(value)
+        for gram in trigrams(value):
+            self._postings.setdefault(gram, []).append(value_id)
+
+    def find(self, term: str) -> list[str]:
+        """All indexed values that contain `term`"""
+        grams = trigrams(term)
+        if not grams:
+            # Too short for trigrams, check every distinct value
+            return [value for value in self.values if term in value]
+        postings = sorted((self._postings.get(gram, []) for gram in grams), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(posting)
+        # Having all trigrams doesn't mean they're in the right order, so check
+        return [self.values[i] for i in candidates if term in self.values[i]]
+
+
+class Column:
+    """One dictionary-encoded column with an inverted index"""
+
+    def __init__(self):
+        self.values: list[str] = []  # code -> value
+        self.codes = array('I')  # row -> code
+        self.counts: list[int] = []  # code -> number of rows
+        self.rows_by_code: list[array] = []  # code -> row numbers
+        self._code_of: dict[str, int] = {}
+        # lowercase value -> codes (several spellings can share a lowercase value)
+        self._codes_by_lower: dict[str, list[int]] = {}
+        self._trigrams = TrigramIndex()
+
+    def append(self, value: str, row_id: int) -> int:
+        """Add the value of row `row_id` and return its code"""
+        code = self._code_of.get(value)
+        if code is None:
+            code = len(self.values)
+            self._code_of[value] = code
+            self.values.append(value)
+            self.counts.append(0)
+            self.rows_by_code.append(array('I'))
+            lower = value.lower()
+            self._codes_by_lower.setdefault(lower, []).append(code)
+            self._trigrams.add(lower)
+        self.codes.append(code)
+        self.counts[code] += 1
+        self.rows_by_code[code].append(row_id)
+        return code
+
+    def __getitem__(self, row_id: int) -> str:
+        return self.values[self.codes[row_id]]
+
+    def matching_codes(self, term: str) -> list[int]:
+        """Codes of the values that contain `term` (case-insensitive)"""
+        return [code for lower in self._trigrams.find(term.lower()) for code in self._codes_by_lower[lower]]
+
+    def matching_rows(self, term: str) -> list[int]:
+        """Row numbers whose value contains `term` (case-insensitive), in file order"""
+        row_ids: list[int] = []
+        for code in self.matching_codes(term):
+            row_ids.extend(self.rows_by_code[code])
+        return sorted(row_ids)
+
+    def value_counts(self) -> Counter:
+        """Number of rows per (non-empty) value"""
+        return Counter({value: count for value, count in zip(self.values, self.counts) if value})
+
+
+class ConcertDataset:
+    """In-memory, column-oriented concert table with indexes"""
+
+    def __init__(self, db_file: Path, csv_file: Path):
+        self.db_file = db_file
+        self.csv_file = csv_file
+        self._clear()
+
+    def _clear(self):
+        self.columns: dict[str, Column] = {column: Column() for column in CSV_COLUMNS}
+        self._size = 0
+        # genre/country code -> band codes, for the "bands by ..." questions
+        self._band_codes: dict[str, list[set[int]]] = {'genre': [], 'country': []}
+        self._source: Path | None = None
+        self._signature: tuple | None = None
+        self._store: ConcertStore | None = None
+        self._csv_offset = 0
+        self._csv_fields: list[str] = CSV_COLUMNS
+        # (header line, last CSV_FINGERPRINT_BYTES bytes read) of the CSV
+        self._csv_fingerprint: tuple[bytes, bytes] = (b'', b'')
+        self._last_id = 0
+
+    def refresh(self):
+        """Load new rows if the source changed since the last call"""
+        if self.db_file.exists():
+            if self._source != self.db_file:
+                self._clear()
+                self._source = self.db_file
+                self._store = ConcertStore(self.db_file)
+            revision, updates = self._store.revision(), self._store.updates()
+            if self._signature is not None and updates != self._signature[1]:
+                # Rows that are already loaded changed, rebuild every index
+                store = self._store
+                self._clear()
+                self._source, self._store = self.db_file, store
+            if (revision, updates) != self._signature:
+                self._last_id, rows = self._store.rows_since(self._last_id)
+                self.add_rows(rows)
+                self._signature = (revision, updates)
+        elif self.csv_file.exists():
+            if self._source != self.csv_file:
+                self._clear()
+                self._source = self.csv_file
+            stat = self.csv_file.stat()
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if signature != self._signature:
+                if stat.st_size < self._csv_offset or not self._csv_only_appended():
+                    # The file was replaced, truncated or rewritten, start over
+                    self._clear()
+                    self._source = self.csv_file
+                self._read_csv()
+                self._signature = signature
+        else:
+            self._clear()
+
+    def _csv_only_appended(self) -> bool:
+        """True if the part of the CSV that was already read is unchanged"""
+        if self._csv_offset == 0:
+            return True
+        header, tail = self._csv_fingerprint
+        with open(self.csv_file, 'rb') as f:
+            if f.readline() != header:
+                return False
+            f.seek(self._csv_offset - len(tail))
+            return f.read(len(tail)) == tail
+
+    def _read_csv(self):
+        """Parse the CSV from where the previous read stopped"""
+        with open(self.csv_file, 'rb') as f:
+            f.seek(self._csv_offset)
+            data = f.read()
+        # Only complete lines: the writer may be in the middle of a row
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            return
+        header, tail = self._csv_fingerprint
+        if self._csv_offset == 0:
+            header = data[:data.find(b'\n') + 1]
+        self._csv_fingerprint = (header, (tail + data[:end])[-CSV_FINGERPRINT_BYTES:])
+        text = data[:end].decode('utf-8')
+        if self._csv_offset == 0:
+            reader = csv.DictReader(io.StringIO(text))
+        else:
+            reader = csv.DictReader(io.StringIO(text), fieldnames=self._csv_fields)
+        rows = list(reader)
+        if self._csv_offset == 0 and reader.fieldnames:
+            self._csv_fields = list(reader.fieldnames)
+        self._csv_offset += end
+        self.add_rows(rows)
+
+    def add_rows(self, rows: list[dict]):
+        """Append rows and update every index"""
+        for row in rows:
+            row_id = self._size
+            codes = {column: self.columns[column].append(row.get(column) or '', row_id)
+                     for column in CSV_COLUMNS}
+            for column, band_codes in self._band_codes.items():
+                while len(band_codes) <= codes[column]:
+                    band_codes.append(set())
+                band_codes[codes[column]].add(codes['band_name'])
+            self._size += 1
+
+    def __len__(self) -> int:
+        return self._size
+
+    def row(self, row_id: int) -> dict:
+        """One row as a dict with the CSV columns"""
+        return {name: column[row_id] for name, column in self.columns.items()}
+
+    def value_counts(self, column: str) -> Counter:
+        """Number of rows per value of `column`"""
+        return self.columns[column].value_counts()
+
+    def match(self, column: str, term: str) -> list[int]:
+        """Row numbers whose `column` contains `term` (case-insensitive), in file order"""
+        return self.columns[column].matching_rows(term)
+
+    def bands_matching(self, column: str, term: str) -> set[str]:
+        """Band names whose genre or country contains `term` (case-insensitive)"""
+        band_codes: set[int] = set()
+        for code in self.columns[column].matching_codes(term):
+            band_codes |= self._band_codes[column][code]
+        band_names = self.columns['band_name'].values
+        return {band_names[code] for code in band_codes}
+
+    def search(self, term: str) -> list[int]:
+        """Row numbers where any column contains `term` (case-insensitive)"""
+        row_ids: set[int] = set()
+        for column in self.columns.values():
+            for code in column.matching_codes(term):
+                row_ids.update(column.rows_by_code[code])
+        return sorted(row_ids)
@@ -0,0 +1,304 @@
+r"""
+Concert store: SQLite storage for the extracted and enriched concert data.
+
+Appending to a CSV file works for a workshop, but it has no locking, and every
+reader has to parse the whole file again. This store keeps the same data in a
+normalized SQLite database instead:
+
+    bands          (name, genre, country)
+    venues         (name, location)
+    source_images  (name)
+    concerts       (timestamp, source image, band, venue, date, event name)
+
+- WAL mode: readers (lesson13*.py) never block the writer and vice versa
+- Indexes on band name, genre, country and date
+- All rows of one call to add_rows() are written in a single transaction, and
+  add_batch() writes the rows of several images in one transaction (with an
+  optional fsync), for a writer that groups posters
+- add_rows() can take an ingest key (the content hash of the poster): the key is
+  stored in the same transaction, and rows with a key that is already stored
+  are skipped, so writing the same poster twice never duplicates its concerts
+- A band whose enrichment failed is stored with PENDING_ENRICHMENT as genre and
+  country; pending_bands() and update_band() fill them in later
+- revision() changes with every write; updates() only when the genre or
+  country of a stored band changed, so a reader that only fetches the new
+  rows (rows_since) knows when its older rows are out of date
+- The CSV file stays available as an export: new rows are also appended to it,
+  and the whole CSV can be regenerated from the database at any time
+
+Rows go in and come out as dicts with the CSV columns, so the rest of the code
+does not need to know about the schema.
+
+Run: python concert_store.py export concerts-async.db concerts-async.csv
+     python concert_store.py import concerts-async.csv concerts-async.db
+Used by: lesson12.py, lesson12-async.py, lesson13.py, lesson13_mcp_server.py, batch_writer.py, backfill.py
+"""
+
+import csv
+import os
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+from typing import Iterable
+
+from band_cache import normalize_band_name
+
+# Genre and country of a band whose enrichment failed, until it is looked up again
+PENDING_ENRICHMENT = 'Pending'
+
+CSV_COLUMNS = ['timestamp', 'source_image', 'band_name', 'genre', 'country', 'venue', 'location', 'date', 'event_name']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bands (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL UNIQUE,
+    genre TEXT NOT NULL,
+    country TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS venues (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    location TEXT NOT NULL,
+    UNIQUE (name, location)
+);
+CREATE TABLE IF NOT EXISTS source_images (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS concerts (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    source_image_id INTEGER NOT NULL REFERENCES source_images (id),
+    band_id INTEGER NOT NULL REFERENCES bands (id),
+    venue_id INTEGER NOT NULL REFERENCES venues (id),
+    date TEXT NOT NULL,
+    event_name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ingested (
+    ingest_key TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bands_name ON bands (name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_bands_genre ON bands (genre COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_bands_country ON bands (country COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_concerts_date ON concerts (date);
+CREATE INDEX IF NOT EXISTS idx_concerts_band ON concerts (band_id);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('updates', 0);
+"""
+
+SELECT_ROWS = """
+SELECT c.id, c.timestamp, s.name, b.name, b.genre, b.country, v.name, v.location, c.date, c.event_name
+FROM concerts c
+JOIN source_images s ON s.id = c.source_image_id
+JOIN bands b ON b.id = c.band_id
+JOIN venues v ON v.id = c.venue_id
+WHERE c.id > ?
+ORDER BY c.id
+"""
+
+
+class ConcertStore:
+    """Normalized SQLite concert database with an optional CSV export"""
+
+    def __init__(self, path: Path, csv_export: Path | None = None):
+        self.path = path
+        self.csv_export = csv_export
+        # Shared by several threads (readiness thread, the writer's asyncio.to_thread flushes), one query at a time
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def add_rows(self, rows: Iterable[dict], ingest_key: str | None = None) -> int:
+        """Write concert rows (dicts with CSV_COLUMNS) in one transaction.
+        With an `ingest_key`, rows already written under the same key are not written again."""
+        return self.add_batch([(list(rows), ingest_key)])[0]
+
+    def add_batch(self, batches: list[tuple[list[dict], str | None]], fsync: bool = False) -> list[int]:
+        """Write the rows of several images, each (rows, ingest key), in one transaction
+        and one CSV append; returns the number of rows written per image.
+        With `fsync`, the commit and the CSV append are synced to disk before returning."""
+        counts = []
+        written = []
+        updated = False
+        with self._lock:
+            if fsync:
+                self._conn.execute("PRAGMA synchronous=FULL")
+            try:
+                with self._conn:
+                    for rows, ingest_key in batches:
+                        if not rows or (ingest_key is not None and not self._conn.execute(
+                            "INSERT OR IGNORE INTO ingested (ingest_key) VALUES (?)", (ingest_key,)
+                        ).rowcount):
+                            counts.append(0)
+                            continue
+                        for row in rows:
+                            updated |= self._insert(row)
+                        written.extend(rows)
+                        counts.append(len(rows))
+                    if written:
+                        self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+                    if updated:
+                        self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'updates'")
+            finally:
+                if fsync:
+                    self._conn.execute("PRAGMA synchronous=NORMAL")
+            if written and self.csv_export is not None:
+                self._append_csv(written, fsync)
+        return counts
+
+    def _insert(self, row: dict) -> bool:
+        """Insert one row; True if it changed the genre or country of a stored band"""
+        conn = self._conn
+        name_key = normalize_band_name(row['band_name'])
+        before = conn.execute("SELECT genre, country FROM bands WHERE name_key = ?", (name_key,)).fetchone()
+        # Latest genre/country wins (a pending one never replaces a known one), the band itself is stored once
+        band_id, genre, country = conn.execute(
+            "INSERT INTO bands (name, name_key, genre, country) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (name_key) DO UPDATE SET "
+            "genre = CASE WHEN excluded.genre = ? THEN genre ELSE excluded.genre END, "
+            "country = CASE WHEN excluded.genre = ? THEN country ELSE excluded.country END "
+            "RETURNING id, genre, country",
+            (row['band_name'], name_key, row.get('genre') or 'Unknown', row.get('country') or 'Unknown',
+             PENDING_ENRICHMENT, PENDING_ENRICHMENT),
+        ).fetchone()
+        venue_id = conn.execute(
+            "INSERT INTO venues (name, location) VALUES (?, ?) "
+            "ON CONFLICT (name, location) DO UPDATE SET name = excluded.name RETURNING id",
+            (row['venue'], row['location']),
+        ).fetchone()[0]
+        image_id = conn.execute(
+            "INSERT INTO source_images (name) VALUES (?) "
+            "ON CONFLICT (name) DO UPDATE SET name = excluded.name RETURNING id",
+            (row['source_image'],),
+        ).fetchone()[0]
+        conn.execute(
+            "INSERT INTO concerts (timestamp, source_image_id, band_id, venue_id, date, event_name) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (row['timestamp'], image_id, band_id, venue_id, row['date'], row.get('event_name') or ''),
+        )
+        return before is not None and before != (genre, country)
+
+    def _append_csv(self, rows: list[dict], fsync: bool = False):
+        write_header = not self.csv_export.exists()
+        with open(self.csv_export, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+            if write_header:
+                writer.writeheader()
+            writer.writerows(rows)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def rows(self) -> list[dict]:
+        """All concert rows as CSV-style dicts"""
+        return self.rows_since(0)[1]
+
+    def rows_since(self, after_id: int) -> tuple[int, list[dict]]:
+        """Rows added after concert id `after_id`, and the id of the last one"""
+        with self._lock:
+            result = self._conn.execute(SELECT_ROWS, (after_id,)).fetchall()
+        last_id = result[-1][0] if result else after_id
+        return last_id, [dict(zip(CSV_COLUMNS, row[1:])) for row in result]
+
+    def pending_bands(self) -> list[str]:
+        """Names of the bands saved with a pending enrichment"""
+        with self._lock:
+            return [name for (name,) in self._conn.execute(
+                "SELECT name FROM bands WHERE genre = ? ORDER BY name", (PENDING_ENRICHMENT,)
+            )]
+
+    def update_band(self, band_name: str, genre: str, country: str) -> bool:
+        """Set the genre and country of a stored band; True if the band exists"""
+        with self._lock:
+            with self._conn:
+                updated = self._conn.execute(
+                    "UPDATE bands SET genre = ?, country = ? WHERE name_key = ?",
+                    (genre, country, normalize_band_name(band_name)),
+                ).rowcount
+                if updated:
+                    self._conn.execute(
+                        "UPDATE meta SET value = value + 1 WHERE key IN ('revision', 'updates')"
+                    )
+        return bool(updated)
+
+    def revision(self) -> int:
+        """A number that changes every time rows are added or changed"""
+        with self._lock:
+            return self._conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+
+    def updates(self) -> int:
+        """A number that changes every time stored rows are changed in place (band genre or country)"""
+        with self._lock:
+            return self._conn.execute("SELECT value FROM meta WHERE key = 'updates'").fetchone()[0]
+
+    def export_csv(self, path: Path) -> int:
+        """(Re)write the whole database as a CSV file"""
+        rows = self.rows()
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        return len(rows)
+
+    def repair_csv_export(self) -> bool:
+        """Rewrite the CSV export if its header is not CSV_COLUMNS (e.g. a file of lesson11.py)
+        or its row count differs from the database (a crash between the database commit and
+        the CSV append); True if rewritten"""
+        if self.csv_export is None:
+            return False
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM concerts").fetchone()[0]
+        header, exported = None, 0
+        if self.csv_export.exists():
+            with open(self.csv_export, 'r', newline='') as f:
+                reader = csv.DictReader(f)
+                exported = sum(1 for _ in reader)
+                header = reader.fieldnames
+        if exported == count and (header == CSV_COLUMNS or (header is None and count == 0)):
+            return False
+        self.export_csv(self.csv_export)
+        return True
+
+    def import_csv(self, path: Path) -> int:
+        """Load an existing CSV file (e.g. from before the store existed).
+        A file without genre and country columns (lesson11.py) is imported with 'Unknown' for both."""
+        with open(path, 'r', newline='') as f:
+            rows = [row for row in csv.DictReader(f) if row.get('band_name')]
+        # Don't echo the imported rows back into the export file
+        csv_export, self.csv_export = self.csv_export, None
+        try:
+            return self.add_rows(rows)
+        finally:
+            self.csv_export = csv_export
+
+
+def read_rows(db_file: Path, csv_file: Path) -> list[dict]:
+    """Rows from the database if it exists, otherwise from the CSV file"""
+    if db_file.exists():
+        return ConcertStore(db_file).rows()
+    if not csv_file.exists():
+        return []
+    with open(csv_file, 'r', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4 or sys.argv[1] not in ('export', 'import'):
+        print("Usage: python concert_store.py export <db> <csv>")
+        print("       python concert_store.py import <csv> <db>")
+        sys.exit(1)
+    if sys.argv[1] == 'export':
+        count = ConcertStore(Path(sys.argv[2])).export_csv(Path(sys.argv[3]))
+        print(f"Exported {count} rows to {sys.argv[3]}")
+    else:
+        count = ConcertStore(Path(sys.argv[3])).import_csv(Path(sys.argv[2]))
+        print(f"Imported {count} rows into {sys.argv[3]}")
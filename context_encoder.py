@@ -0,0 +1,205 @@
+r"""
+Context encoder: a compact text version of the concert data for the LLM prompt.
+
+Printing every row as a Python dict repeats all column names, the timestamp
+and the source image on every line. This encoder writes the same data in far
+fewer tokens:
+- the format is declared once at the top
+- columns that don't help answer questions (timestamp, source_image) are dropped
+- values that repeat (venues, events, ...) get a short code like V3, with a legend
+- concerts are grouped under their band, so the band name, genre and country
+  are written once per band instead of once per concert
+- the token count is measured, and bands are left out (with a note saying so)
+  when the text would go over the token budget
+
+build_prefix() puts the static agent instructions in front of the encoded data
+and makes the result byte-identical for the same data: rows are sorted first,
+so their order in the database or CSV does not matter, and the text carries a
+format version and a snapshot hash of the data. Providers cache a prompt prefix
+they have seen before (OpenAI automatically, Anthropic with cache_control), so
+every question after the first pays much less for the data.
+tests/test_context_encoder.py checks the byte stability offline; on real data run: python context_encoder.py
+
+Token counts use tiktoken when it is installed (pip3 install tiktoken),
+otherwise a ~4 characters per token estimate.
+
+Used by: lesson13.py, lesson13_auto.py
+"""
+
+import argparse
+import functools
+import hashlib
+import random
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+
+from band_cache import normalize_band_name
+from concert_store import CSV_COLUMNS, read_rows
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+DEFAULT_EXCLUDED_COLUMNS = ('timestamp', 'source_image')
+BAND_COLUMNS = ('genre', 'country')
+# Columns written per concert, and the prefix of their dictionary codes (None = never coded)
+CONCERT_COLUMNS = {'venue': 'V', 'date': None, 'event_name': 'E', 'source_image': 'S', 'timestamp': None}
+# Tokens kept free for the "bands left out" note
+NOTE_TOKENS = 20
+# Bump when the text format changes, so cached prefixes of the old format are not reused
+CONTEXT_FORMAT_VERSION = 1
+
+
+@dataclass
+class EncodedContext:
+    """The encoded text and how it was built"""
+    text: str
+    tokens: int
+    bands_included: int
+    bands_total: int
+
+
+@functools.cache
+def _encoding():
+    """The tiktoken encoding, or None if tiktoken or its data file is not available"""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding('o200k_base')
+    except Exception:
+        # The encoding is downloaded on first use, which fails offline
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in `text` (tiktoken if available, otherwise an estimate)"""
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def _concert_value(row: dict, column: str) -> str:
+    if column == 'venue':
+        # Venue and location always go together
+        venue, location = row.get('venue') or '', row.get('location') or ''
+        return f"{venue} ({location})" if location else venue
+    return row.get(column) or ''
+
+
+def encode_rows(
+    rows: list[dict],
+    token_budget: int | None = None,
+    excluded_columns: tuple[str, ...] = DEFAULT_EXCLUDED_COLUMNS,
+) -> EncodedContext:
+    """Encode concert rows (dicts with the CSV columns) as compact text"""
+    band_columns = [column for column in BAND_COLUMNS if column not in excluded_columns]
+    concert_columns = [column for column in CONCERT_COLUMNS if column not in excluded_columns]
+
+    # Group concerts under their band, keeping the first spelling of the name
+    bands: dict[str, dict] = {}
+    for row in rows:
+        key = normalize_band_name(row.get('band_name') or '')
+        band = bands.setdefault(key, {'name': row.get('band_name') or '', 'rows': []})
+        band['rows'].append(row)
+
+    # Dictionary-encode repeated values, when the code saves more than its legend entry costs
+    legend: list[str] = []
+    codes: dict[str, dict[str, str]] = {column: {} for column in concert_columns}
+    for column in concert_columns:
+        prefix = CONCERT_COLUMNS[column]
+        if prefix is None:
+            continue
+        counts = Counter(_concert_value(row, column) for row in rows)
+        for value, count in counts.most_common():
+            code = f"{prefix}{len(codes[column]) + 1}"
+            if count * (len(value) - len(code)) > len(code) + len(value) + 2:
+                codes[column][value] = code
+        if codes[column]:
+            legend.append(f"{column}: " + "; ".join(f"{code}={value}" for value, code in codes[column].items()))
+
+    header = [
+        f"Concert database: {len(rows)} concerts, {len(bands)} bands.",
+        f"One line per band: band | {' | '.join(band_columns)}: concerts separated by ';', "
+        f"each concert is {', '.join(concert_columns).replace('venue', 'venue (location)')} ('-' = missing).",
+    ]
+    if legend:
+        header.append("Codes used in the concerts:")
+        header.extend(legend)
+    header.append("---")
+
+    lines = list(header)
+    tokens = count_tokens("\n".join(header))
+    included = 0
+    for band in bands.values():
+        band_values = []
+        for column in band_columns:
+            values = dict.fromkeys(row.get(column) or '-' for row in band['rows'])
+            band_values.append("/".join(values))
+        concerts = []
+        for row in band['rows']:
+            fields = []
+            for column in concert_columns:
+                value = _concert_value(row, column)
+                fields.append(codes[column].get(value, value) or '-')
+            concerts.append(", ".join(fields))
+        line = f"{' | '.join([band['name']] + band_values)}: {'; '.join(concerts)}"
+        line_tokens = count_tokens(line)
+        if token_budget is not None and tokens + line_tokens > token_budget - NOTE_TOKENS:
+            break
+        lines.append(line)
+        tokens += line_tokens
+        included += 1
+
+    if included < len(bands):
+        note = f"... {len(bands) - included} more band(s) left out to stay within the token budget"
+        lines.append(note)
+        tokens += count_tokens(note)
+    return EncodedContext(text="\n".join(lines), tokens=tokens, bands_included=included, bands_total=len(bands))
+
+
+def sort_rows(rows: list[dict]) -> list[dict]:
+    """Rows in a fixed order: by band, then by every column"""
+    return sorted(rows, key=lambda row: (normalize_band_name(row.get('band_name') or ''),
+                                          *(row.get(column) or '' for column in CSV_COLUMNS)))
+
+
+def build_prefix(
+    instructions: str,
+    rows: list[dict],
+    token_budget: int | None = None,
+    excluded_columns: tuple[str, ...] = DEFAULT_EXCLUDED_COLUMNS,
+) -> EncodedContext:
+    """Instructions followed by the encoded data, byte-identical for the same rows in any order"""
+    if rows:
+        encoded = encode_rows(sort_rows(rows), token_budget, excluded_columns)
+    else:
+        encoded = EncodedContext(text="The database is empty.", tokens=0, bands_included=0, bands_total=0)
+    snapshot = hashlib.sha256(encoded.text.encode()).hexdigest()[:12]
+    text = (f"{instructions.strip()}\n\n"
+            f"Here is the concert database (format v{CONTEXT_FORMAT_VERSION}, snapshot {snapshot}):\n\n"
+            f"{encoded.text}")
+    return EncodedContext(text=text, tokens=count_tokens(text), bands_included=encoded.bands_included,
+                          bands_total=encoded.bands_total)
+
+
+def main():
+    """Build the prefix from two loads of the data (one shuffled) and check they are identical"""
+    parser = argparse.ArgumentParser(description="Check that the prompt prefix is byte-stable")
+    parser.add_argument("--db", type=Path, default=Path("concerts-async.db"))
+    parser.add_argument("--csv", type=Path, default=Path("concerts-async.csv"))
+    args = parser.parse_args()
+
+    first = build_prefix("Instructions.", read_rows(args.db, args.csv))
+    reloaded = read_rows(args.db, args.csv)
+    random.shuffle(reloaded)
+    second = build_prefix("Instructions.", reloaded)
+
+    print(f"Prefix: {first.tokens} tokens, sha256 {hashlib.sha256(first.text.encode()).hexdigest()}")
+    print("Byte-identical across reloads" if first.text == second.text else "NOT byte-identical across reloads")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+r"""
+Extraction cache: remember what the extraction agent already found in a poster.
+
+The cache key is the SHA-256 of the image bytes plus the model name and a hash
+of the agent instructions. Renamed or re-dropped posters therefore hit the cache,
+while changing the model or the prompt automatically misses it.
+The validated extraction is stored as JSON in a small SQLite file.
+
+Eviction:
+- entries older than `max_age_days` are dropped
+- when there are more than `max_entries` (or more than `max_bytes` of JSON),
+  the least recently used entries are dropped
+
+Used by: lesson11.py, lesson12.py, lesson12-async.py
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar('T', bound=BaseModel)
+
+
+class ExtractionCache:
+    """Persistent content-hash cache for validated extraction results"""
+
+    def __init__(
+        self,
+        path: Path = Path("extraction_cache.db"),
+        max_entries: int = 1000,
+        max_bytes: int = 50 * 1024 * 1024,
+        max_age_days: float = 30,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self.hits = 0
+        self.misses = 0
+        # One connection, behind a lock, for every thread that looks up extractions (readiness, to_thread)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS extractions (
+                key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(image_data: bytes, model_name: str, instructions: str) -> str:
+        """Build the cache key from the image content, model and instructions"""
+        image_hash = hashlib.sha256(image_data).hexdigest()
+        instructions_hash = hashlib.sha256(instructions.encode()).hexdigest()
+        return hashlib.sha256(f"{image_hash}:{model_name}:{instructions_hash}".encode()).hexdigest()
+
+    def get(self, key: str, output_type: type[T]) -> T | None:
+        """Return the cached extraction for `key`, or None on a miss"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, created_at FROM extractions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or time.time() - row[1] > self.max_age_seconds:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE extractions SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return output_type.model_validate_json(row[0])
+
+    def put(self, key: str, extraction: BaseModel):
+        """Store a validated extraction and evict old entries if needed"""
+        payload = extraction.model_dump_json()
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extractions (key, payload, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now),
+            )
+            self._conn.commit()
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones over the size limits"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM extractions WHERE created_at < ?", (time.time() - self.max_age_seconds,)
+            )
+            count, total_size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions"
+            ).fetchone()
+            if count > self.max_entries or total_size > self.max_bytes:
+                rows = self._conn.execute(
+                    "SELECT key, size FROM extractions ORDER BY last_used DESC"
+                ).fetchall()
+                kept, kept_size, drop = 0, 0, []
+                for key, size in rows:
+                    if kept < self.max_entries and kept_size + size <= self.max_bytes:
+                        kept += 1
+                        kept_size += size
+                    else:
+                        drop.append((key,))
+                self._conn.executemany("DELETE FROM extractions WHERE key = ?", drop)
+            self._conn.commit()
+
+    def stats(self) -> str:
+        """Human readable hit/miss counters"""
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return f"Extraction cache: {self.hits} hit(s), {self.misses} miss(es) ({rate:.0f}% hit rate)"
@@ -0,0 +1,132 @@
+r"""
+File readiness: know when a new file in the watch folder is completely
+written, instead of sleeping a fixed time before reading it.
+
+A copy into the folder shows up as several watchdog events (created, then
+modified for every written chunk), and an upload that is renamed into place
+only as a moved event. The tracker takes all of them:
+- events are merged per path: a file that is already waiting is not added again
+- a background thread checks the size and mtime of every waiting file every
+  `poll_interval` seconds
+- a file is ready once its size and mtime have not changed for `settle_time`
+  seconds. A file that was seen growing has to stay unchanged for
+  `growing_settle_time` instead, so a slow network copy that stalls for a
+  moment is not read half written
+- an empty file is never ready, it is usually a copy that has only just started
+- a ready file is reported again only if its size or mtime changed (a
+  modified event without a change, e.g. from a virus scanner, is ignored)
+
+A file written in one go is ready after about `settle_time` (50 ms), instead
+of the 0.5 s sleep every poster used to wait.
+
+Used by: lesson11.py, lesson12.py, lesson12-async.py
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+
+@dataclass
+class _Pending:
+    first_seen: float
+    changed_at: float
+    signature: tuple[int, int] | None = None  # (size, mtime in ns)
+    grew: bool = False
+
+
+class ReadinessTracker:
+    """Calls `on_ready(path)` once a file stopped changing"""
+
+    def __init__(
+        self,
+        on_ready: Callable[[Path], None],
+        settle_time: float = 0.05,
+        growing_settle_time: float = 1.0,
+        poll_interval: float = 0.01,
+    ):
+        self.on_ready = on_ready
+        self.settle_time = settle_time
+        self.growing_settle_time = growing_settle_time
+        self.poll_interval = poll_interval
+        self.ready_count = 0
+        self.merged_events = 0
+        self.total_wait = 0.0
+        self._pending: dict[Path, _Pending] = {}
+        self._reported: dict[Path, tuple[int, int]] = {}
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="file-readiness", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+
+    def notify(self, path: Path):
+        """A watchdog event for `path` (safe to call from any thread)"""
+        with self._condition:
+            if path in self._pending:
+                self.merged_events += 1
+                return
+            now = time.monotonic()
+            self._pending[path] = _Pending(first_seen=now, changed_at=now)
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                paths = list(self._pending)
+            for path in paths:
+                if self._check(path):
+                    try:
+                        self.on_ready(path)
+                    except Exception as e:
+                        print(f"   Error handing over {path.name}: {e}")
+            time.sleep(self.poll_interval)
+
+    def _check(self, path: Path) -> bool:
+        """True if the file just became ready"""
+        try:
+            stat = path.stat()
+            signature = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            signature = None
+        now = time.monotonic()
+        with self._condition:
+            pending = self._pending[path]
+            if signature is None:
+                # Deleted or moved away before it was ready
+                del self._pending[path]
+                return False
+            if signature != pending.signature:
+                pending.grew = pending.signature is not None
+                pending.signature = signature
+                pending.changed_at = now
+                return False
+            settle_time = self.growing_settle_time if pending.grew else self.settle_time
+            if signature[0] == 0 or now - pending.changed_at < settle_time:
+                return False
+            del self._pending[path]
+            if self._reported.get(path) == signature:
+                return False
+            self._reported[path] = signature
+            self.ready_count += 1
+            self.total_wait += now - pending.first_seen
+            return True
+
+    def stats(self) -> str:
+        """Human readable counters"""
+        average = self.total_wait / self.ready_count * 1000 if self.ready_count else 0.0
+        return (f"File readiness: {self.ready_count} file(s) ready after {average:.0f} ms on average, "
+                f"{self.merged_events} duplicate event(s) merged")
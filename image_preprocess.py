@@ -0,0 +1,133 @@
+r"""
+Image preprocessing: make a poster cheaper to send before the extraction call.
+
+A large PNG poster costs upload bandwidth, and its pixel size decides how many
+vision tokens it costs. The provider itself scales every image so its short
+side is at most 768 pixels, so a long edge of 1536 saves upload size but
+almost never tokens: for an A-format poster (1:1.41) that takes a long edge
+of about 1024 (6 -> 4 tiles of 512 pixels, 1105 -> 765 tokens).
+Before the image is sent to the extraction agent:
+- it is downscaled so its long edge is at most `max_edge` pixels
+- optionally, uniform borders (a frame of one flat colour) are cropped away
+- it is re-encoded as JPEG, which also drops all metadata (EXIF, text chunks, ...)
+If nothing was resized or cropped and the re-encoded image is not smaller,
+the original bytes are kept.
+
+split_tiles() cuts a big poster into overlapping tiles, for extracting the
+parts of a dense lineup separately (see lesson12-async.py, TILED_EXTRACTION).
+
+Pillow is optional (pip3 install pillow): without it the image is sent as is.
+preprocess_image() only takes and returns plain values, so it can run in a
+ProcessPoolExecutor without blocking an event loop.
+
+Used by: lesson10.py, lesson11.py, lesson12.py, lesson12-async.py, bench_preprocess.py, bench_tiles.py
+"""
+
+import io
+import math
+
+try:
+    from PIL import Image, ImageChops
+except ImportError:
+    Image = None
+
+DEFAULT_MAX_EDGE = 1024
+JPEG_QUALITY = 90
+# How different from the corner colour a pixel must be to count as content (0-255)
+BORDER_TOLERANCE = 12
+
+
+def estimate_vision_tokens(width: int, height: int) -> int:
+    """Vision input tokens of an image with OpenAI's high-detail tile formula"""
+    # Fit into 2048 x 2048, then scale the shortest side down to 768
+    scale = min(1.0, 2048 / max(width, height))
+    scale *= min(1.0, 768 / min(width * scale, height * scale))
+    tiles = math.ceil(width * scale / 512) * math.ceil(height * scale / 512)
+    return 85 + 170 * tiles
+
+
+def image_size(data: bytes) -> tuple[int, int] | None:
+    """(width, height) of an image, or None without Pillow or for an unreadable image"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.size
+    except OSError:
+        return None
+
+
+def _crop_borders(image: "Image.Image") -> "Image.Image":
+    """Crop away a frame that has the colour of the top-left pixel"""
+    background = Image.new(image.mode, image.size, image.getpixel((0, 0)))
+    difference = ImageChops.difference(image, background).convert('L')
+    bbox = difference.point(lambda value: 255 if value > BORDER_TOLERANCE else 0).getbbox()
+    if bbox is None or bbox == (0, 0, *image.size):
+        return image
+    return image.crop(bbox)
+
+
+def preprocess_image(
+    data: bytes,
+    media_type: str,
+    max_edge: int = DEFAULT_MAX_EDGE,
+    crop_borders: bool = False,
+) -> tuple[bytes, str]:
+    """Downscale, optionally crop and re-encode an image; returns (bytes, media type)"""
+    if Image is None:
+        return data, media_type
+
+    try:
+        with Image.open(io.BytesIO(data)) as original:
+            # Animated GIFs: the first frame is enough
+            image = original.convert('RGB')
+    except OSError:
+        # Not an image Pillow can read: let the model try the original
+        return data, media_type
+    changed = False
+
+    if crop_borders:
+        cropped = _crop_borders(image)
+        changed = cropped.size != image.size
+        image = cropped
+
+    if max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        changed = True
+
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+    encoded = output.getvalue()
+    if not changed and len(encoded) >= len(data):
+        return data, media_type
+    return encoded, 'image/jpeg'
+
+
+def split_tiles(data: bytes, rows: int = 2, cols: int = 2, overlap: float = 0.15) -> list[bytes]:
+    """Cut an image into rows x cols JPEG tiles that overlap by `overlap` of a tile.
+    Returns an empty list without Pillow or for an unreadable image."""
+    if Image is None:
+        return []
+    try:
+        with Image.open(io.BytesIO(data)) as original:
+            image = original.convert('RGB')
+    except OSError:
+        return []
+
+    width, height = image.size
+    tile_width, tile_height = width / cols, height / rows
+    # Every tile grows by half the overlap on each inner side, so text on a seam is whole in one tile
+    pad_x, pad_y = tile_width * overlap / 2, tile_height * overlap / 2
+    tiles = []
+    for row in range(rows):
+        for col in range(cols):
+            box = (
+                max(0, round(col * tile_width - pad_x)),
+                max(0, round(row * tile_height - pad_y)),
+                min(width, round((col + 1) * tile_width + pad_x)),
+                min(height, round((row + 1) * tile_height + pad_y)),
+            )
+            output = io.BytesIO()
+            image.crop(box).save(output, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+            tiles.append(output.getvalue())
+    return tiles
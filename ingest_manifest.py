@@ -0,0 +1,163 @@
+r"""
+Ingest manifest: remember how far every image got, so a restart resumes
+instead of starting over.
+
+Every image is tracked by the SHA-256 of its content (a renamed copy is the
+same image) and moves through these states:
+
+    queued -> extracted -> enriched -> written
+
+(lesson11.py has no enrichment step and goes from extracted to written.)
+With the state, the manifest keeps the result of the last finished step, so
+a restart continues from there: a written image is skipped right away, an
+enriched one is only written.
+
+Writes happen exactly once:
+- concert database: ConcertStore.add_rows() records the content hash in the
+  same transaction as the rows, and skips a hash it already has
+- plain CSV file (lesson11.py): before appending, the file size is stored in
+  the manifest. If the run crashes before the image is marked written, the
+  next start removes the bytes from that offset up to the next write (or the
+  end of the file) with recover_csv, and writes the rows again. Rows of images
+  that were written after it are kept
+
+The manifest is a small SQLite file, one row per image, and belongs to one
+output: an image written to concerts.csv by lesson11.py still has to be
+written to the database of lesson12.py. for_output() gives every output its
+own manifest file next to it (concerts.csv -> concerts.csv.manifest.db).
+
+Used by: lesson11.py, lesson12.py, lesson12-async.py, backfill.py
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar('T', bound=BaseModel)
+
+STATES = ('queued', 'extracted', 'enriched', 'written')
+
+
+class IngestManifest:
+    """Durable per-image processing state, keyed by content hash"""
+
+    def __init__(self, path: Path):
+        # Images are marked from the readiness thread or asyncio.to_thread workers: one connection, one lock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                content_hash TEXT PRIMARY KEY,
+                image_name TEXT NOT NULL,
+                state TEXT NOT NULL,
+                payload TEXT,
+                write_offset INTEGER,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    @classmethod
+    def for_output(cls, output: Path) -> "IngestManifest":
+        """The manifest of the images written to `output` (a CSV file or a database)"""
+        return cls(output.with_name(f"{output.name}.manifest.db"))
+
+    @staticmethod
+    def content_hash(image_data: bytes) -> str:
+        return hashlib.sha256(image_data).hexdigest()
+
+    def state(self, content_hash: str) -> str | None:
+        """The state of an image, or None if it was never seen"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state FROM images WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def mark(self, content_hash: str, image_name: str, state: str, payload: BaseModel | None = None):
+        """Record that an image reached `state`, with the result of that step"""
+        if state not in STATES:
+            raise ValueError(f"Unknown state: {state}")
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO images (content_hash, image_name, state, payload, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (content_hash) DO UPDATE SET image_name = excluded.image_name, "
+                "state = excluded.state, payload = COALESCE(excluded.payload, payload), "
+                # A written image keeps its offset: recover_csv() must not cut its rows
+                "write_offset = CASE WHEN excluded.state = 'written' THEN write_offset END, "
+                "updated_at = excluded.updated_at",
+                (content_hash, image_name, state, payload.model_dump_json() if payload else None, time.time()),
+            )
+            self._conn.commit()
+
+    def payload(self, content_hash: str, output_type: type[T]) -> T | None:
+        """The stored result of the last finished step"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM images WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return output_type.model_validate_json(row[0])
+
+    def begin_write(self, content_hash: str, offset: int):
+        """Remember the size of the output file before the rows of an image are appended"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE images SET write_offset = ? WHERE content_hash = ?", (offset, content_hash)
+            )
+            self._conn.commit()
+
+    def recover_csv(self, csv_file: Path) -> int:
+        """Remove the rows of writes that never finished; returns the number of bytes removed.
+        Each unfinished write goes from its offset up to the offset of the next write
+        (finished or not) or the end of the file."""
+        with self._lock:
+            writes = self._conn.execute(
+                "SELECT write_offset, state = 'written' FROM images WHERE write_offset IS NOT NULL "
+                "ORDER BY write_offset"
+            ).fetchall()
+            removed = 0
+            if csv_file.exists() and not all(written for _, written in writes):
+                size = csv_file.stat().st_size
+                ends = [offset for offset, _ in writes[1:]] + [size]
+                torn = [(offset, min(end, size)) for (offset, written), end in zip(writes, ends)
+                        if not written and offset < size]
+                if torn:
+                    start = torn[0][0]
+                    with open(csv_file, 'r+b') as f:
+                        f.seek(start)
+                        data = f.read()
+                        kept = bytearray()
+                        position = start
+                        for offset, end in torn:
+                            kept += data[position - start:offset - start]
+                            position = end
+                        kept += data[position - start:]
+                        f.seek(start)
+                        f.write(kept)
+                        f.truncate()
+                    removed = size - start - len(kept)
+            # The offsets are only valid for the file as it was, new writes store their own
+            self._conn.execute("UPDATE images SET write_offset = NULL")
+            self._conn.commit()
+        return removed
+
+    def unfinished(self) -> list[tuple[str, str]]:
+        """(image name, state) of every image that was not written yet"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT image_name, state FROM images WHERE state != 'written' ORDER BY updated_at"
+            ).fetchall()
+
+    def stats(self) -> str:
+        """Number of images per state"""
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM images GROUP BY state").fetchall())
+        return "Ingest manifest: " + ", ".join(f"{counts.get(state, 0)} {state}" for state in STATES)
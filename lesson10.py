@@ -1,6 +1,12 @@
 r"""
 Lesson 10: Pydantic AI agent framework - Extracting structured information from an image
 
+Bulk extraction of a whole folder: one shared agent (and with it one HTTP
+client and its connection pool), up to MAX_CONCURRENT_IMAGES posters in
+flight at once behind the adaptive rate limiter, and every result merged
+into all_bands as soon as it arrives. At the end it prints images per second
+and tokens per image.
+
 Setup:
 
 Always create a virtual environment
@@ -17,13 +23,31 @@ You can, however, install dependencies through pip freeze and a requirements.txt
 2. pip3 install -r requirements.txt
 """
 
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from pydantic import BaseModel
 from pydantic_ai import Agent, BinaryContent
+from pydantic_ai.usage import RunUsage
 from dotenv import load_dotenv
 
+from image_preprocess import preprocess_image
+from rate_limiter import AdaptiveLimiter
+
 load_dotenv()
 
+# Configuration
+IMAGE_FOLDER = Path("images")
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
+MAX_CONCURRENT_IMAGES = 16  # Upper bound of posters extracted at the same time
+REQUESTS_PER_MINUTE = 500  # Provider quota
+TOKENS_PER_MINUTE = 200_000
+EXTRACTION_TOKENS_ESTIMATE = 4000  # Rough cost of one call, used until the real usage is known
+PREPROCESS_IMAGES = True  # Downscale and re-encode images before extraction (needs pillow)
+MAX_IMAGE_EDGE = 1024  # Max width/height in pixels of the image sent to the model (see image_preprocess.py)
+CROP_BORDERS = False  # Also crop away a uniform frame around the poster
+
 
 class Concert(BaseModel):
     venue: str
@@ -41,6 +65,32 @@ class ConcertExtraction(BaseModel):
     bands: list[BandInfo]
 
 
+# One agent for the whole folder: its model (and HTTP connection pool) is created once
+agent = Agent(
+    'openai:gpt-5.2',
+    output_type=ConcertExtraction,
+    instructions="""
+    Extract concert information from the image.
+    For each band visible, extract:
+    - The band name
+    - The venue(s) where they play
+    - The location of each venue
+    - The date of each concert
+    - The event/festival name (if it's part of a named event like a festival)
+    If any information is unclear or missing, use "Unknown" as the value.
+    Leave event_name as null if there's no specific event/festival name.
+    """,
+)
+
+# Starts at full concurrency and backs off only if the provider rate limits us
+limiter = AdaptiveLimiter(
+    initial_concurrency=MAX_CONCURRENT_IMAGES,
+    max_concurrency=MAX_CONCURRENT_IMAGES,
+    requests_per_minute=REQUESTS_PER_MINUTE,
+    tokens_per_minute=TOKENS_PER_MINUTE,
+)
+
+
 def get_media_type(filepath: Path) -> str:
     """Get the MIME type based on file extension"""
     suffix = filepath.suffix.lower()
@@ -54,63 +104,82 @@ def get_media_type(filepath: Path) -> str:
     return media_types.get(suffix, 'image/jpeg')
 
 
-folder = Path("images")
-
-if not folder.exists():
-    raise FileNotFoundError(f"Folder '{folder}' not found")
-
-# Collect all results
-all_bands: dict[str, list[Concert]] = {}
-"""
-Process all images in the folder and return a dict where:
-- key = band name
-- value = list of Concert objects (venue, location, date, event_name)
-"""
-
-# Supported image extensions
-image_extensions = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
-
-for image_path in folder.iterdir():
-    if image_path.suffix.lower() not in image_extensions:
-        continue
+async def extract(
+    image_path: Path, pool: ProcessPoolExecutor, in_memory: asyncio.Semaphore
+) -> tuple[ConcertExtraction, RunUsage]:
+    """Extract the concerts of one poster"""
+    async with in_memory:
+        image_data = image_path.read_bytes()
+        media_type = get_media_type(image_path)
+        if PREPROCESS_IMAGES:
+            # Resizing is CPU work, so it runs in a worker process instead of blocking the event loop
+            image_data, media_type = await asyncio.get_running_loop().run_in_executor(
+                pool, preprocess_image, image_data, media_type, MAX_IMAGE_EDGE, CROP_BORDERS
+            )
         
-    print(f"Processing: {image_path.name}")
+        result = await limiter.run(
+            lambda: agent.run([
+                "Extract all concert information from this image.",
+                BinaryContent(data=image_data, media_type=media_type),
+            ]),
+            estimated_tokens=EXTRACTION_TOKENS_ESTIMATE,
+        )
+    return result.output, result.usage()
+
+
+async def main():
+    if not IMAGE_FOLDER.exists():
+        raise FileNotFoundError(f"Folder '{IMAGE_FOLDER}' not found")
     
-    # Read image and send to agent
-    image_data = image_path.read_bytes()
-    media_type = get_media_type(image_path)
-
-    agent = Agent(
-    'openai:gpt-5.2',
-    output_type=ConcertExtraction,
-    instructions="""
-    Extract concert information from the image.
-    For each band visible, extract:
-    - The band name
-    - The venue(s) where they play
-    - The location of each venue
-    - The date of each concert
-    - The event/festival name (if it's part of a named event like a festival)
-    If any information is unclear or missing, use "Unknown" as the value.
-    Leave event_name as null if there's no specific event/festival name.
-    """,
-)
+    # Collect all results
+    all_bands: dict[str, list[Concert]] = {}
+    """
+    Process all images in the folder and return a dict where:
+    - key = band name
+    - value = list of Concert objects (venue, location, date, event_name)
+    """
+    
+    image_paths = sorted(f for f in IMAGE_FOLDER.iterdir() if f.suffix.lower() in IMAGE_EXTENSIONS)
+    print(f"Processing {len(image_paths)} image(s), up to {MAX_CONCURRENT_IMAGES} at a time...")
+    
+    usage = RunUsage()
+    failed = 0
+    start = time.perf_counter()
+    # Only a few images more than can be extracted at once are read and preprocessed ahead
+    in_memory = asyncio.Semaphore(MAX_CONCURRENT_IMAGES * 2)
+    with ProcessPoolExecutor() as pool:
+        tasks = [asyncio.create_task(extract(image_path, pool, in_memory)) for image_path in image_paths]
+        for done, task in enumerate(asyncio.as_completed(tasks), start=1):
+            try:
+                extraction, image_usage = await task
+            except Exception as e:
+                failed += 1
+                print(f"[{done}/{len(tasks)}] Error: {e}")
+                continue
+            usage += image_usage
+            print(f"[{done}/{len(tasks)}] {len(extraction.bands)} band(s), {image_usage.total_tokens} tokens")
+            
+            # Merge results into our dictionary as soon as they arrive
+            for band_info in extraction.bands:
+                all_bands.setdefault(band_info.band_name, []).extend(band_info.concerts)
+    elapsed = time.perf_counter() - start
     
-    result = agent.run_sync([
-        "Extract all concert information from this image.",
-        BinaryContent(data=image_data, media_type=media_type),
-    ])
+    # Pretty print results
+    for band, concerts in all_bands.items():
+        print(f"\nBand: {band}")
+        for concert in concerts:
+            event_str = f" ({concert.event_name})" if concert.event_name else ""
+            print(f"   Venue: {concert.venue} - {concert.location}{event_str}")
+            print(f"   Date: {concert.date}")
     
-    # Merge results into our dictionary
-    for band_info in result.output.bands:
-        if band_info.band_name not in all_bands:
-            all_bands[band_info.band_name] = []
-        all_bands[band_info.band_name].extend(band_info.concerts)
-
-# Pretty print results
-for band, concerts in all_bands.items():
-    print(f"\nBand: {band}")
-    for concert in concerts:
-        event_str = f" ({concert.event_name})" if concert.event_name else ""
-        print(f"   Venue: {concert.venue} - {concert.location}{event_str}")
-        print(f"   Date: {concert.date}")
+    extracted = len(image_paths) - failed
+    print(f"\n{extracted} image(s) in {elapsed:.1f}s ({extracted / elapsed if elapsed else 0:.2f} images/s), "
+          f"{failed} failed, {len(all_bands)} band(s)")
+    if extracted:
+        print(f"Tokens per image: {usage.input_tokens / extracted:.0f} input, "
+              f"{usage.output_tokens / extracted:.0f} output")
+    print(limiter.stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -26,9 +26,17 @@ from datetime import datetime
 
 from pydantic import BaseModel
 from pydantic_ai import Agent, BinaryContent
+from pydantic_ai.settings import ModelSettings
 from dotenv import load_dotenv
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler, FileCreatedEvent
+from watchdog.events import FileSystemEventHandler, FileSystemEvent
+
+from extraction_cache import ExtractionCache
+from file_readiness import ReadinessTracker
+from image_preprocess import preprocess_image
+from ingest_manifest import IngestManifest
+from poster_index import PosterIndex, dhash
+from resilience import RetryPolicy, StageRunner
 
 load_dotenv()
 
@@ -36,6 +44,25 @@ load_dotenv()
 WATCH_FOLDER = Path("images_watchfolder")
 CSV_OUTPUT = Path("concerts.csv")
 IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
+PREPROCESS_IMAGES = True  # Downscale and re-encode images before extraction (needs pillow)
+MAX_IMAGE_EDGE = 1024  # Max width/height in pixels of the image sent to the model (see image_preprocess.py)
+CROP_BORDERS = False  # Also crop away a uniform frame around the poster
+NEAR_DUPLICATE_DISTANCE = 4  # Max differing bits of the perceptual hash to reuse an earlier extraction
+EXTRACTION_TIMEOUT = 120  # Seconds per extraction attempt
+MAX_RETRIES = 3  # Retries of a call that failed with a transient error (timeout, connection, 429, 5xx)
+RETRY_BASE_DELAY = 1.0  # Retry n waits a random 0 to RETRY_BASE_DELAY * 2^n seconds
+EXTRACTION_MODEL = 'openai:gpt-5.2'
+EXTRACTION_INSTRUCTIONS = """
+    Extract concert information from the image.
+    For each band visible, extract:
+    - The band name
+    - The venue(s) where they play
+    - The location of each venue
+    - The date of each concert
+    - The event/festival name (if it's part of a named event like a festival)
+    If any information is unclear or missing, use "Unknown" as the value.
+    Leave event_name as null if there's no specific event/festival name.
+    """
 
 
 class Concert(BaseModel):
@@ -55,21 +82,24 @@ class ConcertExtraction(BaseModel):
 
 
 agent = Agent(
-    'openai:gpt-5.2',
+    EXTRACTION_MODEL,
     output_type=ConcertExtraction,
-    instructions="""
-    Extract concert information from the image.
-    For each band visible, extract:
-    - The band name
-    - The venue(s) where they play
-    - The location of each venue
-    - The date of each concert
-    - The event/festival name (if it's part of a named event like a festival)
-    If any information is unclear or missing, use "Unknown" as the value.
-    Leave event_name as null if there's no specific event/festival name.
-    """,
+    instructions=EXTRACTION_INSTRUCTIONS,
+    model_settings=ModelSettings(timeout=EXTRACTION_TIMEOUT),
 )
 
+# Persistent cache: the same poster (even renamed) is only sent to the LLM once
+extraction_cache = ExtractionCache()
+
+# Persistent perceptual hashes: resized or re-exported copies of a poster reuse its extraction
+poster_index = PosterIndex(max_distance=NEAR_DUPLICATE_DISTANCE)
+
+# Persistent per-image state: a restart skips written images and never appends rows twice
+manifest = IngestManifest.for_output(CSV_OUTPUT)
+
+# Timeouts and retries with jittered backoff for the agent calls
+stages = StageRunner(RetryPolicy(retries=MAX_RETRIES, base_delay=RETRY_BASE_DELAY))
+
 
 def get_media_type(filepath: Path) -> str:
     """Get the MIME type based on file extension"""
@@ -122,43 +152,85 @@ def process_image(image_path: Path):
     print(f"\nProcessing: {image_path.name}")
     
     try:
-        # Wait a moment to ensure file is fully written
-        time.sleep(0.5)
-        
         # Read image and send to agent
         image_data = image_path.read_bytes()
         media_type = get_media_type(image_path)
         
-        result = agent.run_sync([
-            "Extract all concert information from this image.",
-            BinaryContent(data=image_data, media_type=media_type),
-        ])
+        content_hash = IngestManifest.content_hash(image_data)
+        if manifest.state(content_hash) == 'written':
+            print("   Already written to the CSV, skipping")
+            return
+        manifest.mark(content_hash, image_path.name, 'queued')
+        
+        cache_key = ExtractionCache.make_key(image_data, EXTRACTION_MODEL, EXTRACTION_INSTRUCTIONS)
+        extraction = extraction_cache.get(cache_key, ConcertExtraction)
+        image_hash = dhash(image_data)
+        near_duplicate = None
+        if extraction is None and image_hash is not None:
+            near_duplicate = poster_index.get(image_hash, ConcertExtraction)
+        if extraction is not None:
+            print("   Found in extraction cache, skipping the LLM call")
+        elif near_duplicate is not None:
+            extraction, known_image, distance = near_duplicate
+            print(f"   Near-duplicate of {known_image} ({distance} bit(s) apart), reusing its extraction")
+            extraction_cache.put(cache_key, extraction)
+        else:
+            if PREPROCESS_IMAGES:
+                image_data, media_type = preprocess_image(image_data, media_type, MAX_IMAGE_EDGE, CROP_BORDERS)
+            result = stages.run_sync("Extraction", lambda: agent.run_sync([
+                "Extract all concert information from this image.",
+                BinaryContent(data=image_data, media_type=media_type),
+            ]))
+            extraction = result.output
+            extraction_cache.put(cache_key, extraction)
+        
+        if image_hash is not None:
+            poster_index.add(image_hash, image_path.name, extraction)
+        manifest.mark(content_hash, image_path.name, 'extracted', extraction)
         
         # Print results
-        for band_info in result.output.bands:
+        for band_info in extraction.bands:
             print(f"   Band: {band_info.band_name}")
             for concert in band_info.concerts:
                 event_str = f" ({concert.event_name})" if concert.event_name else ""
                 print(f"      Venue: {concert.venue} - {concert.location}{event_str}")
                 print(f"      Date: {concert.date}")
         
-        # Save to CSV
-        append_to_csv(image_path.name, result.output)
+        # Save to CSV (the manifest remembers where the rows start, see recover_csv)
+        manifest.begin_write(content_hash, CSV_OUTPUT.stat().st_size)
+        append_to_csv(image_path.name, extraction)
+        manifest.mark(content_hash, image_path.name, 'written')
         
     except Exception as e:
         print(f"   Error processing {image_path.name}: {e}")
 
 
 class ImageHandler(FileSystemEventHandler):
-    """Handler for new image files in the watch folder"""
+    """Handler for new image files in the watch folder.
+
+    Created, modified and moved-in (renamed into place) files go to the
+    readiness tracker, which processes each one once it is completely written.
+    """
+    
+    def __init__(self, readiness: ReadinessTracker):
+        self.readiness = readiness
     
-    def on_created(self, event: FileCreatedEvent):
+    def on_created(self, event: FileSystemEvent):
+        self.track(event, event.src_path)
+    
+    def on_modified(self, event: FileSystemEvent):
+        self.track(event, event.src_path)
+    
+    def on_moved(self, event: FileSystemEvent):
+        self.track(event, event.dest_path)
+    
+    def track(self, event: FileSystemEvent, path: str):
         if event.is_directory:
             return
         
-        image_path = Path(event.src_path)
+        image_path = Path(path)
         if image_path.suffix.lower() in IMAGE_EXTENSIONS:
-            process_image(image_path)
+            self.readiness.notify(image_path)
 
 
 def main():
@@ -168,8 +240,15 @@ def main():
     
     print(f"Watching folder: {WATCH_FOLDER.absolute()}")
     
-    # Initialize CSV
+    # Initialize CSV, cutting off rows of an append that was interrupted last time
     initialize_csv()
+    removed = manifest.recover_csv(CSV_OUTPUT)
+    if removed:
+        print(f"Removed {removed} bytes of an unfinished write from {CSV_OUTPUT}")
+    unfinished = manifest.unfinished()
+    if unfinished:
+        print(f"Resuming {len(unfinished)} unfinished image(s): "
+              + ", ".join(f"{name} ({state})" for name, state in unfinished))
     
     # Process any existing images in the folder first
     existing_images = [f for f in WATCH_FOLDER.iterdir() 
@@ -178,9 +257,15 @@ def main():
         print(f"\nProcessing {len(existing_images)} existing image(s)...")
         for image_path in existing_images:
             process_image(image_path)
+        print(extraction_cache.stats())
+        print(poster_index.stats())
+        print(manifest.stats())
+        print(stages.stats())
     
-    # Set up the watchdog observer
-    event_handler = ImageHandler()
+    # Set up the readiness tracker and the watchdog observer
+    readiness = ReadinessTracker(process_image)
+    readiness.start()
+    event_handler = ImageHandler(readiness)
     observer = Observer()
     observer.schedule(event_handler, str(WATCH_FOLDER), recursive=False)
     observer.start()
@@ -195,6 +280,12 @@ def main():
         observer.stop()
     
     observer.join()
+    readiness.stop()
+    print(readiness.stats())
+    print(extraction_cache.stats())
+    print(poster_index.stats())
+    print(manifest.stats())
+    print(stages.stats())
     print("Done!")
 
 
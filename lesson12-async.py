@@ -5,6 +5,17 @@ The first agent is doing the extraction of the structured information from the i
 The second agent is doing a web search for the genres of each band.
 
 # async version.
+One event loop runs for the whole session: the watchdog thread only puts new
+image paths into a queue, and a pool of worker coroutines processes them
+concurrently, reusing the same HTTP connections.
+
+With TILED_EXTRACTION, big posters are cut into overlapping tiles that are
+extracted concurrently (each together with a small overview of the whole
+poster, for the venue and date in the header), and the tile results are merged.
+
+With STREAM_EXTRACTION the extraction result is streamed: every band is handed
+to Agent 2 as soon as the model has finished writing it, so the web searches
+run while the rest of the poster is still being extracted.
 
 Setup:
 
@@ -23,22 +34,72 @@ You can, however, install dependencies through pip freeze and a requirements.txt
 """
 
 import asyncio
-import csv
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
+from typing import Awaitable, Callable
 
 from pydantic import BaseModel
 from pydantic_ai import Agent, BinaryContent, WebSearchTool
 from dotenv import load_dotenv
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler, FileCreatedEvent
+from watchdog.events import FileSystemEventHandler, FileSystemEvent
+
+from band_cache import BandKnowledgeStore, normalize_band_name
+from batch_writer import BatchedWriter
+from concert_store import PENDING_ENRICHMENT, ConcertStore
+from extraction_cache import ExtractionCache
+from file_readiness import ReadinessTracker
+from image_preprocess import image_size, preprocess_image, split_tiles
+from ingest_manifest import IngestManifest
+from poster_index import PosterIndex, dhash
+from rate_limiter import AdaptiveLimiter
+from resilience import RetryPolicy, StageRunner, describe
+from single_flight import SingleFlight
 
 load_dotenv()
 
 # Configuration
 WATCH_FOLDER = Path("images_watchfolder")
-CSV_OUTPUT = Path("concerts-async.csv")
+DB_OUTPUT = Path("concerts-async.db")
+CSV_OUTPUT = Path("concerts-async.csv")  # Kept up to date as an export of the database
 IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
+NUM_WORKERS = 4  # How many images are processed at the same time
+REQUESTS_PER_MINUTE = 500  # Provider quota shared by both agents
+TOKENS_PER_MINUTE = 200_000
+EXTRACTION_TOKENS_ESTIMATE = 4000  # Rough cost of one call, used until the real usage is known
+ENRICHMENT_TOKENS_ESTIMATE = 3000
+ENRICHMENT_BATCH_SIZE = 1  # Bands per enrichment call, 1 = one call per band
+STREAM_EXTRACTION = True  # Start enriching bands while the poster is still being extracted (one call per band)
+PREPROCESS_IMAGES = True  # Downscale and re-encode images before extraction (needs pillow)
+MAX_IMAGE_EDGE = 1024  # Max width/height in pixels of the image sent to the model (see image_preprocess.py)
+CROP_BORDERS = False  # Also crop away a uniform frame around the poster
+TILED_EXTRACTION = False  # Extract big posters tile by tile (more calls, fewer missed bands)
+TILE_MIN_EDGE = 1200  # Only images with a long edge of at least this many pixels are tiled
+TILE_GRID = (2, 2)  # Rows, columns
+TILE_OVERLAP = 0.15  # Share of a tile that overlaps its neighbour, so no band is cut in half
+TILE_OVERVIEW_EDGE = 768  # Long edge of the whole-poster overview sent with every tile
+NEAR_DUPLICATE_DISTANCE = 4  # Max differing bits of the perceptual hash to reuse an earlier extraction
+WRITE_BATCH_SIZE = 20  # Max posters written in one flush (one transaction, one CSV append)
+WRITE_FLUSH_INTERVAL = 0.25  # Seconds a flush waits for more posters to join it
+FSYNC_WRITES = True  # Sync every flush to disk before a poster counts as saved (False: leave it to the OS)
+EXTRACTION_TIMEOUT = 120  # Seconds per extraction attempt (one call, stream or tile), not counting the limiter wait
+ENRICHMENT_TIMEOUT = 90  # Seconds per band lookup attempt (web search is slow)
+MAX_RETRIES = 3  # Retries of a call that failed with a transient error (timeout, connection, 429, 5xx)
+RETRY_BASE_DELAY = 1.0  # Retry n waits a random 0 to RETRY_BASE_DELAY * 2^n seconds
+EXTRACTION_MODEL = 'openai:gpt-5.2'
+EXTRACTION_INSTRUCTIONS = """
+    Extract concert information from the image.
+    For each band visible, extract:
+    - The band name
+    - The venue(s) where they play
+    - The location of each venue
+    - The date of each concert
+    - The event/festival name (if it's part of a named event like a festival)
+    If any information is unclear or missing, use "Unknown" as the value.
+    Leave event_name as null if there's no specific event/festival name.
+    """
 
 
 class Concert(BaseModel):
@@ -63,6 +124,18 @@ class BandEnrichment(BaseModel):
     country: str
 
 
+class NamedBandEnrichment(BaseModel):
+    """Enriched information about one band of a batch"""
+    band_name: str
+    genre: str
+    country: str
+
+
+class BatchBandEnrichment(BaseModel):
+    """Enriched information about several bands from one web search session"""
+    bands: list[NamedBandEnrichment]
+
+
 class EnrichedBandInfo(BaseModel):
     """Band info with additional enrichment data"""
     band_name: str
@@ -78,21 +151,46 @@ class EnrichedConcertExtraction(BaseModel):
 
 # Agent 1: Extract concert info from images
 extraction_agent = Agent(
-    'openai:gpt-5.2',
+    EXTRACTION_MODEL,
     output_type=ConcertExtraction,
-    instructions="""
-    Extract concert information from the image.
-    For each band visible, extract:
-    - The band name
-    - The venue(s) where they play
-    - The location of each venue
-    - The date of each concert
-    - The event/festival name (if it's part of a named event like a festival)
-    If any information is unclear or missing, use "Unknown" as the value.
-    Leave event_name as null if there's no specific event/festival name.
-    """,
+    instructions=EXTRACTION_INSTRUCTIONS,
 )
 
+# Concert database, every new row is also appended to the CSV export
+store = ConcertStore(DB_OUTPUT, csv_export=CSV_OUTPUT)
+
+# Persistent cache: the same poster (even renamed) is only sent to Agent 1 once
+extraction_cache = ExtractionCache()
+
+# Persistent perceptual hashes: resized or re-exported copies of a poster reuse its extraction
+poster_index = PosterIndex(max_distance=NEAR_DUPLICATE_DISTANCE)
+
+# Persistent per-image state: a restart skips saved images and resumes the unfinished ones
+manifest = IngestManifest.for_output(DB_OUTPUT)
+
+# Single writer task for the database and the CSV export, started in main()
+writer = BatchedWriter(store, batch_size=WRITE_BATCH_SIZE, flush_interval=WRITE_FLUSH_INTERVAL, fsync=FSYNC_WRITES)
+
+# Image preprocessing is CPU work, so it runs in other processes, not in the event loop
+preprocess_pool = ProcessPoolExecutor(max_workers=NUM_WORKERS)
+
+# Both agents share one API key, so they share one limiter
+limiter = AdaptiveLimiter(
+    requests_per_minute=REQUESTS_PER_MINUTE,
+    tokens_per_minute=TOKENS_PER_MINUTE,
+)
+
+# Retries with jittered backoff, around the limiter. The limiter already retries 429s
+# itself, so they are not retried here again. The timeouts are inside the limiter,
+# so waiting for a free slot does not count.
+stages = StageRunner(RetryPolicy(retries=MAX_RETRIES, base_delay=RETRY_BASE_DELAY), retry_rate_limits=False)
+
+# Persistent cache: each band is looked up on the web once, not on every poster
+band_cache = BandKnowledgeStore()
+
+# Concurrent lookups of the same band (e.g. a headliner on two posters) share one agent run
+band_flights = SingleFlight()
+
 # Agent 2: Enrich band info with genre and country via web search
 enrichment_agent = Agent(
     'openai-responses:gpt-5.2',
@@ -107,6 +205,21 @@ enrichment_agent = Agent(
     """,
 )
 
+# Agent 2 in batch mode: the same search, but for several bands in one call
+batch_enrichment_agent = Agent(
+    'openai-responses:gpt-5.2',
+    output_type=BatchBandEnrichment,
+    builtin_tools=[WebSearchTool()],
+    instructions="""
+    You are given a list of band names. Use web search to find information about each band.
+    For every band in the list, find:
+    - The music genre(s) of the band (e.g., "Rock", "Heavy Metal", "Pop")
+    - The country of origin (e.g., "USA", "UK", "Sweden")
+    Return one entry per band, with band_name written exactly as given.
+    If you cannot find the information, use "Unknown" as the value.
+    """,
+)
+
 
 def get_media_type(filepath: Path) -> str:
     """Get the MIME type based on file extension"""
@@ -121,52 +234,76 @@ def get_media_type(filepath: Path) -> str:
     return media_types.get(suffix, 'image/jpeg')
 
 
-def initialize_csv():
-    """Create the CSV file with headers if it doesn't exist"""
-    if not CSV_OUTPUT.exists():
-        with open(CSV_OUTPUT, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['timestamp', 'source_image', 'band_name', 'genre', 'country', 'venue', 'location', 'date', 'event_name'])
-        print(f"Created {CSV_OUTPUT}")
+def initialize_store():
+    """Import an existing CSV file the first time the database is used, and repair the export"""
+    if store.revision() == 0 and CSV_OUTPUT.exists():
+        count = store.import_csv(CSV_OUTPUT)
+        print(f"Imported {count} row(s) from {CSV_OUTPUT} into {DB_OUTPUT}")
+    if store.repair_csv_export():
+        print(f"Regenerated {CSV_OUTPUT} from {DB_OUTPUT}, it was out of date")
+    unfinished = manifest.unfinished()
+    if unfinished:
+        print(f"Resuming {len(unfinished)} unfinished image(s): "
+              + ", ".join(f"{name} ({state})" for name, state in unfinished))
 
 
-def append_to_csv(source_image: str, extraction: EnrichedConcertExtraction):
-    """Append extracted concert data to the CSV file"""
+def extraction_rows(source_image: str, extraction: EnrichedConcertExtraction) -> list[dict]:
+    """Flatten an enriched extraction into one row per concert"""
     timestamp = datetime.now().isoformat()
-    
-    with open(CSV_OUTPUT, 'a', newline='') as f:
-        writer = csv.writer(f)
-        for band_info in extraction.bands:
-            for concert in band_info.concerts:
-                writer.writerow([
-                    timestamp,
-                    source_image,
-                    band_info.band_name,
-                    band_info.genre,
-                    band_info.country,
-                    concert.venue,
-                    concert.location,
-                    concert.date,
-                    concert.event_name or ''
-                ])
-    
-    print(f"   Saved to {CSV_OUTPUT}")
-
-
-async def enrich_band(band_info: BandInfo) -> EnrichedBandInfo:
-    """Enrich a single band with genre and country info (runs async)"""
-    print(f"   Agent 2: Searching web for '{band_info.band_name}' info...")
+    return [
+        {
+            'timestamp': timestamp,
+            'source_image': source_image,
+            'band_name': band_info.band_name,
+            'genre': band_info.genre,
+            'country': band_info.country,
+            'venue': concert.venue,
+            'location': concert.location,
+            'date': concert.date,
+            'event_name': concert.event_name or '',
+        }
+        for band_info in extraction.bands
+        for concert in band_info.concerts
+    ]
+
+
+def save_extraction(source_image: str, extraction: EnrichedConcertExtraction, content_hash: str):
+    """Save extracted concert data to the database (one transaction) and the CSV export,
+    at most once per image content. Blocking, for callers outside the event loop (backfill.py)"""
+    count = store.add_rows(extraction_rows(source_image, extraction), ingest_key=content_hash)
+    manifest.mark(content_hash, source_image, 'written')
+    print(f"   Saved {count} concert(s) to {DB_OUTPUT} and {CSV_OUTPUT}")
+
+
+async def write_extraction(source_image: str, extraction: EnrichedConcertExtraction, content_hash: str):
+    """Like save_extraction(), through the writer task, without blocking the event loop"""
+    count = await writer.write(extraction_rows(source_image, extraction), ingest_key=content_hash)
+    await asyncio.to_thread(manifest.mark, content_hash, source_image, 'written')
+    print(f"   Saved {count} concert(s) to {DB_OUTPUT} and {CSV_OUTPUT}")
+
+
+async def look_up_band(band_name: str) -> BandEnrichment:
+    """Ask the enrichment agent about a band and remember the answer"""
+    print(f"   Agent 2: Searching web for '{band_name}' info...")
     
     # Use the enrichment agent to get genre and country
-    enrichment_result = await enrichment_agent.run(
-        f"Find the genre and country of origin for the band: {band_info.band_name}"
-    )
-    
-    # Create enriched band info
+    enrichment_result = await stages.run("Agent 2", lambda: limiter.run(
+        lambda: asyncio.wait_for(enrichment_agent.run(
+            f"Find the genre and country of origin for the band: {band_name}"
+        ), ENRICHMENT_TIMEOUT),
+        estimated_tokens=ENRICHMENT_TOKENS_ESTIMATE,
+    ))
+    await asyncio.to_thread(band_cache.put, band_name, enrichment_result.output,
+                            enrichment_result.usage().total_tokens)
+    return enrichment_result.output
+
+
+def make_enriched_band(band_info: BandInfo, enrichment: BandEnrichment) -> EnrichedBandInfo:
+    """Combine extracted band info with its enrichment and print it"""
     enriched_band = EnrichedBandInfo(
         band_name=band_info.band_name,
-        genre=enrichment_result.output.genre,
-        country=enrichment_result.output.country,
+        genre=enrichment.genre,
+        country=enrichment.country,
         concerts=band_info.concerts
     )
     
@@ -182,6 +319,310 @@ async def enrich_band(band_info: BandInfo) -> EnrichedBandInfo:
     return enriched_band
 
 
+async def look_up_band_once(band_name: str) -> BandEnrichment:
+    """Look up a band, sharing the call with concurrent lookups of the same band.
+    Pending if the lookup keeps failing, so the rest of the poster is still saved."""
+    try:
+        return await band_flights.do(normalize_band_name(band_name), lambda: look_up_band(band_name))
+    except Exception as e:
+        print(f"   Agent 2: Giving up on '{band_name}' ({describe(e)}), saving it as pending")
+        return BandEnrichment(genre=PENDING_ENRICHMENT, country=PENDING_ENRICHMENT)
+
+
+async def band_enrichment(band_name: str) -> BandEnrichment:
+    """Genre and country of a band, from the band cache or the web"""
+    enrichment = await asyncio.to_thread(band_cache.get, band_name, BandEnrichment)
+    if enrichment is not None:
+        print(f"   Agent 2: Found '{band_name}' in band cache")
+        return enrichment
+    return await look_up_band_once(band_name)
+
+
+async def enrich_band(band_info: BandInfo) -> EnrichedBandInfo:
+    """Enrich a single band with genre and country info (runs async)"""
+    enrichment = await band_enrichment(band_info.band_name)
+    return make_enriched_band(band_info, enrichment)
+
+
+def batch_enrichment_prompt(band_names: list[str]) -> str:
+    """Prompt for the batch enrichment agent"""
+    return "Find the genre and country of origin for each of these bands:\n" + "\n".join(
+        f"- {band_name}" for band_name in band_names
+    )
+
+
+async def enrich_batch(band_infos: list[BandInfo]) -> list[EnrichedBandInfo]:
+    """Enrich several bands with one agent call, looking up missing bands one by one"""
+    band_names = [band_info.band_name for band_info in band_infos]
+    print(f"   Agent 2: Searching web for {len(band_names)} band(s) in one call...")
+    
+    try:
+        batch_result = await stages.run("Agent 2", lambda: limiter.run(
+            lambda: asyncio.wait_for(batch_enrichment_agent.run(batch_enrichment_prompt(band_names)),
+                                     ENRICHMENT_TIMEOUT),
+            estimated_tokens=ENRICHMENT_TOKENS_ESTIMATE * len(band_names),
+        ))
+    except Exception as e:
+        # Every band is then looked up on its own below
+        print(f"   Agent 2: Batch lookup failed ({describe(e)})")
+        found, tokens_per_band = {}, 0
+    else:
+        found = {
+            normalize_band_name(band.band_name): BandEnrichment(genre=band.genre, country=band.country)
+            for band in batch_result.output.bands
+        }
+        tokens_per_band = batch_result.usage().total_tokens // max(1, len(found))
+    
+    enrichments: dict[str, BandEnrichment] = {}
+    missing: list[str] = []
+    for band_name in band_names:
+        enrichment = found.get(normalize_band_name(band_name))
+        if enrichment is None:
+            missing.append(band_name)
+        else:
+            await asyncio.to_thread(band_cache.put, band_name, enrichment, tokens_per_band)
+            enrichments[band_name] = enrichment
+    
+    # The model skipped (or renamed) some bands: fall back to one call per band
+    if missing:
+        print(f"   Agent 2: {len(missing)} band(s) missing from batch result, looking them up one by one")
+        fallbacks = await asyncio.gather(*[look_up_band_once(band_name) for band_name in missing])
+        enrichments.update(zip(missing, fallbacks))
+    
+    return [make_enriched_band(band_info, enrichments[band_info.band_name]) for band_info in band_infos]
+
+
+async def enrich_bands(band_infos: list[BandInfo]) -> list[EnrichedBandInfo]:
+    """Enrich all bands of a poster, in batches of ENRICHMENT_BATCH_SIZE bands per call"""
+    if ENRICHMENT_BATCH_SIZE <= 1:
+        return list(await asyncio.gather(*[enrich_band(band_info) for band_info in band_infos]))
+    
+    enriched_bands: list[EnrichedBandInfo] = []
+    to_look_up: list[BandInfo] = []
+    for band_info in band_infos:
+        enrichment = await asyncio.to_thread(band_cache.get, band_info.band_name, BandEnrichment)
+        if enrichment is not None:
+            print(f"   Agent 2: Found '{band_info.band_name}' in band cache")
+            enriched_bands.append(make_enriched_band(band_info, enrichment))
+        else:
+            to_look_up.append(band_info)
+    
+    batches = [to_look_up[i:i + ENRICHMENT_BATCH_SIZE]
+               for i in range(0, len(to_look_up), ENRICHMENT_BATCH_SIZE)]
+    for batch in await asyncio.gather(*[enrich_batch(batch) for batch in batches]):
+        enriched_bands.extend(batch)
+    return enriched_bands
+
+
+def extraction_prompt(image_data: bytes, media_type: str) -> list:
+    return [
+        "Extract all concert information from this image.",
+        BinaryContent(data=image_data, media_type=media_type),
+    ]
+
+
+async def stream_extraction(
+    image_data: bytes, media_type: str, on_band: Callable[[BandInfo], None]
+) -> ConcertExtraction:
+    """Extract concert info, calling `on_band` for every band as soon as it is complete"""
+    handed = 0
+    start = time.perf_counter()
+    first_band = None
+    
+    async def stream():
+        nonlocal handed, first_band
+        # A retried stream starts over (on_band ignores bands it has already seen)
+        handed = 0
+        async with extraction_agent.run_stream(extraction_prompt(image_data, media_type)) as result:
+            async for partial in result.stream_output(debounce_by=None):
+                # The last band of a partial result may still be growing, all others are complete
+                for band_info in partial.bands[handed:-1]:
+                    on_band(band_info)
+                    handed += 1
+                    if first_band is None:
+                        first_band = time.perf_counter() - start
+            output = await result.get_output()
+        for band_info in output.bands[handed:]:
+            on_band(band_info)
+            handed += 1
+        return result
+    
+    result = await stages.run("Agent 1", lambda: limiter.run(
+        lambda: asyncio.wait_for(stream(), EXTRACTION_TIMEOUT),
+        estimated_tokens=EXTRACTION_TOKENS_ESTIMATE,
+    ))
+    elapsed = time.perf_counter() - start
+    if first_band is not None:
+        print(f"   Agent 1: Streamed {handed} band(s) in {elapsed:.1f}s, "
+              f"first band went to Agent 2 after {first_band:.1f}s")
+    return await result.get_output()
+
+
+async def prepare_image(image_data: bytes, media_type: str) -> tuple[bytes, str]:
+    """Downscale and re-encode the image in the process pool before it is sent to Agent 1"""
+    if not PREPROCESS_IMAGES:
+        return image_data, media_type
+    loop = asyncio.get_running_loop()
+    prepared_data, prepared_type = await loop.run_in_executor(
+        preprocess_pool, preprocess_image, image_data, media_type, MAX_IMAGE_EDGE, CROP_BORDERS
+    )
+    print(f"   Preprocessed image: {len(image_data) // 1024} KB -> {len(prepared_data) // 1024} KB")
+    return prepared_data, prepared_type
+
+
+def tile_prompt(overview: tuple[bytes, str], tile_data: bytes) -> list:
+    return [
+        "The first image is a whole concert poster at low resolution, the second image is one "
+        "part of it at full resolution. Extract the concert information of every band visible "
+        "in the second image. Use the whole poster for information that applies to all bands, "
+        "like the venue, location, dates or event name.",
+        BinaryContent(data=overview[0], media_type=overview[1]),
+        BinaryContent(data=tile_data, media_type='image/jpeg'),
+    ]
+
+
+def concert_key(concert: Concert) -> tuple:
+    return (" ".join(concert.venue.lower().split()), " ".join(concert.location.lower().split()),
+            concert.date.strip(), (concert.event_name or '').strip().lower())
+
+
+def merge_extractions(extractions: list[ConcertExtraction]) -> ConcertExtraction:
+    """Merge tile results: bands seen in several tiles once, their concerts without repeats"""
+    bands: dict[str, BandInfo] = {}
+    seen_concerts: dict[str, set[tuple]] = {}
+    for extraction in extractions:
+        for band_info in extraction.bands:
+            band_name = normalize_band_name(band_info.band_name)
+            if band_name not in bands:
+                bands[band_name] = BandInfo(band_name=band_info.band_name, concerts=[])
+                seen_concerts[band_name] = set()
+            for concert in band_info.concerts:
+                key = concert_key(concert)
+                if key not in seen_concerts[band_name]:
+                    seen_concerts[band_name].add(key)
+                    bands[band_name].concerts.append(concert)
+    return ConcertExtraction(bands=list(bands.values()))
+
+
+async def tiled_extraction(
+    image_data: bytes, media_type: str, on_band: Callable[[BandInfo], None]
+) -> ConcertExtraction | None:
+    """Extract the tiles of a big poster concurrently and merge them.
+    Calls `on_band` for the bands of every finished tile; None if the image can't be tiled."""
+    loop = asyncio.get_running_loop()
+    rows, cols = TILE_GRID
+    tiles = await loop.run_in_executor(preprocess_pool, split_tiles, image_data, rows, cols, TILE_OVERLAP)
+    if not tiles:
+        return None
+    overview = await loop.run_in_executor(
+        preprocess_pool, preprocess_image, image_data, media_type, TILE_OVERVIEW_EDGE
+    )
+    start = time.perf_counter()
+    
+    async def extract_tile(index: int, tile_data: bytes) -> ConcertExtraction:
+        tile_start = time.perf_counter()
+        result = await stages.run(f"Agent 1 (tile {index + 1})", lambda: limiter.run(
+            lambda: asyncio.wait_for(extraction_agent.run(tile_prompt(overview, tile_data)), EXTRACTION_TIMEOUT),
+            estimated_tokens=EXTRACTION_TOKENS_ESTIMATE,
+        ))
+        print(f"   Agent 1: Tile {index + 1}/{len(tiles)} done in {time.perf_counter() - tile_start:.1f}s, "
+              f"{len(result.output.bands)} band(s)")
+        for band_info in result.output.bands:
+            on_band(band_info)
+        return result.output
+    
+    print(f"   Agent 1: Extracting {len(tiles)} tiles concurrently...")
+    extractions = await asyncio.gather(*[extract_tile(i, tile) for i, tile in enumerate(tiles)])
+    merged = merge_extractions(list(extractions))
+    found = sum(len(extraction.bands) for extraction in extractions)
+    print(f"   Agent 1: {len(merged.bands)} band(s) after merging {found} from the tiles, "
+          f"{time.perf_counter() - start:.1f}s in total")
+    return merged
+
+
+def deduplicate_bands(extraction: ConcertExtraction) -> list[BandInfo]:
+    """Deduplicate bands by name (keep first occurrence, merge concerts)"""
+    unique_bands: dict[str, BandInfo] = {}
+    for band_info in extraction.bands:
+        band_name = normalize_band_name(band_info.band_name)
+        if band_name not in unique_bands:
+            unique_bands[band_name] = band_info
+        else:
+            # Merge concerts from duplicate band entries
+            unique_bands[band_name].concerts.extend(band_info.concerts)
+    return list(unique_bands.values())
+
+
+async def extract_and_enrich(
+    image_name: str, image_data: bytes, media_type: str, streaming: bool,
+    on_extracted: Callable[[ConcertExtraction], Awaitable[None]] | None = None,
+) -> EnrichedConcertExtraction:
+    """Run both agents on one image (with the caches).
+    Awaits `on_extracted(extraction)` once the extraction is known, before the enrichment."""
+    # Band lookups started while the extraction is still streaming, by normalized band name
+    lookups: dict[str, asyncio.Task[BandEnrichment]] = {}
+    
+    def start_lookup(band_info: BandInfo):
+        band_name = normalize_band_name(band_info.band_name)
+        if band_name not in lookups:
+            lookups[band_name] = asyncio.create_task(band_enrichment(band_info.band_name))
+    
+    # The caches are SQLite files: their calls run in a thread, so the event loop keeps going
+    cache_key = ExtractionCache.make_key(image_data, EXTRACTION_MODEL, EXTRACTION_INSTRUCTIONS)
+    extraction = await asyncio.to_thread(extraction_cache.get, cache_key, ConcertExtraction)
+    loop = asyncio.get_running_loop()
+    image_hash = await loop.run_in_executor(preprocess_pool, dhash, image_data)
+    near_duplicate = None
+    if extraction is None and image_hash is not None:
+        near_duplicate = await asyncio.to_thread(poster_index.get, image_hash, ConcertExtraction)
+    if extraction is not None:
+        print("   Agent 1: Found in extraction cache, skipping the LLM call")
+    elif near_duplicate is not None:
+        extraction, known_image, distance = near_duplicate
+        print(f"   Agent 1: Near-duplicate of {known_image} ({distance} bit(s) apart), reusing its extraction")
+        await asyncio.to_thread(extraction_cache.put, cache_key, extraction)
+    else:
+        if TILED_EXTRACTION:
+            size = await loop.run_in_executor(preprocess_pool, image_size, image_data)
+            if size is not None and max(size) >= TILE_MIN_EDGE:
+                extraction = await tiled_extraction(image_data, media_type, start_lookup)
+        if extraction is None:
+            image_data, media_type = await prepare_image(image_data, media_type)
+            if streaming:
+                print("   Agent 1: Streaming concert info from image, Agent 2 starts on each finished band...")
+                extraction = await stream_extraction(image_data, media_type, start_lookup)
+            else:
+                print("   Agent 1: Extracting concert info from image...")
+                extraction_result = await stages.run("Agent 1", lambda: limiter.run(
+                    lambda: asyncio.wait_for(extraction_agent.run(extraction_prompt(image_data, media_type)),
+                                             EXTRACTION_TIMEOUT),
+                    estimated_tokens=EXTRACTION_TOKENS_ESTIMATE,
+                ))
+                extraction = extraction_result.output
+        await asyncio.to_thread(extraction_cache.put, cache_key, extraction)
+    
+    if image_hash is not None:
+        await asyncio.to_thread(poster_index.add, image_hash, image_name, extraction)
+    if on_extracted is not None:
+        await on_extracted(extraction)
+    
+    deduplicated_bands = deduplicate_bands(extraction)
+    
+    if lookups:
+        # Concerts of duplicate bands are merged only now, so the bands are built after the lookups
+        enrichments = await asyncio.gather(*[lookups[normalize_band_name(band_info.band_name)]
+                                             for band_info in deduplicated_bands])
+        enriched_bands = [make_enriched_band(band_info, enrichment)
+                          for band_info, enrichment in zip(deduplicated_bands, enrichments)]
+    else:
+        # Enrich ALL bands in parallel, the limiter decides how many run at once
+        print(f"   Agent 2: Enriching {len(deduplicated_bands)} bands in parallel...")
+        enriched_bands = await enrich_bands(deduplicated_bands)
+    
+    # Create enriched extraction result
+    return EnrichedConcertExtraction(bands=enriched_bands)
+
+
 async def process_image(image_path: Path):
     """Process a single image and extract concert information"""
     if image_path.suffix.lower() not in IMAGE_EXTENSIONS:
@@ -190,57 +631,104 @@ async def process_image(image_path: Path):
     print(f"\nProcessing: {image_path.name}")
     
     try:
-        # Wait a moment to ensure file is fully written
-        await asyncio.sleep(0.5)
-        
-        # Read image and send to extraction agent
-        image_data = image_path.read_bytes()
+        # Read image and send to extraction agent (file and manifest access in a thread)
+        image_data = await asyncio.to_thread(image_path.read_bytes)
         media_type = get_media_type(image_path)
         
-        print("   Agent 1: Extracting concert info from image...")
-        extraction_result = await extraction_agent.run([
-            "Extract all concert information from this image.",
-            BinaryContent(data=image_data, media_type=media_type),
-        ])
-        
-        # Deduplicate bands by name (keep first occurrence, merge concerts)
-        unique_bands: dict[str, BandInfo] = {}
-        for band_info in extraction_result.output.bands:
-            band_name = band_info.band_name.strip().lower()
-            if band_name not in unique_bands:
-                unique_bands[band_name] = band_info
-            else:
-                # Merge concerts from duplicate band entries
-                unique_bands[band_name].concerts.extend(band_info.concerts)
+        content_hash = IngestManifest.content_hash(image_data)
+        state = await asyncio.to_thread(manifest.state, content_hash)
+        if state == 'written':
+            print("   Already saved, skipping")
+            return
+        if state == 'enriched':
+            print("   Already enriched before a restart, only saving")
+            extraction = await asyncio.to_thread(manifest.payload, content_hash, EnrichedConcertExtraction)
+            await write_extraction(image_path.name, extraction, content_hash)
+            return
+        await asyncio.to_thread(manifest.mark, content_hash, image_path.name, 'queued')
         
-        deduplicated_bands = list(unique_bands.values())
+        async def mark_extracted(extraction: ConcertExtraction):
+            await asyncio.to_thread(manifest.mark, content_hash, image_path.name, 'extracted', extraction)
         
-        # Enrich ALL bands in parallel using asyncio.gather
-        print(f"   Agent 2: Enriching {len(deduplicated_bands)} bands in parallel...")
-        enriched_bands = await asyncio.gather(
-            *[enrich_band(band_info) for band_info in deduplicated_bands]
+        start = time.perf_counter()
+        enriched_extraction = await extract_and_enrich(
+            image_path.name, image_data, media_type, STREAM_EXTRACTION, mark_extracted
         )
+        print(f"   {image_path.name}: extracted and enriched in {time.perf_counter() - start:.1f}s")
+        await asyncio.to_thread(manifest.mark, content_hash, image_path.name, 'enriched', enriched_extraction)
         
-        # Create enriched extraction result
-        enriched_extraction = EnrichedConcertExtraction(bands=list(enriched_bands))
-        
-        # Save to CSV
-        append_to_csv(image_path.name, enriched_extraction)
+        # Save to the database and the CSV export (batched with other posters)
+        await write_extraction(image_path.name, enriched_extraction, content_hash)
         
     except Exception as e:
         print(f"   Error processing {image_path.name}: {e}")
 
 
+async def reenrich_pending():
+    """Look up the bands that were saved with a pending enrichment again"""
+    band_names = await asyncio.to_thread(store.pending_bands)
+    if not band_names:
+        return
+    print(f"\nLooking up {len(band_names)} band(s) with a pending enrichment again...")
+    enrichments = await asyncio.gather(*[band_enrichment(band_name) for band_name in band_names])
+    found = [(band_name, enrichment.genre, enrichment.country)
+             for band_name, enrichment in zip(band_names, enrichments) if enrichment.genre != PENDING_ENRICHMENT]
+    # All updates in one thread call, the event loop keeps serving the other posters meanwhile
+    updated = await asyncio.to_thread(lambda: sum(store.update_band(*band) for band in found))
+    if updated:
+        await asyncio.to_thread(store.export_csv, CSV_OUTPUT)
+        print(f"Enriched {updated} pending band(s), regenerated {CSV_OUTPUT}")
+
+
+def print_stats():
+    """Print the counters of the caches and the rate limiter"""
+    print(extraction_cache.stats())
+    print(poster_index.stats())
+    print(band_cache.stats())
+    print(band_flights.stats())
+    print(limiter.stats())
+    print(manifest.stats())
+    print(writer.stats())
+    print(stages.stats())
+
+
+async def worker(queue: asyncio.Queue[Path]):
+    """Take image paths from the queue and process them, forever"""
+    while True:
+        image_path = await queue.get()
+        try:
+            await process_image(image_path)
+        finally:
+            queue.task_done()
+
+
 class ImageHandler(FileSystemEventHandler):
-    """Handler for new image files in the watch folder"""
+    """Handler for new image files in the watch folder.
+
+    Created, modified and moved-in (renamed into place) files go to the
+    readiness tracker. Once a file is completely written, the tracker's
+    thread hands it over to the event loop thread-safely.
+    """
+    
+    def __init__(self, readiness: ReadinessTracker):
+        self.readiness = readiness
+    
+    def on_created(self, event: FileSystemEvent):
+        self.track(event, event.src_path)
     
-    def on_created(self, event: FileCreatedEvent):
+    def on_modified(self, event: FileSystemEvent):
+        self.track(event, event.src_path)
+    
+    def on_moved(self, event: FileSystemEvent):
+        self.track(event, event.dest_path)
+    
+    def track(self, event: FileSystemEvent, path: str):
         if event.is_directory:
             return
         
-        image_path = Path(event.src_path)
+        image_path = Path(path)
         if image_path.suffix.lower() in IMAGE_EXTENSIONS:
-            asyncio.run(process_image(image_path))
+            self.readiness.notify(image_path)
 
 
 async def main():
@@ -250,18 +738,30 @@ async def main():
     
     print(f"Watching folder: {WATCH_FOLDER.absolute()}")
     
-    # Initialize CSV
-    initialize_csv()
+    # Initialize the database, start the writer task and retry the enrichments that failed last time
+    initialize_store()
+    writer.start()
+    await reenrich_pending()
+    
+    # Start the worker pool that processes queued images
+    queue: asyncio.Queue[Path] = asyncio.Queue()
+    workers = [asyncio.create_task(worker(queue)) for _ in range(NUM_WORKERS)]
     
     # Process any existing images in the folder first (in parallel)
     existing_images = [f for f in WATCH_FOLDER.iterdir() 
                        if f.suffix.lower() in IMAGE_EXTENSIONS]
     if existing_images:
-        print(f"\nProcessing {len(existing_images)} existing image(s) in parallel...")
-        await asyncio.gather(*[process_image(image_path) for image_path in existing_images])
+        print(f"\nProcessing {len(existing_images)} existing image(s) with {NUM_WORKERS} workers...")
+        for image_path in existing_images:
+            queue.put_nowait(image_path)
+        await queue.join()
+        print_stats()
     
-    # Set up the watchdog observer
-    event_handler = ImageHandler()
+    # Set up the readiness tracker and the watchdog observer
+    loop = asyncio.get_running_loop()
+    readiness = ReadinessTracker(lambda image_path: loop.call_soon_threadsafe(queue.put_nowait, image_path))
+    readiness.start()
+    event_handler = ImageHandler(readiness)
     observer = Observer()
     observer.schedule(event_handler, str(WATCH_FOLDER), recursive=False)
     observer.start()
@@ -271,11 +771,19 @@ async def main():
     try:
         while True:
             await asyncio.sleep(1)
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, asyncio.CancelledError):
         print("\nStopping watcher...")
         observer.stop()
     
+    for task in workers:
+        task.cancel()
     observer.join()
+    readiness.stop()
+    # Rows of cancelled workers are still queued, write them before exiting
+    await writer.close()
+    preprocess_pool.shutdown()
+    print_stats()
+    print(readiness.stats())
     print("Done!")
 
 
@@ -22,23 +22,54 @@ You can, however, install dependencies through pip freeze and a requirements.txt
 2. pip3 install -r requirements.txt
 """
 
-import csv
 import time
 from pathlib import Path
 from datetime import datetime
 
 from pydantic import BaseModel
 from pydantic_ai import Agent, BinaryContent, WebSearchTool
+from pydantic_ai.settings import ModelSettings
 from dotenv import load_dotenv
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler, FileCreatedEvent
+from watchdog.events import FileSystemEventHandler, FileSystemEvent
+
+from band_cache import BandKnowledgeStore
+from concert_store import PENDING_ENRICHMENT, ConcertStore
+from extraction_cache import ExtractionCache
+from file_readiness import ReadinessTracker
+from image_preprocess import preprocess_image
+from ingest_manifest import IngestManifest
+from poster_index import PosterIndex, dhash
+from resilience import RetryPolicy, StageRunner, describe
 
 load_dotenv()
 
 # Configuration
 WATCH_FOLDER = Path("images_watchfolder")
-CSV_OUTPUT = Path("concerts.csv")
+DB_OUTPUT = Path("concerts.db")
+CSV_OUTPUT = Path("concerts-export.csv")  # Kept up to date as an export of the database
+IMPORT_CSV = Path("concerts.csv")  # Imported into a new database (lesson11.py or an older lesson12.py), never written
 IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
+PREPROCESS_IMAGES = True  # Downscale and re-encode images before extraction (needs pillow)
+MAX_IMAGE_EDGE = 1024  # Max width/height in pixels of the image sent to the model (see image_preprocess.py)
+CROP_BORDERS = False  # Also crop away a uniform frame around the poster
+NEAR_DUPLICATE_DISTANCE = 4  # Max differing bits of the perceptual hash to reuse an earlier extraction
+EXTRACTION_TIMEOUT = 120  # Seconds per extraction attempt
+ENRICHMENT_TIMEOUT = 90  # Seconds per band lookup attempt (web search is slow)
+MAX_RETRIES = 3  # Retries of a call that failed with a transient error (timeout, connection, 429, 5xx)
+RETRY_BASE_DELAY = 1.0  # Retry n waits a random 0 to RETRY_BASE_DELAY * 2^n seconds
+EXTRACTION_MODEL = 'openai:gpt-5.2'
+EXTRACTION_INSTRUCTIONS = """
+    Extract concert information from the image.
+    For each band visible, extract:
+    - The band name
+    - The venue(s) where they play
+    - The location of each venue
+    - The date of each concert
+    - The event/festival name (if it's part of a named event like a festival)
+    If any information is unclear or missing, use "Unknown" as the value.
+    Leave event_name as null if there's no specific event/festival name.
+    """
 
 
 class Concert(BaseModel):
@@ -75,26 +106,36 @@ class EnrichedConcertExtraction(BaseModel):
 
 # Agent 1: Extract concert info from images
 extraction_agent = Agent(
-    'openai:gpt-5.2',
+    EXTRACTION_MODEL,
     output_type=ConcertExtraction,
-    instructions="""
-    Extract concert information from the image.
-    For each band visible, extract:
-    - The band name
-    - The venue(s) where they play
-    - The location of each venue
-    - The date of each concert
-    - The event/festival name (if it's part of a named event like a festival)
-    If any information is unclear or missing, use "Unknown" as the value.
-    Leave event_name as null if there's no specific event/festival name.
-    """,
+    instructions=EXTRACTION_INSTRUCTIONS,
+    model_settings=ModelSettings(timeout=EXTRACTION_TIMEOUT),
 )
 
+# Concert database, every new row is also appended to the CSV export
+store = ConcertStore(DB_OUTPUT, csv_export=CSV_OUTPUT)
+
+# Persistent cache: the same poster (even renamed) is only sent to Agent 1 once
+extraction_cache = ExtractionCache()
+
+# Persistent perceptual hashes: resized or re-exported copies of a poster reuse its extraction
+poster_index = PosterIndex(max_distance=NEAR_DUPLICATE_DISTANCE)
+
+# Persistent per-image state: a restart skips saved images and resumes the unfinished ones
+manifest = IngestManifest.for_output(DB_OUTPUT)
+
+# Timeouts and retries with jittered backoff for the agent calls
+stages = StageRunner(RetryPolicy(retries=MAX_RETRIES, base_delay=RETRY_BASE_DELAY))
+
+# Persistent cache: each band is looked up on the web once, not on every poster
+band_cache = BandKnowledgeStore()
+
 # Agent 2: Enrich band info with genre and country via web search
 enrichment_agent = Agent(
     'openai-responses:gpt-5.2',
     output_type=BandEnrichment,
     builtin_tools=[WebSearchTool()],
+    model_settings=ModelSettings(timeout=ENRICHMENT_TIMEOUT),
     instructions="""
     You are given a band name. Use web search to find information about the band.
     Find:
@@ -118,36 +159,82 @@ def get_media_type(filepath: Path) -> str:
     return media_types.get(suffix, 'image/jpeg')
 
 
-def initialize_csv():
-    """Create the CSV file with headers if it doesn't exist"""
-    if not CSV_OUTPUT.exists():
-        with open(CSV_OUTPUT, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['timestamp', 'source_image', 'band_name', 'genre', 'country', 'venue', 'location', 'date', 'event_name'])
-        print(f"Created {CSV_OUTPUT}")
+def initialize_store():
+    """Import an existing CSV file the first time the database is used, and repair the export"""
+    if store.revision() == 0 and IMPORT_CSV.exists():
+        count = store.import_csv(IMPORT_CSV)
+        print(f"Imported {count} row(s) from {IMPORT_CSV} into {DB_OUTPUT}")
+    if store.repair_csv_export():
+        print(f"Regenerated {CSV_OUTPUT} from {DB_OUTPUT}, it was out of date")
+    unfinished = manifest.unfinished()
+    if unfinished:
+        print(f"Resuming {len(unfinished)} unfinished image(s): "
+              + ", ".join(f"{name} ({state})" for name, state in unfinished))
 
 
-def append_to_csv(source_image: str, extraction: EnrichedConcertExtraction):
-    """Append extracted concert data to the CSV file"""
+def extraction_rows(source_image: str, extraction: EnrichedConcertExtraction) -> list[dict]:
+    """Flatten an enriched extraction into one row per concert"""
     timestamp = datetime.now().isoformat()
+    return [
+        {
+            'timestamp': timestamp,
+            'source_image': source_image,
+            'band_name': band_info.band_name,
+            'genre': band_info.genre,
+            'country': band_info.country,
+            'venue': concert.venue,
+            'location': concert.location,
+            'date': concert.date,
+            'event_name': concert.event_name or '',
+        }
+        for band_info in extraction.bands
+        for concert in band_info.concerts
+    ]
+
+
+def save_extraction(source_image: str, extraction: EnrichedConcertExtraction, content_hash: str):
+    """Save extracted concert data to the database (one transaction) and the CSV export,
+    at most once per image content"""
+    count = store.add_rows(extraction_rows(source_image, extraction), ingest_key=content_hash)
+    manifest.mark(content_hash, source_image, 'written')
+    print(f"   Saved {count} concert(s) to {DB_OUTPUT} and {CSV_OUTPUT}")
+
+
+def band_enrichment(band_name: str) -> BandEnrichment:
+    """Genre and country of a band, from the band cache or the web.
+    Pending if the lookup keeps failing, so the rest of the poster is still saved."""
+    enrichment = band_cache.get(band_name, BandEnrichment)
+    if enrichment is not None:
+        print(f"   Agent 2: Found '{band_name}' in band cache")
+        return enrichment
+    print(f"   Agent 2: Searching web for '{band_name}' info...")
     
-    with open(CSV_OUTPUT, 'a', newline='') as f:
-        writer = csv.writer(f)
-        for band_info in extraction.bands:
-            for concert in band_info.concerts:
-                writer.writerow([
-                    timestamp,
-                    source_image,
-                    band_info.band_name,
-                    band_info.genre,
-                    band_info.country,
-                    concert.venue,
-                    concert.location,
-                    concert.date,
-                    concert.event_name or ''
-                ])
-    
-    print(f"   Saved to {CSV_OUTPUT}")
+    # Use the enrichment agent to get genre and country
+    try:
+        enrichment_result = stages.run_sync("Agent 2", lambda: enrichment_agent.run_sync(
+            f"Find the genre and country of origin for the band: {band_name}"
+        ))
+    except Exception as e:
+        print(f"   Agent 2: Giving up on '{band_name}' ({describe(e)}), saving it as pending")
+        return BandEnrichment(genre=PENDING_ENRICHMENT, country=PENDING_ENRICHMENT)
+    band_cache.put(band_name, enrichment_result.output, enrichment_result.usage().total_tokens)
+    return enrichment_result.output
+
+
+def reenrich_pending():
+    """Look up the bands that were saved with a pending enrichment again"""
+    band_names = store.pending_bands()
+    if not band_names:
+        return
+    print(f"\nLooking up {len(band_names)} band(s) with a pending enrichment again...")
+    updated = 0
+    for band_name in band_names:
+        enrichment = band_enrichment(band_name)
+        if enrichment.genre != PENDING_ENRICHMENT:
+            updated += store.update_band(band_name, enrichment.genre, enrichment.country)
+    if updated:
+        store.export_csv(CSV_OUTPUT)
+        print(f"Enriched {updated} pending band(s), regenerated {CSV_OUTPUT}")
 
 
 def process_image(image_path: Path):
@@ -158,35 +245,59 @@ def process_image(image_path: Path):
     print(f"\nProcessing: {image_path.name}")
     
     try:
-        # Wait a moment to ensure file is fully written
-        time.sleep(0.5)
-        
         # Read image and send to extraction agent
         image_data = image_path.read_bytes()
         media_type = get_media_type(image_path)
         
-        print("   Agent 1: Extracting concert info from image...")
-        extraction_result = extraction_agent.run_sync([
-            "Extract all concert information from this image.",
-            BinaryContent(data=image_data, media_type=media_type),
-        ])
+        content_hash = IngestManifest.content_hash(image_data)
+        state = manifest.state(content_hash)
+        if state == 'written':
+            print("   Already saved, skipping")
+            return
+        if state == 'enriched':
+            print("   Already enriched before a restart, only saving")
+            save_extraction(image_path.name, manifest.payload(content_hash, EnrichedConcertExtraction), content_hash)
+            return
+        manifest.mark(content_hash, image_path.name, 'queued')
+        
+        cache_key = ExtractionCache.make_key(image_data, EXTRACTION_MODEL, EXTRACTION_INSTRUCTIONS)
+        extraction = extraction_cache.get(cache_key, ConcertExtraction)
+        image_hash = dhash(image_data)
+        near_duplicate = None
+        if extraction is None and image_hash is not None:
+            near_duplicate = poster_index.get(image_hash, ConcertExtraction)
+        if extraction is not None:
+            print("   Agent 1: Found in extraction cache, skipping the LLM call")
+        elif near_duplicate is not None:
+            extraction, known_image, distance = near_duplicate
+            print(f"   Agent 1: Near-duplicate of {known_image} ({distance} bit(s) apart), reusing its extraction")
+            extraction_cache.put(cache_key, extraction)
+        else:
+            print("   Agent 1: Extracting concert info from image...")
+            if PREPROCESS_IMAGES:
+                image_data, media_type = preprocess_image(image_data, media_type, MAX_IMAGE_EDGE, CROP_BORDERS)
+            extraction_result = stages.run_sync("Agent 1", lambda: extraction_agent.run_sync([
+                "Extract all concert information from this image.",
+                BinaryContent(data=image_data, media_type=media_type),
+            ]))
+            extraction = extraction_result.output
+            extraction_cache.put(cache_key, extraction)
+        
+        if image_hash is not None:
+            poster_index.add(image_hash, image_path.name, extraction)
+        manifest.mark(content_hash, image_path.name, 'extracted', extraction)
         
         # Enrich each band with genre and country using the second agent
         enriched_bands: list[EnrichedBandInfo] = []
         
-        for band_info in extraction_result.output.bands:
-            print(f"   Agent 2: Searching web for '{band_info.band_name}' info...")
-            
-            # Use the enrichment agent to get genre and country
-            enrichment_result = enrichment_agent.run_sync(
-                f"Find the genre and country of origin for the band: {band_info.band_name}"
-            )
+        for band_info in extraction.bands:
+            enrichment = band_enrichment(band_info.band_name)
             
             # Create enriched band info
             enriched_band = EnrichedBandInfo(
                 band_name=band_info.band_name,
-                genre=enrichment_result.output.genre,
-                country=enrichment_result.output.country,
+                genre=enrichment.genre,
+                country=enrichment.country,
                 concerts=band_info.concerts
             )
             enriched_bands.append(enriched_band)
@@ -202,24 +313,41 @@ def process_image(image_path: Path):
         
         # Create enriched extraction result
         enriched_extraction = EnrichedConcertExtraction(bands=enriched_bands)
+        manifest.mark(content_hash, image_path.name, 'enriched', enriched_extraction)
         
-        # Save to CSV
-        append_to_csv(image_path.name, enriched_extraction)
+        # Save to the database and the CSV export
+        save_extraction(image_path.name, enriched_extraction, content_hash)
         
     except Exception as e:
         print(f"   Error processing {image_path.name}: {e}")
 
 
 class ImageHandler(FileSystemEventHandler):
-    """Handler for new image files in the watch folder"""
+    """Handler for new image files in the watch folder.
+
+    Created, modified and moved-in (renamed into place) files go to the
+    readiness tracker, which processes each one once it is completely written.
+    """
+    
+    def __init__(self, readiness: ReadinessTracker):
+        self.readiness = readiness
+    
+    def on_created(self, event: FileSystemEvent):
+        self.track(event, event.src_path)
     
-    def on_created(self, event: FileCreatedEvent):
+    def on_modified(self, event: FileSystemEvent):
+        self.track(event, event.src_path)
+    
+    def on_moved(self, event: FileSystemEvent):
+        self.track(event, event.dest_path)
+    
+    def track(self, event: FileSystemEvent, path: str):
         if event.is_directory:
             return
         
-        image_path = Path(event.src_path)
+        image_path = Path(path)
         if image_path.suffix.lower() in IMAGE_EXTENSIONS:
-            process_image(image_path)
+            self.readiness.notify(image_path)
 
 
 def main():
@@ -229,8 +357,9 @@ def main():
     
     print(f"Watching folder: {WATCH_FOLDER.absolute()}")
     
-    # Initialize CSV
-    initialize_csv()
+    # Initialize the database and retry the enrichments that failed last time
+    initialize_store()
+    reenrich_pending()
     
     # Process any existing images in the folder first
     existing_images = [f for f in WATCH_FOLDER.iterdir() 
@@ -239,9 +368,16 @@ def main():
         print(f"\nProcessing {len(existing_images)} existing image(s)...")
         for image_path in existing_images:
             process_image(image_path)
+        print(extraction_cache.stats())
+        print(poster_index.stats())
+        print(band_cache.stats())
+        print(manifest.stats())
+        print(stages.stats())
     
-    # Set up the watchdog observer
-    event_handler = ImageHandler()
+    # Set up the readiness tracker and the watchdog observer
+    readiness = ReadinessTracker(process_image)
+    readiness.start()
+    event_handler = ImageHandler(readiness)
     observer = Observer()
     observer.schedule(event_handler, str(WATCH_FOLDER), recursive=False)
     observer.start()
@@ -256,6 +392,13 @@ def main():
         observer.stop()
     
     observer.join()
+    readiness.stop()
+    print(readiness.stats())
+    print(extraction_cache.stats())
+    print(poster_index.stats())
+    print(band_cache.stats())
+    print(manifest.stats())
+    print(stages.stats())
     print("Done!")
 
 
@@ -23,78 +23,106 @@ You can, however, install dependencies through pip freeze and a requirements.txt
 2. pip3 install -r requirements.txt
 """
 
-import csv
 from pathlib import Path
 
 from pydantic_ai import Agent, RunContext
+from pydantic_ai.settings import ModelSettings
 from dotenv import load_dotenv
 
+from answer_cache import AnswerCache
+from concert_store import read_rows
+from context_encoder import build_prefix, count_tokens
+from query_planner import QueryPlanner
+
 load_dotenv()
 
 # Configuration
+DB_FILE = Path("concerts-async.db")
 CSV_FILE = Path("concerts-async.csv")
+TOKEN_BUDGET = 50_000  # Max tokens of concert data put into every question
+QUERY_MODEL = 'openai:gpt-5.2'  # e.g. 'anthropic:claude-haiku-4-5'
+
+QUERY_INSTRUCTIONS = """
+You are a helpful assistant that answers questions about concert data.
+
+You have access to a CSV database containing information about bands, their genres,
+countries of origin, concert venues, locations, and dates.
+
+The data is given in a compact format: the format and the meaning of the
+short codes (like V1 for a venue) are explained at the top of the data.
+Each line is one band with its genre, country and all its concerts.
+
+Rules:
+- ONLY answer questions based on the data provided to you
+- If the information is not in the data, say "I don't have this information in the database"
+- Be precise and count carefully when asked about numbers
+- When listing items, format them nicely
+- Be concise but helpful
+"""
 
 
 def load_csv_data() -> str:
-    if not CSV_FILE.exists():
-        return "CSV file does not exist."
-    
-    with open(CSV_FILE, 'r', newline='') as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
+    if not DB_FILE.exists() and not CSV_FILE.exists():
+        print("[CSV file does not exist]")
     
-    if not rows:
-        return "The CSV file is empty."
+    # Read from the concert database when lesson12-async.py created one
+    rows = read_rows(DB_FILE, CSV_FILE)
     
-    # Format data as a readable string
-    lines = [f"CSV Data ({len(rows)} records):"]
-    lines.append("Columns: " + ", ".join(rows[0].keys()))
-    lines.append("-" * 50)
+    # Instructions + data, byte-identical for the same data so the provider can cache it.
+    # Compact format: header once, repeated values coded, concerts grouped by band
+    context = build_prefix(QUERY_INSTRUCTIONS, rows, token_budget=TOKEN_BUDGET)
     
-    for row in rows:
-        lines.append(str(dict(row)))
+    raw_tokens = count_tokens("\n".join(str(dict(row)) for row in rows))
+    print(f"[Context: {context.tokens} tokens for {context.bands_included}/{context.bands_total} bands, "
+          f"~{raw_tokens} as one dict per row]")
     
-    return "\n".join(lines)
+    return context.text
+
+
+def cache_settings(model: str) -> ModelSettings:
+    """Ask the provider to cache the instructions + data prefix.
+    OpenAI caches long prefixes automatically; Anthropic needs cache_control."""
+    if model.startswith('anthropic:'):
+        from pydantic_ai.models.anthropic import AnthropicModelSettings
+        return AnthropicModelSettings(anthropic_cache_instructions=True)
+    return ModelSettings()
 
 
 # Create the query agent
 query_agent = Agent(
-    'openai:gpt-5.2',
-    deps_type=str,  # The CSV data will be passed as dependency
-    instructions="""
-    You are a helpful assistant that answers questions about concert data.
-    
-    You have access to a CSV database containing information about bands, their genres, 
-    countries of origin, concert venues, locations, and dates.
-    
-    The CSV columns are: timestamp, source_image, band_name, genre, country, venue, location, date, event_name
-    
-    Rules:
-    - ONLY answer questions based on the data provided to you
-    - If the information is not in the data, say "I don't have this information in the database"
-    - Be precise and count carefully when asked about numbers
-    - When listing items, format them nicely
-    - Be concise but helpful
-    """,
+    QUERY_MODEL,
+    deps_type=str,  # The instructions + CSV data will be passed as dependency
+    model_settings=cache_settings(QUERY_MODEL),
 )
 
 
 # Dynamic instructions decorator: Adds context to the agent at runtime.
 # Unlike static instructions (passed to Agent constructor), this function
 # is called before each run and can access dependencies via RunContext.
+# The whole prompt prefix comes from build_prefix(), so it is the same on every turn.
 @query_agent.instructions
 def add_csv_data(ctx: RunContext[str]) -> str:
-    """Inject the CSV data into the agent's instructions at runtime"""
-    return f"\n\nHere is the concert database:\n\n{ctx.deps}"
+    """Inject the instructions and the CSV data into the agent's instructions at runtime"""
+    return ctx.deps
+
+
+def usage_report(usage) -> str:
+    """Token usage of one answer, with the cached part of the input"""
+    uncached = usage.input_tokens - usage.cache_read_tokens - usage.cache_write_tokens
+    return (f"[Tokens: {usage.input_tokens} in ({usage.cache_read_tokens} cached, "
+            f"{usage.cache_write_tokens} written to cache, {uncached} uncached) / {usage.output_tokens} out]")
 
 
 def main():
-    # Load CSV data once at startup
+    planner = QueryPlanner.for_files(DB_FILE, CSV_FILE)
+    answer_cache = AnswerCache(DB_FILE, CSV_FILE, namespace='lesson13')
+    # Load CSV data once at startup (the version first: the data is at least that new)
+    data_version = answer_cache.data_version()
     csv_data = load_csv_data()
     
 
     print("Query Agent of custom dataset")
-    print(f"Loaded data from: {CSV_FILE}")
+    print(f"Loaded data from: {DB_FILE if DB_FILE.exists() else CSV_FILE}")
     print("Ask questions about the concert data. Type 'q' to exit.")
 
     
@@ -112,17 +140,41 @@ def main():
             if not question:
                 continue
             
-            # Run the agent with the question
+            # Plain count/list questions are answered from the data, without the LLM
+            answer = planner.answer(question)
+            if answer is not None:
+                print(f"\nAgent: {answer}")
+                print("[Answered by the query planner, no LLM call]\n")
+                continue
+            
+            # The same question about the same data gets the same answer
+            version = answer_cache.data_version()
+            cached = answer_cache.get(question, version)
+            if cached is not None:
+                print(f"\nAgent: {cached}")
+                print("[Answered from the answer cache, no LLM call]\n")
+                continue
+            
+            # New data was ingested since the context was loaded
+            if version != data_version:
+                data_version = version
+                csv_data = load_csv_data()
+            
+            # Run the agent with the question, the answer is cached under the version of its data
             result = query_agent.run_sync(question, deps=csv_data)
+            answer_cache.put(question, result.output, data_version)
             
             print(f"\nAgent: {result.output}")
-            print(f"[Tokens: {result.usage().input_tokens} in / {result.usage().output_tokens} out]\n")
+            print(f"{usage_report(result.usage())}\n")
             
         except KeyboardInterrupt:
             print("\nGoodbye!")
             break
         except Exception as e:
             print(f"\nError: {e}\n")
+    
+    print(planner.stats())
+    print(answer_cache.stats())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,161 @@
+r"""
+Lesson 13 Auto: one query entry point that picks the cheaper way to ask.
+
+lesson13.py puts the whole dataset into every prompt: cheap and accurate for a
+small dataset, expensive for a big one. lesson13_mcp_has_task.py lets the LLM
+call MCP tools instead: a few tool round trips per question, but the cost
+hardly grows with the data. This script measures the dataset first:
+- the encoded dataset fits under FULL_CONTEXT_MAX_TOKENS -> full-context mode
+- otherwise -> MCP tool mode
+
+Every question's mode, latency and token usage is appended to QUERY_LOG, so the
+threshold can be tuned from real measurements. Plain count and list questions
+are answered by the query planner without any LLM call (mode 'planner' in the log),
+and questions already answered about the same data come from the answer cache
+(mode 'cache').
+
+Setup:
+
+Install the dependencies
+1. pip3 install "pydantic-ai-slim[mcp]"
+2. pip3 install mcp
+3. pip3 install dotenv
+
+Run: python lesson13_auto.py [--mode auto|full|tools] [--threshold 20000]
+"""
+
+import argparse
+import asyncio
+import csv
+import time
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+from pydantic_ai.usage import RunUsage
+
+import lesson13
+import lesson13_mcp_has_task
+from answer_cache import AnswerCache, read_data_version
+from concert_store import read_rows
+from context_encoder import EncodedContext, build_prefix, encode_rows
+from query_planner import QueryPlanner
+
+load_dotenv()
+
+# Configuration
+FULL_CONTEXT_MAX_TOKENS = 20_000  # Above this, the dataset is queried through MCP tools
+QUERY_LOG = Path("query_log.csv")
+QUERY_LOG_COLUMNS = ['timestamp', 'mode', 'context_tokens', 'question', 'latency_s',
+                     'input_tokens', 'cached_tokens', 'output_tokens', 'requests']
+
+
+def choose_mode(context_tokens: int, threshold: int) -> str:
+    """'full' when the whole dataset fits under the threshold, else 'tools'"""
+    return 'full' if context_tokens <= threshold else 'tools'
+
+
+def log_question(mode: str, context_tokens: int, question: str, latency: float, usage):
+    """Append one question's measurements to the query log"""
+    write_header = not QUERY_LOG.exists()
+    with open(QUERY_LOG, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(QUERY_LOG_COLUMNS)
+        writer.writerow([datetime.now().isoformat(), mode, context_tokens, question, f"{latency:.2f}",
+                         usage.input_tokens, usage.cache_read_tokens, usage.output_tokens, usage.requests])
+
+
+def load_dataset() -> tuple[int, EncodedContext, str]:
+    """Row count, the full encoding (for the size estimate) and the context for full-context mode"""
+    rows = read_rows(lesson13.DB_FILE, lesson13.CSV_FILE)
+    encoded = encode_rows(rows)
+    # Same cache-friendly prefix as lesson13.py; a forced full-context mode on a big dataset
+    # stays within lesson13's budget
+    context = build_prefix(lesson13.QUERY_INSTRUCTIONS, rows, token_budget=lesson13.TOKEN_BUDGET).text
+    return len(rows), encoded, context
+
+
+async def ask(mode: str, question: str, context: str):
+    """Run the question through the agent of the chosen mode"""
+    if mode == 'full':
+        return await lesson13.query_agent.run(question, deps=context)
+    return await lesson13_mcp_has_task.query_agent.run(question)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Query the concert data in the cheaper mode")
+    parser.add_argument("--mode", choices=['auto', 'full', 'tools'], default='auto')
+    parser.add_argument("--threshold", type=int, default=FULL_CONTEXT_MAX_TOKENS,
+                        help="Max context tokens for full-context mode")
+    args = parser.parse_args()
+
+    # The version first: the loaded data is at least that new
+    data_version = read_data_version(lesson13.DB_FILE, lesson13.CSV_FILE)
+    row_count, encoded, context = load_dataset()
+    mode = choose_mode(encoded.tokens, args.threshold) if args.mode == 'auto' else args.mode
+
+    print("Query Agent of custom dataset (automatic mode)")
+    print(f"Dataset: {row_count} rows, ~{encoded.tokens} tokens encoded "
+          f"-> {'full-context' if mode == 'full' else 'MCP tool'} mode (threshold {args.threshold})")
+    print("Ask questions about the concert data. Type 'q' to exit.\n")
+    planner = QueryPlanner.for_files(lesson13.DB_FILE, lesson13.CSV_FILE)
+    answer_cache = AnswerCache(lesson13.DB_FILE, lesson13.CSV_FILE, namespace=f'lesson13_auto:{mode}')
+
+    # The MCP server process only runs in tool mode
+    agent = lesson13_mcp_has_task.query_agent if mode == 'tools' else lesson13.query_agent
+    async with agent:
+        while True:
+            try:
+                question = input("You: ").strip()
+
+                if question.lower() == 'q':
+                    print("Goodbye!")
+                    break
+
+                if not question:
+                    continue
+
+                start = time.perf_counter()
+                answer = planner.answer(question)
+                if answer is not None:
+                    log_question('planner', encoded.tokens, question, time.perf_counter() - start, RunUsage())
+                    print(f"\nAgent: {answer}")
+                    print("[Answered by the query planner, no LLM call]\n")
+                    continue
+
+                version = answer_cache.data_version()
+                cached = answer_cache.get(question, version)
+                if cached is not None:
+                    log_question('cache', encoded.tokens, question, time.perf_counter() - start, RunUsage())
+                    print(f"\nAgent: {cached}")
+                    print("[Answered from the answer cache, no LLM call]\n")
+                    continue
+
+                # New data was ingested since the context was loaded
+                if mode == 'full' and version != data_version:
+                    data_version = version
+                    row_count, encoded, context = load_dataset()
+
+                result = await ask(mode, question, context)
+                latency = time.perf_counter() - start
+                usage = result.usage()
+                # The full context may be older than `version` (tools read the data live)
+                answer_cache.put(question, result.output, data_version if mode == 'full' else version)
+                log_question(mode, encoded.tokens, question, latency, usage)
+
+                print(f"\nAgent: {result.output}")
+                print(f"[{mode} mode: {latency:.1f}s, {usage.requests} request(s)] {lesson13.usage_report(usage)}\n")
+
+            except KeyboardInterrupt:
+                print("\nGoodbye!")
+                break
+            except Exception as e:
+                print(f"\nError: {e}\n")
+
+    print(planner.stats())
+    print(answer_cache.stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -24,8 +24,15 @@ from pydantic_ai import Agent
 from pydantic_ai.mcp import MCPServerStdio
 from dotenv import load_dotenv
 
+from answer_cache import AnswerCache
+from query_planner import QueryPlanner
+
 load_dotenv()
 
+# Configuration
+DB_FILE = Path("concerts-async.db")  # Same data as lesson13_mcp_server.py
+CSV_FILE = Path("concerts-async.csv")
+
 # MCP server that provides CSV query tools
 csv_server = MCPServerStdio(
     'python',
@@ -67,6 +74,8 @@ async def main():
     print("MCP Query Agent - Token-Efficient CSV Queries")
     print("Using MCP server for on-demand data retrieval")
     print("Ask questions about the concert data. Type 'q' to exit.\n")
+    planner = QueryPlanner.for_files(DB_FILE, CSV_FILE)
+    answer_cache = AnswerCache(DB_FILE, CSV_FILE, namespace='lesson13_mcp')
     
     # Use async context manager to manage MCP server connection
     async with query_agent:
@@ -84,8 +93,24 @@ async def main():
                 if not question:
                     continue
                 
+                # Plain count/list questions are answered from the data, without the LLM
+                answer = planner.answer(question)
+                if answer is not None:
+                    print(f"\nAgent: {answer}")
+                    print("[Answered by the query planner, no LLM call]\n")
+                    continue
+                
+                # The same question about the same data gets the same answer
+                version = answer_cache.data_version()
+                cached = answer_cache.get(question, version)
+                if cached is not None:
+                    print(f"\nAgent: {cached}")
+                    print("[Answered from the answer cache, no LLM call]\n")
+                    continue
+                
                 # Run the agent with the question
                 result = await query_agent.run(question)
+                answer_cache.put(question, result.output, version)
                 
                 print(f"\nAgent: {result.output}")
                 print(f"[Tokens: {result.usage().input_tokens} in / {result.usage().output_tokens} out]\n")
@@ -95,6 +120,9 @@ async def main():
                 break
             except Exception as e:
                 print(f"\nError: {e}\n")
+    
+    print(planner.stats())
+    print(answer_cache.stats())
 
 
 if __name__ == "__main__":
@@ -1,7 +1,8 @@
 r"""
 Lesson 13 MCP Server: CSV Query Tools
 
-This MCP server exposes tools for querying the concerts-async.csv file.
+This MCP server exposes tools for querying the concerts-async.csv file
+(or the concerts-async.db database that lesson12-async.py writes next to it).
 Instead of passing all CSV data to the LLM, the LLM calls these tools
 to retrieve only the specific data it needs, saving input tokens.
 
@@ -9,88 +10,84 @@ Run directly: python lesson13_mcp_server.py (for testing)
 Used by: lesson13_mcp.py via MCPServerStdio
 """
 
-import csv
 from pathlib import Path
-from collections import Counter
 from mcp.server.fastmcp import FastMCP
 
+from concert_dataset import ConcertDataset
+
 # Create the MCP server
 mcp = FastMCP('CSV Query Server')
 
+DB_FILE = Path("concerts-async.db")
 CSV_FILE = Path("concerts-async.csv")
 
 
-def _load_rows() -> list[dict]:
-    """Load CSV rows as list of dicts"""
-    if not CSV_FILE.exists():
-        return []
-    with open(CSV_FILE, 'r', newline='') as f:
-        return list(csv.DictReader(f))
+# Loaded once, then only new rows are read when the file changes
+dataset = ConcertDataset(DB_FILE, CSV_FILE)
+
+
+def _load_dataset() -> ConcertDataset:
+    """Return the in-memory dataset, updated if the data changed since the last call"""
+    dataset.refresh()
+    return dataset
 
 
 @mcp.tool()
 def get_total_records() -> str:
     """Get the total number of records in the CSV database"""
-    rows = _load_rows()
-    return f"Total records: {len(rows)}"
+    data = _load_dataset()
+    return f"Total records: {len(data)}"
 
 
 @mcp.tool()
 def list_all_bands() -> str:
     """List all unique band names in the database"""
-    rows = _load_rows()
-    bands = sorted(set(row.get('band_name', '') for row in rows if row.get('band_name')))
+    data = _load_dataset()
+    bands = sorted(data.value_counts('band_name'))
     return f"Bands ({len(bands)}): {', '.join(bands)}"
 
 
 @mcp.tool()
 def list_all_genres() -> str:
     """List all unique genres in the database with counts"""
-    rows = _load_rows()
-    genres = Counter(row.get('genre', 'Unknown') for row in rows if row.get('genre'))
-    result = [f"{genre}: {count}" for genre, count in genres.most_common()]
+    data = _load_dataset()
+    result = [f"{genre}: {count}" for genre, count in data.value_counts('genre').most_common()]
     return f"Genres:\n" + "\n".join(result)
 
 
 @mcp.tool()
 def list_all_countries() -> str:
     """List all unique countries in the database with counts"""
-    rows = _load_rows()
-    countries = Counter(row.get('country', 'Unknown') for row in rows if row.get('country'))
-    result = [f"{country}: {count}" for country, count in countries.most_common()]
+    data = _load_dataset()
+    result = [f"{country}: {count}" for country, count in data.value_counts('country').most_common()]
     return f"Countries:\n" + "\n".join(result)
 
 
 @mcp.tool()
 def get_bands_by_genre(genre: str) -> str:
     """Get all bands of a specific genre (case-insensitive partial match)"""
-    rows = _load_rows()
-    genre_lower = genre.lower()
-    matches = [row for row in rows if genre_lower in row.get('genre', '').lower()]
-    if not matches:
+    data = _load_dataset()
+    bands = sorted(data.bands_matching('genre', genre))
+    if not bands:
         return f"No bands found with genre matching '{genre}'"
-    bands = sorted(set(row.get('band_name', '') for row in matches))
     return f"Bands with genre '{genre}' ({len(bands)}): {', '.join(bands)}"
 
 
 @mcp.tool()
 def get_bands_by_country(country: str) -> str:
     """Get all bands from a specific country (case-insensitive partial match)"""
-    rows = _load_rows()
-    country_lower = country.lower()
-    matches = [row for row in rows if country_lower in row.get('country', '').lower()]
-    if not matches:
+    data = _load_dataset()
+    bands = sorted(data.bands_matching('country', country))
+    if not bands:
         return f"No bands found from country matching '{country}'"
-    bands = sorted(set(row.get('band_name', '') for row in matches))
     return f"Bands from '{country}' ({len(bands)}): {', '.join(bands)}"
 
 
 @mcp.tool()
 def get_band_details(band_name: str) -> str:
     """Get all details for a specific band (case-insensitive partial match)"""
-    rows = _load_rows()
-    band_lower = band_name.lower()
-    matches = [row for row in rows if band_lower in row.get('band_name', '').lower()]
+    data = _load_dataset()
+    matches = [data.row(i) for i in data.match('band_name', band_name)]
     if not matches:
         return f"No band found matching '{band_name}'"
     results = []
@@ -105,24 +102,16 @@ def get_band_details(band_name: str) -> str:
 @mcp.tool()
 def count_bands_by_genre(genre: str) -> str:
     """Count how many bands match a specific genre"""
-    rows = _load_rows()
-    genre_lower = genre.lower()
-    matches = [row for row in rows if genre_lower in row.get('genre', '').lower()]
-    unique_bands = set(row.get('band_name', '') for row in matches)
+    data = _load_dataset()
+    unique_bands = data.bands_matching('genre', genre)
     return f"Number of {genre} bands: {len(unique_bands)}"
 
 
 @mcp.tool()
 def search_records(search_term: str) -> str:
     """Search all fields for a term (case-insensitive). Returns matching records."""
-    rows = _load_rows()
-    term_lower = search_term.lower()
-    matches = []
-    for row in rows:
-        for value in row.values():
-            if term_lower in str(value).lower():
-                matches.append(row)
-                break
+    data = _load_dataset()
+    matches = [data.row(i) for i in data.search(search_term)]
     if not matches:
         return f"No records found containing '{search_term}'"
     results = [f"Found {len(matches)} record(s) containing '{search_term}':"]
@@ -0,0 +1,160 @@
+r"""
+Poster index: recognise a poster that was already extracted, even when its
+bytes are different.
+
+The extraction cache only hits on byte-identical files. A re-export, a resized
+copy or a slightly edited repost of a poster has different bytes, so it would
+be sent to the extraction agent again. The index keeps a perceptual hash of
+every processed poster:
+- dHash: the image is shrunk to 9x8 grey pixels and every pixel is compared
+  with its right neighbour, giving 64 bits that describe the layout of the
+  image, not its exact bytes
+- two images are near-duplicates when their hashes differ in at most
+  `max_distance` bits (Hamming distance). On the sample posters, resized and
+  re-encoded copies are 0-1 bits away, while different posters (even editions
+  of the same series, like maanalainen_11.25 and maanalainen_12.25) are 16 or
+  more bits apart
+- the hashes are kept in a BK-tree, so a lookup only compares against a small
+  part of the index instead of every poster
+
+Hashes and extractions are stored in a small SQLite file and loaded into the
+BK-tree at startup. Needs Pillow (pip3 install pillow); without it no hash is
+computed and every poster is extracted as before.
+
+Used by: lesson11.py, lesson12.py, lesson12-async.py
+"""
+
+import io
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import TypeVar
+
+from pydantic import BaseModel
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+T = TypeVar('T', bound=BaseModel)
+
+HASH_SIZE = 8  # 8x8 = 64 bit hashes
+
+
+def dhash(data: bytes) -> int | None:
+    """64-bit difference hash of an image, or None if it can't be read"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            grey = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS)
+    except OSError:
+        return None
+    pixels = grey.tobytes()
+    bits = 0
+    for y in range(HASH_SIZE):
+        row = pixels[y * (HASH_SIZE + 1):(y + 1) * (HASH_SIZE + 1)]
+        for x in range(HASH_SIZE):
+            bits = bits << 1 | (row[x] > row[x + 1])
+    return bits
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of bits that differ"""
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """Burkhard-Keller tree over integers with the Hamming distance"""
+
+    def __init__(self):
+        # node = (value, {distance to child: child node})
+        self._root: tuple[int, dict] | None = None
+
+    def add(self, value: int):
+        if self._root is None:
+            self._root = (value, {})
+            return
+        node = self._root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (value, {})
+                return
+            node = child
+
+    def find(self, value: int, max_distance: int) -> list[tuple[int, int]]:
+        """(distance, value) of every stored value within `max_distance`, nearest first"""
+        found = []
+        stack = [self._root] if self._root else []
+        while stack:
+            node_value, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                found.append((distance, node_value))
+            # Triangle inequality: only children at distance d +- max_distance can match
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(found)
+
+
+class PosterIndex:
+    """Persistent perceptual-hash index of extracted posters"""
+
+    def __init__(self, path: Path = Path("poster_index.db"), max_distance: int = 4):
+        self.max_distance = max_distance
+        self.hits = 0
+        self.misses = 0
+        # Several threads (file readiness, asyncio.to_thread) use the connection and the BK-tree,
+        # the lock guards both
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS posters (
+                hash TEXT PRIMARY KEY,
+                image_name TEXT NOT NULL,
+                extraction TEXT NOT NULL,
+                added_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self._tree = BKTree()
+        # SQLite integers are signed, so the 64-bit hashes are stored as hex text
+        for (hex_hash,) in self._conn.execute("SELECT hash FROM posters"):
+            self._tree.add(int(hex_hash, 16))
+
+    def get(self, image_hash: int, output_type: type[T]) -> tuple[T, str, int] | None:
+        """(extraction, image name, distance) of the nearest known poster, or None"""
+        with self._lock:
+            matches = self._tree.find(image_hash, self.max_distance)
+            if not matches:
+                self.misses += 1
+                return None
+            distance, known_hash = matches[0]
+            image_name, extraction = self._conn.execute(
+                "SELECT image_name, extraction FROM posters WHERE hash = ?", (f"{known_hash:016x}",)
+            ).fetchone()
+            self.hits += 1
+        return output_type.model_validate_json(extraction), image_name, distance
+
+    def add(self, image_hash: int, image_name: str, extraction: BaseModel):
+        """Remember the extraction of a poster (the first poster with a hash is kept)"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO posters (hash, image_name, extraction, added_at) VALUES (?, ?, ?, ?)",
+                (f"{image_hash:016x}", image_name, extraction.model_dump_json(), time.time()),
+            )
+            self._conn.commit()
+            self._tree.add(image_hash)
+
+    def stats(self) -> str:
+        """Human readable hit/miss counters"""
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return f"Poster index: {self.hits} near-duplicate(s), {self.misses} new poster(s) ({rate:.0f}% hit rate)"
@@ -0,0 +1,177 @@
+r"""
+Query planner: answers the common count and list questions without the LLM.
+
+Most questions asked in the lesson13 REPLs are plain lookups: "how many metal
+bands", "which countries", "list bands playing at Tavastia". The MCP server
+already answers these from the in-memory dataset, so the planner skips the
+agent for them:
+- the question is normalized (lowercase, no trailing '?', no "in the database")
+- it is matched against a small set of question patterns. "How many metal
+  bands are from Sweden" has to match both: the genre and the country
+- every match gets a confidence: high when the pattern matched the whole
+  question AND its search term (genre, country, venue, band) is found in the
+  data, low when the term is not found (the wording probably means something
+  else, e.g. "how many Finnish bands" is not a genre)
+- above MIN_CONFIDENCE the answer comes straight from the dataset, below it
+  the question goes to the agent as before
+
+The planner counts how many questions it answered itself (hits) and how many
+it left to the agent (misses).
+
+Used by: lesson13.py, lesson13_mcp_has_task.py, lesson13_auto.py
+"""
+
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from concert_dataset import ConcertDataset
+
+MIN_CONFIDENCE = 0.8
+# Confidence of a full-question match whose search term was not found in the data
+UNKNOWN_TERM_CONFIDENCE = 0.3
+
+# Trailing words that don't change the question
+FILLER = re.compile(r"\s+(?:are there|are listed|(?:are )?in (?:the|this) (?:database|file|data|csv|dataset))$")
+LIST = r"(?:list|show(?: me)?|which|what|give me|name)(?: are)?(?: all)?(?: of)?(?: the)?"
+
+# (pattern, intent), tried in order: the whole normalized question must match
+PATTERNS = [
+    (re.compile(r"how many (?:records|rows|concerts|entries)(?: are there)?"), 'total_records'),
+    (re.compile(r"how many (?:different |unique )?bands"), 'count_bands'),
+    (re.compile(rf"{LIST} (?:different |unique )?genres"), 'list_genres'),
+    (re.compile(rf"{LIST} (?:different |unique )?countries"), 'list_countries'),
+    (re.compile(rf"{LIST} (?:different |unique )?bands"), 'list_bands'),
+    (re.compile(r"how many bands (?:are |come )?from (?P<country>.+)"), 'count_country'),
+    (re.compile(r"how many (?P<term>.+?) bands (?:are |come )?from (?P<country>.+)"), 'count_genre_country'),
+    (re.compile(r"how many (?P<term>.+?) bands"), 'count_genre'),
+    (re.compile(rf"(?:{LIST} )?bands (?:are |come )?from (?P<term>.+)"), 'bands_by_country'),
+    (re.compile(rf"(?:{LIST} )?bands (?:are |were )?(?:playing|play|played|performing|perform) (?:at|in) (?P<term>.+)"),
+     'bands_by_venue'),
+    (re.compile(rf"{LIST} (?P<term>.+?) bands"), 'bands_by_genre'),
+    (re.compile(r"(?:tell me about|(?:show |give me )?(?:the )?details (?:for|of|about)|who (?:is|are)) (?P<term>.+)"),
+     'band_details'),
+]
+
+
+@dataclass
+class Plan:
+    """A structured query for one question"""
+    intent: str
+    term: str | None
+    confidence: float
+    country: str | None = None
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, single spaces, no trailing punctuation or filler words"""
+    text = " ".join(question.lower().split()).rstrip("?.! ")
+    return FILLER.sub("", text)
+
+
+def _clean_term(term: str) -> str:
+    term = term.strip(" '\"")
+    return term[4:] if term.startswith("the ") else term
+
+
+def _bands(data: ConcertDataset, row_ids: list[int]) -> list[str]:
+    names = data.columns['band_name']
+    return sorted({names[i] for i in row_ids} - {''})
+
+
+class QueryPlanner:
+    """Answers count and list questions straight from a ConcertDataset"""
+
+    def __init__(self, dataset: ConcertDataset, min_confidence: float = MIN_CONFIDENCE):
+        self.dataset = dataset
+        self.min_confidence = min_confidence
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_files(cls, db_file: Path, csv_file: Path) -> "QueryPlanner":
+        """Planner over the concert database, or the CSV when there is no database"""
+        return cls(ConcertDataset(db_file, csv_file))
+
+    def _term_found(self, intent: str, term: str) -> bool:
+        data = self.dataset
+        if intent in ('count_genre', 'count_genre_country', 'bands_by_genre'):
+            return bool(data.bands_matching('genre', term))
+        if intent == 'bands_by_country':
+            return bool(data.bands_matching('country', term))
+        if intent == 'bands_by_venue':
+            return bool(data.match('venue', term) or data.match('location', term))
+        return bool(data.match('band_name', term))
+
+    def plan(self, question: str) -> Plan | None:
+        """The structured query for `question`, or None if no pattern matches"""
+        text = normalize_question(question)
+        for pattern, intent in PATTERNS:
+            match = pattern.fullmatch(text)
+            if not match:
+                continue
+            groups = match.groupdict()
+            if not groups:
+                return Plan(intent, None, 0.9)
+            term, country = (_clean_term(groups[name]) if groups.get(name) is not None else None
+                             for name in ('term', 'country'))
+            # Every search term of the question has to be found in the data
+            found = ((term is None or bool(term) and self._term_found(intent, term))
+                     and (country is None or bool(country) and self._term_found('bands_by_country', country)))
+            return Plan(intent, term, 0.9 if found else UNKNOWN_TERM_CONFIDENCE, country)
+        return None
+
+    def execute(self, plan: Plan) -> str:
+        """Answer a plan from the dataset"""
+        data = self.dataset
+        term = plan.term
+        if plan.intent == 'total_records':
+            return f"There are {len(data)} records in the database."
+        if plan.intent in ('count_bands', 'list_bands'):
+            bands = sorted(data.value_counts('band_name'))
+            if plan.intent == 'count_bands':
+                return f"There are {len(bands)} bands in the database."
+            return f"Bands ({len(bands)}): {', '.join(bands)}"
+        if plan.intent in ('list_genres', 'list_countries'):
+            column = 'genre' if plan.intent == 'list_genres' else 'country'
+            counts = data.value_counts(column).most_common()
+            title = 'Genres' if column == 'genre' else 'Countries'
+            return f"{title} (number of concerts):\n" + "\n".join(f"- {value}: {count}" for value, count in counts)
+        if plan.intent == 'count_genre':
+            return f"Number of {term} bands: {len(data.bands_matching('genre', term))}"
+        if plan.intent == 'count_country':
+            return f"Number of bands from {plan.country}: {len(data.bands_matching('country', plan.country))}"
+        if plan.intent == 'count_genre_country':
+            bands = data.bands_matching('genre', term) & data.bands_matching('country', plan.country)
+            return f"Number of {term} bands from {plan.country}: {len(bands)}"
+        if plan.intent == 'bands_by_genre':
+            bands = sorted(data.bands_matching('genre', term))
+            return f"Bands with genre '{term}' ({len(bands)}): {', '.join(bands)}"
+        if plan.intent == 'bands_by_country':
+            bands = sorted(data.bands_matching('country', term))
+            return f"Bands from '{term}' ({len(bands)}): {', '.join(bands)}"
+        if plan.intent == 'bands_by_venue':
+            bands = _bands(data, data.match('venue', term) + data.match('location', term))
+            return f"Bands playing at '{term}' ({len(bands)}): {', '.join(bands)}"
+        results = []
+        for row in (data.row(i) for i in data.match('band_name', term)):
+            results.append(
+                f"- {row['band_name']}: {row['genre']} from {row['country']}, "
+                f"playing at {row['venue']}, {row['location']} on {row['date']}"
+            )
+        return "\n".join(results)
+
+    def answer(self, question: str) -> str | None:
+        """The answer if the planner is confident enough, otherwise None (ask the agent)"""
+        self.dataset.refresh()
+        plan = self.plan(question)
+        if plan is None or plan.confidence < self.min_confidence:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.execute(plan)
+
+    def stats(self) -> str:
+        asked = self.hits + self.misses
+        rate = self.hits / asked if asked else 0.0
+        return f"Planner: {self.hits}/{asked} questions answered without the LLM ({rate:.0%})"
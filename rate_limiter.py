@@ -0,0 +1,176 @@
+r"""
+Adaptive rate limiter shared by the agents of lesson12-async.py (and the
+bulk extractor of lesson10.py).
+
+Firing one request per band with asyncio.gather quickly runs into the
+provider's rate limits (HTTP 429). This limiter keeps throughput close to
+the quota instead:
+
+- AIMD concurrency: every success raises the number of parallel requests a
+  little (additive increase), every 429 halves it (multiplicative decrease)
+- On a 429 all requests pause for the Retry-After time sent by the provider
+  (or an exponential, jittered backoff) and the failed call is retried
+- Requests per minute and tokens per minute are capped with a sliding
+  60 second window, so we slow down before the provider has to tell us
+
+Usage:
+    limiter = AdaptiveLimiter(requests_per_minute=500, tokens_per_minute=200_000)
+    result = await limiter.run(lambda: agent.run("..."), estimated_tokens=2000)
+"""
+
+import asyncio
+import email.utils
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+R = TypeVar('R')
+
+WINDOW_SECONDS = 60.0
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """True if the error (or the error that caused it) is an HTTP 429"""
+    while error is not None:
+        if getattr(error, 'status_code', None) == 429:
+            return True
+        error = error.__cause__
+    return False
+
+
+def retry_after_seconds(error: BaseException) -> float | None:
+    """Read the Retry-After header from the provider response, if there is one"""
+    while error is not None:
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None)
+        if headers:
+            if 'retry-after-ms' in headers:
+                return float(headers['retry-after-ms']) / 1000
+            value = headers.get('retry-after')
+            if value:
+                try:
+                    return float(value)
+                except ValueError:
+                    retry_at = email.utils.parsedate_to_datetime(value)
+                    return max(0.0, retry_at.timestamp() - time.time())
+        error = error.__cause__
+    return None
+
+
+def _used_tokens(result: object, default: int) -> int:
+    """Total tokens of an agent run result, or the estimate if unknown"""
+    usage = getattr(result, 'usage', None)
+    if callable(usage):
+        return usage().total_tokens
+    return default
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limiter with request and token per minute caps"""
+
+    def __init__(
+        self,
+        initial_concurrency: int = 4,
+        min_concurrency: int = 1,
+        max_concurrency: int = 32,
+        requests_per_minute: int | None = None,
+        tokens_per_minute: int | None = None,
+        max_retries: int = 5,
+    ):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.successes = 0
+        self.rate_limited = 0
+        self._limit = float(initial_concurrency)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        # Sliding window of [start time, tokens] for the requests of the last minute
+        self._window: deque[list[float]] = deque()
+        self._changed = asyncio.Condition()
+
+    @property
+    def concurrency(self) -> int:
+        """How many requests may currently run in parallel"""
+        return max(self.min_concurrency, int(self._limit))
+
+    async def run(self, call: Callable[[], Awaitable[R]], estimated_tokens: int = 1000) -> R:
+        """Run `call()` when the limits allow it, retrying on rate-limit errors"""
+        for attempt in range(self.max_retries + 1):
+            entry = await self._acquire(estimated_tokens)
+            try:
+                result = await call()
+            except Exception as e:
+                if attempt == self.max_retries or not is_rate_limit_error(e):
+                    raise
+                self._back_off(e, attempt)
+                continue
+            finally:
+                await self._release()
+            # Replace the estimate with what the request really used
+            entry[1] = _used_tokens(result, estimated_tokens)
+            self.successes += 1
+            self._limit = min(self.max_concurrency, self._limit + 1 / self._limit)
+            return result
+        raise AssertionError("unreachable")
+
+    async def _acquire(self, estimated_tokens: int) -> list[float]:
+        async with self._changed:
+            while True:
+                now = time.monotonic()
+                wait = max(self._paused_until - now, self._quota_wait(now, estimated_tokens))
+                if wait <= 0 and self._in_flight < self.concurrency:
+                    break
+                if wait > 0:
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), wait)
+                    except TimeoutError:
+                        pass
+                else:
+                    await self._changed.wait()
+            self._in_flight += 1
+            entry = [now, float(estimated_tokens)]
+            self._window.append(entry)
+            return entry
+
+    async def _release(self):
+        async with self._changed:
+            self._in_flight -= 1
+            self._changed.notify_all()
+
+    def _quota_wait(self, now: float, estimated_tokens: int) -> float:
+        """Seconds until one more request fits in the per-minute quotas"""
+        while self._window and now - self._window[0][0] >= WINDOW_SECONDS:
+            self._window.popleft()
+        waits = [0.0]
+        if self.requests_per_minute and len(self._window) >= self.requests_per_minute:
+            waits.append(WINDOW_SECONDS - (now - self._window[0][0]))
+        if self.tokens_per_minute and self._window:
+            excess = sum(tokens for _, tokens in self._window) + estimated_tokens - self.tokens_per_minute
+            freed = 0.0
+            for started, tokens in self._window:
+                if excess <= 0:
+                    break
+                freed += tokens
+                if freed >= excess:
+                    waits.append(WINDOW_SECONDS - (now - started))
+                    break
+        return max(waits)
+
+    def _back_off(self, error: Exception, attempt: int):
+        """Halve the concurrency and pause everyone for Retry-After (or a jittered backoff)"""
+        self.rate_limited += 1
+        self._limit = max(float(self.min_concurrency), self._limit / 2)
+        delay = retry_after_seconds(error)
+        if delay is None:
+            delay = min(60.0, 2 ** attempt) * random.uniform(0.5, 1.5)
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        print(f"   Rate limited, pausing {delay:.1f}s (concurrency now {self.concurrency})")
+
+    def stats(self) -> str:
+        """Human readable counters"""
+        return (f"Rate limiter: {self.successes} request(s) ok, {self.rate_limited} rate limited, "
+                f"concurrency {self.concurrency}")
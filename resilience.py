@@ -0,0 +1,183 @@
+r"""
+Resilience: per-stage timeouts and retries with jittered backoff.
+
+One dropped connection or one 503 used to throw away a whole poster: the
+exception went straight up to process_image(), which printed "Error
+processing" and moved on. The StageRunner runs every agent call (a "stage":
+extraction, one tile, one band lookup) like this instead:
+- a timeout per attempt, so a hanging request does not block a worker forever
+- retryable errors (timeouts, connection errors, HTTP 408/409/425/429/5xx and
+  output the model failed to produce) are retried up to `retries` times
+- between attempts it waits a random time between 0 and base_delay * 2^attempt
+  (capped at max_delay). The random "full jitter" spreads the retries of many
+  parallel calls, so they do not hit a struggling provider all at once
+- other errors (bad request, authentication, content filter) fail right away
+- with retry_rate_limits=False a 429 fails right away as well: for calls that
+  go through the AdaptiveLimiter (rate_limiter.py), which already retries
+  429s itself, after the Retry-After pause. Retrying them here as well would
+  multiply the attempts (retries x limiter retries per call)
+
+What to do when a stage still fails is up to the caller. The lessons keep the
+rest of the poster: a band whose enrichment failed is saved with the genre and
+country PENDING_ENRICHMENT (concert_store.py) and looked up again later.
+
+FaultInjector is a stand-in model for offline tests: it answers like the real
+agent would, but fails or hangs a given share of the calls (see bench_resilience.py).
+
+Used by: lesson11.py, lesson12.py, lesson12-async.py, bench_resilience.py
+"""
+
+import asyncio
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Awaitable, Callable, TypeVar
+
+from pydantic_ai.exceptions import ContentFilterError, ModelAPIError, ModelHTTPError, UnexpectedModelBehavior
+from pydantic_ai.messages import ModelMessage, ModelResponse
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+R = TypeVar('R')
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+def is_retryable(error: BaseException, rate_limits: bool = True) -> bool:
+    """True if trying again may work (the error, or the error that caused it, is transient).
+    With `rate_limits=False` an HTTP 429 is not retryable."""
+    while error is not None:
+        status_code = getattr(error, 'status_code', None)
+        if status_code is not None:
+            return status_code in RETRYABLE_STATUS_CODES and (rate_limits or status_code != 429)
+        if isinstance(error, ContentFilterError):
+            return False
+        if isinstance(error, (TimeoutError, ConnectionError, ModelAPIError, UnexpectedModelBehavior)):
+            return True
+        error = error.__cause__
+    return False
+
+
+@dataclass
+class RetryPolicy:
+    retries: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait before retry number `attempt + 1` (full jitter)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class StageRunner:
+    """Runs the stages of the pipeline with timeouts and retries, and counts what happened"""
+
+    def __init__(self, policy: RetryPolicy | None = None, retry_rate_limits: bool = True):
+        self.policy = policy or RetryPolicy()
+        self.retry_rate_limits = retry_rate_limits
+        self.retried: Counter[str] = Counter()
+        self.timed_out: Counter[str] = Counter()
+        self.failed: Counter[str] = Counter()
+
+    async def run(self, stage: str, call: Callable[[], Awaitable[R]], timeout: float | None = None) -> R:
+        """Await `call()`, each attempt at most `timeout` seconds, retrying transient errors"""
+        for attempt in range(self.policy.retries + 1):
+            try:
+                return await asyncio.wait_for(call(), timeout)
+            except Exception as e:
+                if isinstance(e, TimeoutError):
+                    self.timed_out[stage] += 1
+                if not self._should_retry(stage, e, attempt):
+                    raise
+                delay = self.policy.delay(attempt)
+                print(f"   {stage}: {describe(e)}, retry {attempt + 1}/{self.policy.retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def run_sync(self, stage: str, call: Callable[[], R]) -> R:
+        """Blocking version of run(); the timeout has to be part of `call` (e.g. the model settings)"""
+        for attempt in range(self.policy.retries + 1):
+            try:
+                return call()
+            except Exception as e:
+                if is_timeout(e):
+                    self.timed_out[stage] += 1
+                if not self._should_retry(stage, e, attempt):
+                    raise
+                delay = self.policy.delay(attempt)
+                print(f"   {stage}: {describe(e)}, retry {attempt + 1}/{self.policy.retries} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _should_retry(self, stage: str, error: Exception, attempt: int) -> bool:
+        if attempt == self.policy.retries or not is_retryable(error, self.retry_rate_limits):
+            self.failed[stage] += 1
+            return False
+        self.retried[stage] += 1
+        return True
+
+    def stats(self) -> str:
+        """Human readable counters"""
+        return (f"Stages: {sum(self.retried.values())} retried, {sum(self.timed_out.values())} timed out, "
+                f"{sum(self.failed.values())} failed"
+                + "".join(f"\n   {stage}: {self.retried[stage]} retried, {self.timed_out[stage]} timed out, "
+                          f"{self.failed[stage]} failed"
+                          for stage in sorted(self.retried | self.timed_out | self.failed)))
+
+
+def is_timeout(error: BaseException) -> bool:
+    """True if the error (or the error that caused it) is a timeout"""
+    while error is not None:
+        if isinstance(error, TimeoutError) or 'timeout' in type(error).__name__.lower():
+            return True
+        error = error.__cause__
+    return False
+
+
+def describe(error: BaseException) -> str:
+    """Short description of an error for the log"""
+    if isinstance(error, TimeoutError):
+        return "timed out"
+    message = str(error).splitlines()[0] if str(error) else ''
+    return f"{type(error).__name__}: {message}"[:120]
+
+
+class FaultInjector:
+    """Stand-in model that answers with `respond(messages, info)`, but raises a
+    retryable HTTP 503 for `failure_rate` of the calls and hangs for `hang_seconds`
+    on `hang_rate` of them"""
+
+    def __init__(
+        self,
+        respond: Callable[[list[ModelMessage], AgentInfo], ModelResponse],
+        failure_rate: float = 0.2,
+        hang_rate: float = 0.0,
+        hang_seconds: float = 30.0,
+        latency: float = 0.0,
+        seed: int | None = None,
+    ):
+        self.respond = respond
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.latency = latency
+        self.calls = 0
+        self.failures = 0
+        self.hangs = 0
+        self._random = random.Random(seed)
+
+    def model(self) -> FunctionModel:
+        async def function(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+            self.calls += 1
+            roll = self._random.random()
+            await asyncio.sleep(self.latency)
+            if roll < self.failure_rate:
+                self.failures += 1
+                raise ModelHTTPError(503, 'fault-injector', body="injected failure")
+            if roll < self.failure_rate + self.hang_rate:
+                self.hangs += 1
+                await asyncio.sleep(self.hang_seconds)
+            return self.respond(messages, info)
+
+        return FunctionModel(function)
+
+    def stats(self) -> str:
+        return f"Fault injector: {self.calls} call(s), {self.failures} failed, {self.hangs} hung"
@@ -0,0 +1,44 @@
+r"""
+Single-flight: collapse concurrent calls for the same key into one.
+
+When several posters are processed in parallel, the same band (a headliner
+on two festival posters) can be looked up by two coroutines at the same time.
+The band cache does not help there, because neither lookup has finished yet.
+With SingleFlight the first caller starts the agent run, and every caller that
+arrives while it is still running awaits the same result instead.
+
+Usage:
+    flights = SingleFlight()
+    result = await flights.do("amorphis", lambda: agent.run("..."))
+
+Used by: lesson12-async.py
+"""
+
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+
+R = TypeVar('R')
+
+
+class SingleFlight:
+    """Share one in-flight call per key between concurrent callers"""
+
+    def __init__(self):
+        self.collapsed = 0
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, call: Callable[[], Awaitable[R]]) -> R:
+        """Run `call()` for `key`, or wait for the run that is already in flight"""
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.collapsed += 1
+        else:
+            future = asyncio.ensure_future(call())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Shield, so one cancelled caller does not cancel the call for the others
+        return await asyncio.shield(future)
+
+    def stats(self) -> str:
+        """Human readable counter"""
+        return f"Single-flight: {self.collapsed} duplicate call(s) collapsed"
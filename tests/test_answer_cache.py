@@ -0,0 +1,52 @@
+from answer_cache import AnswerCache
+from concert_store import ConcertStore
+
+
+def row(band: str) -> dict:
+    return {'timestamp': '2026-01-01T00:00:00', 'source_image': 'poster.png', 'band_name': band,
+            'genre': 'Heavy Metal', 'country': 'Finland', 'venue': 'Tavastia', 'location': 'Helsinki',
+            'date': '1.1.2026', 'event_name': ''}
+
+
+def test_answers_are_cached_per_data_version(tmp_path):
+    store = ConcertStore(tmp_path / 'concerts.db')
+    store.add_rows([row('Amorphis')])
+    cache = AnswerCache(tmp_path / 'concerts.db', tmp_path / 'concerts.csv', 'test', tmp_path / 'answers.db')
+    version = cache.data_version()
+    assert cache.get("Who plays?", version) is None
+    cache.put("Who plays?", "Amorphis", version)
+    assert cache.get("who plays") == "Amorphis"
+
+    store.add_rows([row('Opeth')])
+    assert cache.get("Who plays?") is None
+    assert cache.memory_hits == 1
+    assert cache.misses == 2
+
+
+def test_answer_about_older_data_is_not_stored_as_fresh(tmp_path):
+    store = ConcertStore(tmp_path / 'concerts.db')
+    store.add_rows([row('Amorphis')])
+    cache = AnswerCache(tmp_path / 'concerts.db', tmp_path / 'concerts.csv', 'test', tmp_path / 'answers.db')
+    version = cache.data_version()
+    assert cache.get("Who plays?", version) is None
+
+    # New data arrives while the agent is answering
+    store.add_rows([row('Opeth')])
+    cache.put("Who plays?", "Amorphis", version)
+    assert cache.get("Who plays?") is None
+
+    # Also when another question already saw the newer data
+    new_version = cache.data_version()
+    cache.put("How many bands?", "1", version)
+    assert cache.get("How many bands?", new_version) is None
+
+
+def test_answers_survive_a_restart(tmp_path):
+    cache = AnswerCache(tmp_path / 'concerts.db', tmp_path / 'concerts.csv', 'test', tmp_path / 'answers.db')
+    version = cache.data_version()
+    assert version == "empty"
+    cache.get("Who plays?", version)
+    cache.put("Who plays?", "Nobody", version)
+    cache = AnswerCache(tmp_path / 'concerts.db', tmp_path / 'concerts.csv', 'test', tmp_path / 'answers.db')
+    assert cache.get("Who plays?") == "Nobody"
+    assert cache.disk_hits == 1
@@ -0,0 +1,31 @@
+from pydantic import BaseModel
+
+from band_cache import BandKnowledgeStore, normalize_band_name
+
+
+class Enrichment(BaseModel):
+    genre: str
+    country: str
+
+
+def test_normalize_band_name():
+    assert normalize_band_name("  The   AMORPHIS ") == "the amorphis"
+
+
+def test_get_and_put(tmp_path):
+    cache = BandKnowledgeStore(path=tmp_path / 'bands.db')
+    assert cache.get('Amorphis', Enrichment) is None
+    cache.put('Amorphis', Enrichment(genre='Metal', country='Finland'), tokens_used=120)
+    assert cache.get(' amorphis ', Enrichment) == Enrichment(genre='Metal', country='Finland')
+    assert (cache.hits, cache.misses, cache.saved_tokens) == (1, 1, 120)
+    # Persistent
+    assert BandKnowledgeStore(path=tmp_path / 'bands.db').get('AMORPHIS', Enrichment) is not None
+
+
+def test_expired_and_unknown_entries(tmp_path):
+    cache = BandKnowledgeStore(path=tmp_path / 'bands.db', ttl_days=0, unknown_ttl_days=1)
+    cache.put('Amorphis', Enrichment(genre='Metal', country='Finland'))
+    cache.put('Obscure', Enrichment(genre='Unknown', country='Unknown'))
+    # Known results expire right away here, unknown ones have their own (longer) TTL
+    assert cache.get('Amorphis', Enrichment) is None
+    assert cache.get('Obscure', Enrichment) == Enrichment(genre='Unknown', country='Unknown')
@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+from batch_writer import BatchedWriter
+from concert_store import ConcertStore
+
+
+def rows(poster: int, count: int = 2) -> list[dict]:
+    return [{'timestamp': '2026-01-01T00:00:00', 'source_image': f'poster-{poster}.png',
+             'band_name': f'Band {poster}-{i}', 'genre': 'Heavy Metal', 'country': 'Finland',
+             'venue': 'Tavastia', 'location': 'Helsinki', 'date': '1.1.2026', 'event_name': ''}
+            for i in range(count)]
+
+
+def test_writes_are_grouped_into_batches(tmp_path):
+    store = ConcertStore(tmp_path / 'concerts.db', tmp_path / 'concerts.csv')
+
+    async def run():
+        writer = BatchedWriter(store, batch_size=5, flush_interval=0.05, fsync=False)
+        writer.start()
+        counts = await asyncio.gather(*[writer.write(rows(i), ingest_key=str(i)) for i in range(12)])
+        await writer.close()
+        return writer, counts
+
+    writer, counts = asyncio.run(run())
+    assert counts == [2] * 12
+    assert writer.flushes == 3
+    assert (writer.images_written, writer.rows_written) == (12, 24)
+    assert len(store.rows()) == 24
+    assert not store.repair_csv_export()
+
+
+def test_full_batches_do_not_wait_for_the_flush_interval(tmp_path):
+    store = ConcertStore(tmp_path / 'concerts.db')
+
+    async def run():
+        writer = BatchedWriter(store, batch_size=5, flush_interval=1.0, fsync=False)
+        writer.start()
+        start = time.perf_counter()
+        await asyncio.gather(*[writer.write(rows(i)) for i in range(15)])
+        elapsed = time.perf_counter() - start
+        await writer.close()
+        return writer, elapsed
+
+    writer, elapsed = asyncio.run(run())
+    assert writer.flushes == 3
+    assert elapsed < 0.5
+
+
+def test_duplicate_ingest_key_is_written_once(tmp_path):
+    store = ConcertStore(tmp_path / 'concerts.db')
+
+    async def run():
+        writer = BatchedWriter(store, batch_size=5, flush_interval=0.01, fsync=False)
+        writer.start()
+        counts = [await writer.write(rows(1), ingest_key='a'), await writer.write(rows(1), ingest_key='a')]
+        await writer.close()
+        return counts
+
+    assert asyncio.run(run()) == [2, 0]
+    assert len(store.rows()) == 2
+
+
+def test_close_writes_everything_that_is_queued(tmp_path):
+    store = ConcertStore(tmp_path / 'concerts.db')
+
+    async def run():
+        writer = BatchedWriter(store, batch_size=100, flush_interval=10.0, fsync=False)
+        writer.start()
+        tasks = [asyncio.create_task(writer.write(rows(i))) for i in range(4)]
+        await asyncio.sleep(0)
+        # A cancelled worker does not take its rows out of the batch
+        tasks[0].cancel()
+        start = time.perf_counter()
+        await writer.close()
+        return writer, time.perf_counter() - start, [task.cancelled() for task in tasks]
+
+    writer, elapsed, cancelled = asyncio.run(run())
+    assert cancelled == [True, False, False, False]
+    assert (writer.flushes, writer.images_written) == (1, 4)
+    assert len(store.rows()) == 8
+    assert elapsed < 1.0
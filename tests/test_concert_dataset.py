@@ -0,0 +1,101 @@
+import csv
+
+from concert_dataset import ConcertDataset
+from concert_store import CSV_COLUMNS, PENDING_ENRICHMENT, ConcertStore
+
+
+def row(band: str, genre: str = 'Heavy Metal', country: str = 'Finland', venue: str = 'Tavastia') -> dict:
+    return {'timestamp': '2026-01-01T00:00:00', 'source_image': 'poster.png', 'band_name': band,
+            'genre': genre, 'country': country, 'venue': venue, 'location': 'Helsinki',
+            'date': '1.1.2026', 'event_name': ''}
+
+
+def test_refresh_loads_new_database_rows(tmp_path):
+    store = ConcertStore(tmp_path / 'concerts.db')
+    store.add_rows([row('Amorphis'), row('Opeth', country='Sweden')])
+    dataset = ConcertDataset(tmp_path / 'concerts.db', tmp_path / 'concerts.csv')
+    dataset.refresh()
+    assert len(dataset) == 2
+
+    store.add_rows([row('Sabaton', 'Power Metal', 'Sweden')])
+    dataset.refresh()
+    assert len(dataset) == 3
+    assert dataset.bands_matching('country', 'sweden') == {'Opeth', 'Sabaton'}
+
+    # Nothing changed: nothing is loaded twice
+    dataset.refresh()
+    assert len(dataset) == 3
+
+
+def test_refresh_sees_update_band(tmp_path):
+    store = ConcertStore(tmp_path / 'concerts.db')
+    store.add_rows([row('Amorphis', PENDING_ENRICHMENT, PENDING_ENRICHMENT), row('Opeth', country='Sweden')])
+    dataset = ConcertDataset(tmp_path / 'concerts.db', tmp_path / 'concerts.csv')
+    dataset.refresh()
+    assert dataset.bands_matching('genre', PENDING_ENRICHMENT) == {'Amorphis'}
+
+    assert store.update_band('Amorphis', 'Melodic Death Metal', 'Finland')
+    dataset.refresh()
+    assert len(dataset) == 2
+    assert dataset.bands_matching('genre', PENDING_ENRICHMENT) == set()
+    assert dataset.bands_matching('genre', 'death') == {'Amorphis'}
+    assert dataset.value_counts('country') == {'Finland': 1, 'Sweden': 1}
+
+
+def test_refresh_sees_genre_changed_by_a_new_row(tmp_path):
+    store = ConcertStore(tmp_path / 'concerts.db')
+    store.add_rows([row('Amorphis')])
+    dataset = ConcertDataset(tmp_path / 'concerts.db', tmp_path / 'concerts.csv')
+    dataset.refresh()
+
+    # A later poster enriched the band differently: the older concert follows the band
+    store.add_rows([row('Amorphis', 'Melodic Death Metal', venue='Pakkahuone')])
+    dataset.refresh()
+    assert len(dataset) == 2
+    assert dataset.value_counts('genre') == {'Melodic Death Metal': 2}
+
+
+def test_pending_row_does_not_count_as_update(tmp_path):
+    store = ConcertStore(tmp_path / 'concerts.db')
+    store.add_rows([row('Amorphis')])
+    updates = store.updates()
+    store.add_rows([row('Amorphis', PENDING_ENRICHMENT, PENDING_ENRICHMENT)])
+    store.add_rows([row('Amorphis')])
+    assert store.updates() == updates
+
+
+def test_refresh_reads_appended_csv_rows(tmp_path):
+    csv_file = tmp_path / 'concerts.csv'
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        writer.writerow(row('Amorphis'))
+    dataset = ConcertDataset(tmp_path / 'concerts.db', csv_file)
+    dataset.refresh()
+    assert len(dataset) == 1
+
+    with open(csv_file, 'a', newline='') as f:
+        csv.DictWriter(f, fieldnames=CSV_COLUMNS).writerow(row('Opeth', country='Sweden'))
+        # Half written row: not read until it is complete
+        f.write('2026-01-01T00:00:00,poster.png,Saba')
+    dataset.refresh()
+    assert len(dataset) == 2
+    assert dataset.match('band_name', 'opeth') == [1]
+
+
+def test_refresh_reloads_a_rewritten_csv(tmp_path):
+    store = ConcertStore(tmp_path / 'concerts.db')
+    store.add_rows([row('Amorphis', PENDING_ENRICHMENT, PENDING_ENRICHMENT), row('Opeth', country='Sweden')])
+    csv_file = tmp_path / 'concerts.csv'
+    store.export_csv(csv_file)
+    dataset = ConcertDataset(tmp_path / 'missing.db', csv_file)
+    dataset.refresh()
+    assert len(dataset) == 2
+
+    # Rewritten in place and larger: not an append
+    store.update_band('Amorphis', 'Melodic Death Metal', 'Finland')
+    store.export_csv(csv_file)
+    dataset.refresh()
+    assert len(dataset) == 2
+    assert set(dataset.value_counts('band_name')) == {'Amorphis', 'Opeth'}
+    assert dataset.bands_matching('genre', 'death') == {'Amorphis'}
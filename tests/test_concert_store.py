@@ -0,0 +1,59 @@
+import csv
+
+from concert_store import CSV_COLUMNS, ConcertStore
+
+
+def test_import_csv_without_genre_and_country(tmp_path):
+    # The header of the CSV written by lesson11.py
+    csv_file = tmp_path / 'concerts.csv'
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['timestamp', 'source_image', 'band_name', 'venue', 'location', 'date', 'event_name'])
+        writer.writerow(['2026-01-01T00:00:00', 'poster.png', 'Amorphis', 'Tavastia', 'Helsinki', '1.1.2026', ''])
+        writer.writerow(['2026-01-01T00:00:00', 'poster.png', '', 'Tavastia', 'Helsinki', '1.1.2026', ''])
+    store = ConcertStore(tmp_path / 'concerts.db')
+    assert store.import_csv(csv_file) == 1
+    [row] = store.rows()
+    assert (row['band_name'], row['genre'], row['country'], row['venue']) == \
+        ('Amorphis', 'Unknown', 'Unknown', 'Tavastia')
+
+
+def test_ingest_key_writes_once(tmp_path):
+    store = ConcertStore(tmp_path / 'concerts.db', tmp_path / 'concerts.csv')
+    row = {'timestamp': '2026-01-01T00:00:00', 'source_image': 'poster.png', 'band_name': 'Amorphis',
+           'genre': 'Heavy Metal', 'country': 'Finland', 'venue': 'Tavastia', 'location': 'Helsinki',
+           'date': '1.1.2026', 'event_name': None}
+    assert store.add_rows([row], ingest_key='a') == 1
+    assert store.add_rows([row], ingest_key='a') == 0
+    assert len(store.rows()) == 1
+    assert not store.repair_csv_export()
+
+
+def test_repair_rewrites_an_export_with_another_header(tmp_path):
+    # lesson11.py's CSV as the export file: the count matches, the columns don't
+    csv_file = tmp_path / 'concerts.csv'
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['timestamp', 'source_image', 'band_name', 'venue', 'location', 'date', 'event_name'])
+        writer.writerow(['2026-01-01T00:00:00', 'poster.png', 'Amorphis', 'Tavastia', 'Helsinki', '1.1.2026', ''])
+    store = ConcertStore(tmp_path / 'concerts.db', csv_file)
+    assert store.import_csv(csv_file) == 1
+    assert store.repair_csv_export()
+    assert not store.repair_csv_export()
+    with open(csv_file, newline='') as f:
+        reader = csv.DictReader(f)
+        rows = list(reader)
+    assert reader.fieldnames == CSV_COLUMNS
+    assert (rows[0]['band_name'], rows[0]['genre'], rows[0]['venue']) == ('Amorphis', 'Unknown', 'Tavastia')
+
+
+def test_repair_creates_a_missing_export(tmp_path):
+    store = ConcertStore(tmp_path / 'concerts.db', tmp_path / 'export.csv')
+    assert not store.repair_csv_export()
+    store.csv_export = None
+    store.add_rows([{'timestamp': '2026-01-01T00:00:00', 'source_image': 'poster.png', 'band_name': 'Amorphis',
+                     'genre': 'Heavy Metal', 'country': 'Finland', 'venue': 'Tavastia', 'location': 'Helsinki',
+                     'date': '1.1.2026', 'event_name': ''}])
+    store.csv_export = tmp_path / 'export.csv'
+    assert store.repair_csv_export()
+    assert len((tmp_path / 'export.csv').read_text().splitlines()) == 2
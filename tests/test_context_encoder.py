@@ -0,0 +1,78 @@
+import random
+
+from context_encoder import CONTEXT_FORMAT_VERSION, build_prefix, encode_rows
+
+
+def row(band: str, venue: str = 'Tavastia', date: str = '1.1.2026', event: str = 'Tuska Festival',
+        genre: str = 'Heavy Metal', country: str = 'Finland') -> dict:
+    return {'timestamp': '2026-01-01T12:34:56', 'source_image': 'poster-0001.png', 'band_name': band,
+            'genre': genre, 'country': country, 'venue': venue, 'location': 'Helsinki',
+            'date': date, 'event_name': event}
+
+
+def rows(bands: int) -> list[dict]:
+    return [row(f"Band {i}", date=f"{i % 28 + 1}.1.2026") for i in range(bands)]
+
+
+def test_token_budget_is_enforced():
+    budget = 200
+    encoded = encode_rows(rows(100), token_budget=budget)
+    assert encoded.tokens <= budget
+    assert 0 < encoded.bands_included < encoded.bands_total == 100
+    assert f"{100 - encoded.bands_included} more band(s) left out" in encoded.text
+    # Without a budget every band is written
+    everything = encode_rows(rows(100))
+    assert everything.bands_included == 100
+    assert "left out" not in everything.text
+
+
+def test_repeated_venues_and_events_get_codes():
+    text = encode_rows(rows(5)).text
+    assert "venue: V1=Tavastia (Helsinki)" in text
+    assert "event_name: E1=Tuska Festival" in text
+    assert "Band 3 | Heavy Metal | Finland: V1, 4.1.2026, E1" in text
+    # A value used once is written as it is
+    single = encode_rows([row('Amorphis', venue='Pakkahuone', event='')]).text
+    assert "Codes used" not in single
+    assert "Amorphis | Heavy Metal | Finland: Pakkahuone (Helsinki), 1.1.2026, -" in single
+
+
+def test_timestamp_and_source_image_are_dropped_by_default():
+    text = encode_rows(rows(3)).text
+    assert "12:34:56" not in text
+    assert "poster-0001" not in text
+    kept = encode_rows(rows(3), excluded_columns=()).text
+    assert "poster-0001" in kept
+
+
+def test_spellings_of_a_band_are_grouped():
+    encoded = encode_rows([row('Amorphis', date='1.1.2026'), row('AMORPHIS ', date='2.1.2026'),
+                           row('Opeth', country='Sweden')])
+    assert encoded.bands_total == 2
+    [line] = [line for line in encoded.text.splitlines() if 'morphis' in line.lower()]
+    assert line.startswith("Amorphis | Heavy Metal | Finland: ")
+    assert "1.1.2026" in line and "2.1.2026" in line
+
+
+def test_prefix_is_byte_identical_for_the_same_rows_in_any_order():
+    data = rows(30) + [row('Amorphis', venue='Pakkahuone'), row('amorphis', date='5.2.2026')]
+    shuffled = list(data)
+    random.Random(1).shuffle(shuffled)
+    first = build_prefix("Answer questions.", data)
+    second = build_prefix("Answer questions.", shuffled)
+    assert first.text.encode() == second.text.encode()
+    assert first.text.startswith("Answer questions.\n\n")
+    assert f"(format v{CONTEXT_FORMAT_VERSION}, snapshot " in first.text
+
+
+def test_snapshot_changes_with_the_data():
+    def snapshot(data: list[dict]) -> str:
+        text = build_prefix("Answer questions.", data).text
+        return text.split("snapshot ", 1)[1].split(")", 1)[0]
+
+    data = rows(10)
+    assert snapshot(data) == snapshot(list(reversed(data)))
+    assert snapshot(data) != snapshot(data + [row('Opeth', country='Sweden')])
+    changed = [dict(data[0], genre='Power Metal')] + data[1:]
+    assert snapshot(data) != snapshot(changed)
+    assert build_prefix("Answer questions.", []).text.endswith("The database is empty.")
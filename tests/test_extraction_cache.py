@@ -0,0 +1,34 @@
+from pydantic import BaseModel
+
+from extraction_cache import ExtractionCache
+
+
+class Extraction(BaseModel):
+    bands: list[str]
+
+
+def test_key_depends_on_image_model_and_instructions():
+    key = ExtractionCache.make_key(b'image', 'model', 'instructions')
+    assert key == ExtractionCache.make_key(b'image', 'model', 'instructions')
+    assert key != ExtractionCache.make_key(b'other', 'model', 'instructions')
+    assert key != ExtractionCache.make_key(b'image', 'other', 'instructions')
+    assert key != ExtractionCache.make_key(b'image', 'model', 'other')
+
+
+def test_get_and_put(tmp_path):
+    cache = ExtractionCache(path=tmp_path / 'extractions.db')
+    assert cache.get('a', Extraction) is None
+    cache.put('a', Extraction(bands=['Amorphis']))
+    assert cache.get('a', Extraction) == Extraction(bands=['Amorphis'])
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ExtractionCache(path=tmp_path / 'extractions.db', max_entries=2)
+    cache.put('a', Extraction(bands=['A']))
+    cache.put('b', Extraction(bands=['B']))
+    assert cache.get('a', Extraction) is not None
+    cache.put('c', Extraction(bands=['C']))
+    assert cache.get('b', Extraction) is None
+    assert cache.get('a', Extraction) is not None
+    assert cache.get('c', Extraction) is not None
@@ -0,0 +1,66 @@
+import threading
+import time
+
+from file_readiness import ReadinessTracker
+
+
+def wait_for(event: threading.Event, seconds: float = 2.0) -> bool:
+    return event.wait(seconds)
+
+
+def test_file_is_ready_once_it_stops_changing(tmp_path):
+    ready = []
+    event = threading.Event()
+    tracker = ReadinessTracker(lambda path: (ready.append(path), event.set()), settle_time=0.05,
+                               growing_settle_time=0.2, poll_interval=0.01)
+    tracker.start()
+    try:
+        path = tmp_path / 'poster.png'
+        path.write_bytes(b'a' * 100)
+        tracker.notify(path)
+        tracker.notify(path)
+        assert wait_for(event)
+        assert ready == [path]
+        assert tracker.merged_events == 1
+
+        # An event without a change is not reported again
+        event.clear()
+        tracker.notify(path)
+        assert not event.wait(0.2)
+    finally:
+        tracker.stop()
+
+
+def test_growing_file_waits_longer(tmp_path):
+    ready_at = []
+    event = threading.Event()
+    tracker = ReadinessTracker(lambda path: (ready_at.append(time.monotonic()), event.set()), settle_time=0.05,
+                               growing_settle_time=0.3, poll_interval=0.01)
+    tracker.start()
+    try:
+        path = tmp_path / 'poster.png'
+        path.write_bytes(b'a')
+        tracker.notify(path)
+        time.sleep(0.02)
+        with open(path, 'ab') as f:
+            f.write(b'b' * 100)
+        grown = time.monotonic()
+        assert wait_for(event)
+        assert ready_at[0] - grown >= 0.25
+    finally:
+        tracker.stop()
+
+
+def test_empty_and_deleted_files_are_not_ready(tmp_path):
+    event = threading.Event()
+    tracker = ReadinessTracker(lambda path: event.set(), settle_time=0.02, poll_interval=0.01)
+    tracker.start()
+    try:
+        empty = tmp_path / 'empty.png'
+        empty.touch()
+        tracker.notify(empty)
+        tracker.notify(tmp_path / 'missing.png')
+        assert not event.wait(0.2)
+        assert tracker.ready_count == 0
+    finally:
+        tracker.stop()
@@ -0,0 +1,47 @@
+import io
+
+import pytest
+
+from image_preprocess import estimate_vision_tokens, image_size, preprocess_image, split_tiles
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def png(width: int, height: int, border: int = 0) -> bytes:
+    image = Image.new('RGB', (width, height), 'white')
+    image.paste(Image.effect_noise((width - 2 * border, height - 2 * border), 64).convert('RGB'), (border, border))
+    output = io.BytesIO()
+    image.save(output, format='PNG')
+    return output.getvalue()
+
+
+def test_estimate_vision_tokens():
+    # Scaled to a short side of 768: 768 x 1086 is 2 x 3 tiles
+    assert estimate_vision_tokens(2480, 3508) == 85 + 170 * 6
+    assert estimate_vision_tokens(724, 1024) == 85 + 170 * 4
+    assert estimate_vision_tokens(512, 512) == 85 + 170
+
+
+def test_preprocess_downscales_to_max_edge():
+    data, media_type = preprocess_image(png(600, 900), 'image/png', max_edge=300)
+    assert media_type == 'image/jpeg'
+    assert image_size(data) == (200, 300)
+
+
+def test_preprocess_crops_borders():
+    data, _ = preprocess_image(png(300, 300, border=50), 'image/png', max_edge=1024, crop_borders=True)
+    assert image_size(data) == (200, 200)
+
+
+def test_unreadable_image_is_sent_as_is():
+    assert preprocess_image(b'not an image', 'image/png') == (b'not an image', 'image/png')
+    assert split_tiles(b'not an image') == []
+    assert image_size(b'not an image') is None
+    assert image_size(png(10, 10)[:20]) is None
+
+
+def test_split_tiles_overlap():
+    tiles = split_tiles(png(400, 400), rows=2, cols=2, overlap=0.2)
+    assert len(tiles) == 4
+    # 200 pixels per tile, plus 10% of a tile on the inner side
+    assert [image_size(tile) for tile in tiles] == [(220, 220)] * 4
@@ -0,0 +1,79 @@
+from pathlib import Path
+
+import pytest
+from pydantic import BaseModel
+
+from ingest_manifest import IngestManifest
+
+
+class Extraction(BaseModel):
+    bands: list[str]
+
+
+@pytest.fixture
+def manifest(tmp_path) -> IngestManifest:
+    return IngestManifest.for_output(tmp_path / 'concerts.csv')
+
+
+def append(csv_file: Path, manifest: IngestManifest, content_hash: str, text: str, finish: bool = True):
+    """Append the rows of one image the way lesson11.py does"""
+    manifest.mark(content_hash, f"{content_hash}.png", 'extracted')
+    manifest.begin_write(content_hash, csv_file.stat().st_size)
+    with open(csv_file, 'a') as f:
+        f.write(text)
+    if finish:
+        manifest.mark(content_hash, f"{content_hash}.png", 'written')
+
+
+def test_every_output_has_its_own_manifest(tmp_path):
+    csv_manifest = IngestManifest.for_output(tmp_path / 'concerts.csv')
+    db_manifest = IngestManifest.for_output(tmp_path / 'concerts.db')
+    csv_manifest.mark('a', 'a.png', 'written')
+    assert csv_manifest.state('a') == 'written'
+    assert db_manifest.state('a') is None
+    assert (tmp_path / 'concerts.csv.manifest.db').exists()
+
+
+def test_states_and_payload(manifest):
+    assert manifest.state('a') is None
+    manifest.mark('a', 'a.png', 'queued')
+    manifest.mark('a', 'a.png', 'enriched', Extraction(bands=['Amorphis']))
+    manifest.mark('a', 'a.png', 'written')
+    assert manifest.state('a') == 'written'
+    # The payload of the last finished step is kept
+    assert manifest.payload('a', Extraction) == Extraction(bands=['Amorphis'])
+    assert manifest.unfinished() == []
+    with pytest.raises(ValueError):
+        manifest.mark('a', 'a.png', 'lost')
+
+
+def test_recover_csv_cuts_an_unfinished_write(tmp_path, manifest):
+    csv_file = tmp_path / 'concerts.csv'
+    csv_file.write_text('header\n')
+    append(csv_file, manifest, 'a', 'a1\na2\n')
+    append(csv_file, manifest, 'b', 'b1\nb2', finish=False)
+    assert manifest.recover_csv(csv_file) == len('b1\nb2')
+    assert csv_file.read_text() == 'header\na1\na2\n'
+    assert manifest.unfinished() == [('b.png', 'extracted')]
+    # Nothing left to recover
+    assert manifest.recover_csv(csv_file) == 0
+
+
+def test_recover_csv_keeps_rows_written_later(tmp_path, manifest):
+    csv_file = tmp_path / 'concerts.csv'
+    csv_file.write_text('header\n')
+    append(csv_file, manifest, 'a', 'a1\n', finish=False)
+    append(csv_file, manifest, 'b', 'b1\n')
+    append(csv_file, manifest, 'c', 'c1\n', finish=False)
+    append(csv_file, manifest, 'd', 'd1\n')
+    assert manifest.recover_csv(csv_file) == len('a1\nc1\n')
+    assert csv_file.read_text() == 'header\nb1\nd1\n'
+
+
+def test_recover_csv_without_writes(tmp_path, manifest):
+    csv_file = tmp_path / 'concerts.csv'
+    csv_file.write_text('header\n')
+    append(csv_file, manifest, 'a', 'a1\n')
+    assert manifest.recover_csv(csv_file) == 0
+    assert manifest.recover_csv(tmp_path / 'missing.csv') == 0
+    assert csv_file.read_text() == 'header\na1\n'
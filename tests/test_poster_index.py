@@ -0,0 +1,46 @@
+import io
+
+import pytest
+from pydantic import BaseModel
+
+from poster_index import BKTree, PosterIndex, dhash, hamming
+
+
+class Extraction(BaseModel):
+    bands: list[str]
+
+
+def test_bk_tree_finds_values_within_the_distance():
+    tree = BKTree()
+    for value in [0b0000, 0b0001, 0b0111, 0b1111]:
+        tree.add(value)
+    assert tree.find(0b0000, 1) == [(0, 0b0000), (1, 0b0001)]
+    assert tree.find(0b1110, 1) == [(1, 0b1111)]
+    assert hamming(0b1010, 0b0101) == 4
+
+
+def test_index_returns_the_nearest_poster(tmp_path):
+    index = PosterIndex(path=tmp_path / 'posters.db', max_distance=4)
+    index.add(0xFFFF, 'a.png', Extraction(bands=['Amorphis']))
+    assert index.get(0xFFF0, Extraction) == (Extraction(bands=['Amorphis']), 'a.png', 4)
+    assert index.get(0xFF00, Extraction) is None
+    # The hashes are loaded again after a restart
+    assert PosterIndex(path=tmp_path / 'posters.db').get(0xFFFE, Extraction)[1] == 'a.png'
+
+
+def test_resized_copy_has_a_close_hash():
+    Image = pytest.importorskip('PIL.Image')
+    image = Image.new('L', (400, 600))
+    for x in range(400):
+        for y in range(0, 600, 40):
+            image.putpixel((x, y), (x * 7 + y) % 256)
+
+    def encoded(picture, format: str) -> bytes:
+        output = io.BytesIO()
+        picture.save(output, format=format)
+        return output.getvalue()
+
+    original = dhash(encoded(image, 'PNG'))
+    resized = dhash(encoded(image.resize((200, 300)), 'JPEG'))
+    assert hamming(original, resized) <= 4
+    assert dhash(b'not an image') is None
@@ -0,0 +1,90 @@
+import csv
+
+import pytest
+
+from concert_store import CSV_COLUMNS
+from query_planner import MIN_CONFIDENCE, QueryPlanner, normalize_question
+
+ROWS = [
+    ('Amorphis', 'Melodic Death Metal', 'Finland', 'Tavastia', 'Helsinki'),
+    ('Opeth', 'Progressive Metal', 'Sweden', 'Tavastia', 'Helsinki'),
+    ('Sabaton', 'Power Metal', 'Sweden', 'Pakkahuone', 'Tampere'),
+    ('Abba', 'Pop', 'Sweden', 'Kulttuuritalo', 'Helsinki'),
+    ('Nightwish', 'Symphonic Metal', 'Finland', 'Pakkahuone', 'Tampere'),
+]
+
+
+@pytest.fixture
+def planner(tmp_path):
+    csv_file = tmp_path / 'concerts.csv'
+    with open(csv_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        for band, genre, country, venue, location in ROWS:
+            writer.writerow({'timestamp': '2026-01-01T00:00:00', 'source_image': 'poster.png', 'band_name': band,
+                             'genre': genre, 'country': country, 'venue': venue, 'location': location,
+                             'date': '1.1.2026', 'event_name': ''})
+    planner = QueryPlanner.for_files(tmp_path / 'concerts.db', csv_file)
+    planner.dataset.refresh()
+    return planner
+
+
+def test_normalize_question():
+    assert normalize_question("  How many  BANDS are in the database?") == "how many bands"
+
+
+@pytest.mark.parametrize('question, intent, term, country', [
+    ("How many records are there?", 'total_records', None, None),
+    ("How many different bands?", 'count_bands', None, None),
+    ("List all genres", 'list_genres', None, None),
+    ("Which countries are in the database?", 'list_countries', None, None),
+    ("Show me all the bands", 'list_bands', None, None),
+    ("How many bands are from Sweden?", 'count_country', None, 'sweden'),
+    ("How many metal bands are from Sweden?", 'count_genre_country', 'metal', 'sweden'),
+    ("How many metal bands?", 'count_genre', 'metal', None),
+    ("Which bands are from Finland?", 'bands_by_country', 'finland', None),
+    ("Which bands are playing at Tavastia?", 'bands_by_venue', 'tavastia', None),
+    ("List the power metal bands", 'bands_by_genre', 'power metal', None),
+    ("Tell me about Opeth", 'band_details', 'opeth', None),
+])
+def test_every_pattern(planner, question, intent, term, country):
+    plan = planner.plan(question)
+    assert (plan.intent, plan.term, plan.country) == (intent, term, country)
+    assert plan.confidence >= MIN_CONFIDENCE
+
+
+def test_unmatched_question_goes_to_the_agent(planner):
+    assert planner.plan("Why do metal bands tour so much?") is None
+    assert planner.answer("Why do metal bands tour so much?") is None
+    assert planner.misses == 1
+
+
+def test_unknown_term_has_low_confidence(planner):
+    assert planner.plan("How many Finnish bands?").confidence < MIN_CONFIDENCE
+    assert planner.plan("How many metal bands are from Norway?").confidence < MIN_CONFIDENCE
+
+
+def test_answers(planner):
+    assert planner.answer("How many records?") == "There are 5 records in the database."
+    assert planner.answer("How many bands?") == "There are 5 bands in the database."
+    assert planner.answer("How many metal bands?") == "Number of metal bands: 4"
+    assert planner.answer("How many bands are from Sweden?") == "Number of bands from sweden: 3"
+    assert planner.answer("Which bands are from Finland?") == "Bands from 'finland' (2): Amorphis, Nightwish"
+    assert planner.answer("Which bands are playing at Pakkahuone?") == \
+        "Bands playing at 'pakkahuone' (2): Nightwish, Sabaton"
+    assert planner.answer("List the power metal bands") == "Bands with genre 'power metal' (1): Sabaton"
+    assert planner.answer("Tell me about Opeth").startswith("- Opeth: Progressive Metal from Sweden")
+    assert planner.hits == 8
+
+
+def test_genre_and_country_are_both_applied(planner):
+    # Used to count every metal band and ignore the country
+    assert planner.answer("How many heavy metal bands are from Sweden?") is None
+    assert planner.answer("How many metal bands are from Sweden?") == "Number of metal bands from sweden: 2"
+    assert planner.answer("How many metal bands come from Finland?") == "Number of metal bands from finland: 2"
+
+
+def test_list_answers(planner):
+    assert planner.answer("Which genres?").startswith("Genres (number of concerts):\n- ")
+    assert "- Sweden: 3" in planner.answer("Which countries?")
+    assert planner.answer("List the bands") == "Bands (5): Abba, Amorphis, Nightwish, Opeth, Sabaton"
@@ -0,0 +1,90 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from rate_limiter import AdaptiveLimiter, is_rate_limit_error, retry_after_seconds
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after_ms: str):
+        super().__init__('rate limited')
+        self.response = SimpleNamespace(headers={'retry-after-ms': retry_after_ms})
+
+
+def test_rate_limit_error_and_retry_after():
+    error = RateLimitError('20')
+    assert is_rate_limit_error(error)
+    assert retry_after_seconds(error) == pytest.approx(0.02)
+    try:
+        raise RuntimeError('wrapped') from error
+    except RuntimeError as wrapped:
+        assert is_rate_limit_error(wrapped)
+    assert not is_rate_limit_error(ValueError())
+    assert retry_after_seconds(ValueError()) is None
+
+
+def test_rate_limited_calls_are_retried_with_less_concurrency():
+    attempts = 0
+
+    async def call():
+        nonlocal attempts
+        attempts += 1
+        if attempts <= 2:
+            raise RateLimitError('10')
+        return 'ok'
+
+    async def run():
+        limiter = AdaptiveLimiter(initial_concurrency=8)
+        return limiter, await limiter.run(call)
+
+    limiter, result = asyncio.run(run())
+    assert result == 'ok'
+    assert attempts == 3
+    assert limiter.rate_limited == 2
+    assert limiter.concurrency == 2
+
+
+def test_other_errors_are_not_retried():
+    async def call():
+        raise ValueError('bad request')
+
+    limiter = AdaptiveLimiter()
+    with pytest.raises(ValueError):
+        asyncio.run(limiter.run(call))
+    assert limiter.successes == 0
+
+
+def test_concurrency_limit():
+    running = peak = 0
+
+    async def call():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    async def run():
+        limiter = AdaptiveLimiter(initial_concurrency=3, max_concurrency=3)
+        await asyncio.gather(*[limiter.run(call) for _ in range(10)])
+        return limiter
+
+    limiter = asyncio.run(run())
+    assert peak == 3
+    assert limiter.successes == 10
+
+
+def test_requests_per_minute_quota():
+    limiter = AdaptiveLimiter(requests_per_minute=2)
+
+    async def run():
+        await limiter.run(lambda: asyncio.sleep(0))
+        await limiter.run(lambda: asyncio.sleep(0))
+        # The third request would have to wait for the window of a minute
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(limiter.run(lambda: asyncio.sleep(0)), 0.05)
+
+    asyncio.run(run())
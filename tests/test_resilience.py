@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from pydantic_ai.exceptions import ContentFilterError, ModelAPIError, ModelHTTPError, UnexpectedModelBehavior
+
+from resilience import RetryPolicy, StageRunner, is_retryable
+
+
+def http_error(status_code: int) -> ModelHTTPError:
+    return ModelHTTPError(status_code, 'test-model', body='error')
+
+
+def caused_by(cause: BaseException) -> RuntimeError:
+    try:
+        raise RuntimeError('wrapped') from cause
+    except RuntimeError as e:
+        return e
+
+
+@pytest.mark.parametrize('status_code', [408, 409, 425, 429, 500, 502, 503, 504])
+def test_transient_status_codes_are_retryable(status_code):
+    assert is_retryable(http_error(status_code))
+
+
+@pytest.mark.parametrize('status_code', [400, 401, 403, 404, 422])
+def test_client_errors_are_not_retryable(status_code):
+    assert not is_retryable(http_error(status_code))
+
+
+def test_rate_limits_can_be_left_to_the_limiter():
+    assert not is_retryable(http_error(429), rate_limits=False)
+    assert is_retryable(http_error(503), rate_limits=False)
+
+
+@pytest.mark.parametrize('error, retryable', [
+    (TimeoutError(), True),
+    (ConnectionError(), True),
+    (ModelAPIError('test-model', 'connection reset'), True),
+    (UnexpectedModelBehavior('no output'), True),
+    (ContentFilterError('filtered'), False),
+    (ValueError('bad'), False),
+    (caused_by(http_error(503)), True),
+    (caused_by(http_error(401)), False),
+    (caused_by(TimeoutError()), True),
+])
+def test_errors_and_their_causes(error, retryable):
+    assert is_retryable(error) == retryable
+
+
+def run_failing(runner: StageRunner, errors: list[BaseException]) -> tuple[str | None, int]:
+    """Run a stage that raises `errors` one after the other, then succeeds"""
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        if calls <= len(errors):
+            raise errors[calls - 1]
+        return 'ok'
+
+    try:
+        return asyncio.run(runner.run('stage', call)), calls
+    except Exception:
+        return None, calls
+
+
+def test_stage_runner_retries_transient_errors():
+    runner = StageRunner(RetryPolicy(retries=3, base_delay=0))
+    assert run_failing(runner, [http_error(503), TimeoutError()]) == ('ok', 3)
+    assert runner.retried['stage'] == 2
+    assert runner.timed_out['stage'] == 1
+
+
+def test_stage_runner_gives_up():
+    runner = StageRunner(RetryPolicy(retries=2, base_delay=0))
+    assert run_failing(runner, [http_error(503)] * 5) == (None, 3)
+    assert run_failing(runner, [http_error(401)]) == (None, 1)
+    assert runner.failed['stage'] == 2
+
+
+def test_stage_runner_leaves_rate_limits_to_the_limiter():
+    runner = StageRunner(RetryPolicy(retries=3, base_delay=0), retry_rate_limits=False)
+    assert run_failing(runner, [http_error(429)]) == (None, 1)
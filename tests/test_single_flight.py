@@ -0,0 +1,54 @@
+import asyncio
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_calls_for_one_key_share_a_run():
+    calls = []
+
+    async def look_up(key: str) -> str:
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key.upper()
+
+    async def run():
+        flights = SingleFlight()
+        results = await asyncio.gather(*[flights.do(key, lambda key=key: look_up(key))
+                                         for key in ['amorphis', 'amorphis', 'opeth', 'amorphis']])
+        # Finished calls are not reused, that is the band cache's job
+        again = await flights.do('amorphis', lambda: look_up('amorphis'))
+        return flights, results, again
+
+    flights, results, again = asyncio.run(run())
+    assert results == ['AMORPHIS', 'AMORPHIS', 'OPETH', 'AMORPHIS']
+    assert again == 'AMORPHIS'
+    assert calls == ['amorphis', 'opeth', 'amorphis']
+    assert flights.collapsed == 2
+
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    async def look_up() -> str:
+        await asyncio.sleep(0.01)
+        return 'done'
+
+    async def run():
+        flights = SingleFlight()
+        first = asyncio.create_task(flights.do('key', look_up))
+        second = asyncio.create_task(flights.do('key', look_up))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(run()) == ('done', True)
+
+
+def test_errors_reach_every_caller():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError('lookup failed')
+
+    async def run():
+        flights = SingleFlight()
+        return await asyncio.gather(flights.do('key', fail), flights.do('key', fail), return_exceptions=True)
+
+    assert [type(result) for result in asyncio.run(run())] == [ValueError, ValueError]